@@ -0,0 +1,230 @@
+# autocompletar.py
+# Índice de trigramas sobre nombres de ciudades y países (incluidas sus
+# traducciones) para autocompletado tolerante a errores de escritura.
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+from .gazetteer import normalizar_nombre, obtener_gazetteer
+from .models import Countries
+
+TIPO_CIUDAD = 0
+TIPO_PAIS = 1
+
+CANDIDATOS_MAXIMOS = 40   # candidatos por trigramas que pasan a la distancia de edición
+PUBLICACIONES_MAXIMAS = 20000  # tope de posiciones leídas por consulta
+PESO_PAIS = 0.3           # bonificación si el resultado pertenece al país filtrado
+PESO_PREFIJO = 0.15       # bonificación si el nombre empieza por la consulta
+PUNTAJE_MINIMO = 0.35
+
+
+def trigramas(texto):
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def mascaras_consulta(consulta):
+    mascaras = {}
+    for i, letra in enumerate(consulta):
+        mascaras[letra] = mascaras.get(letra, 0) | (1 << i)
+    return mascaras
+
+
+def distancias_edicion(consulta, nombre, mascaras=None):
+    # Levenshtein bit-paralelo (Myers/Hyyrö) en una sola pasada: devuelve la
+    # distancia contra el nombre completo y la mejor distancia contra
+    # cualquier prefijo del nombre (útil mientras el usuario sigue escribiendo).
+    m = len(consulta)
+    if m == 0:
+        return len(nombre), 0
+    if mascaras is None:
+        mascaras = mascaras_consulta(consulta)
+
+    todos = (1 << m) - 1
+    ultimo = 1 << (m - 1)
+    positivos, negativos = todos, 0
+    distancia = mejor = m
+    for letra in nombre:
+        iguales = mascaras.get(letra, 0)
+        xv = iguales | negativos
+        xh = (((iguales & positivos) + positivos) ^ positivos) | iguales
+        ph = negativos | (~(xh | positivos) & todos)
+        mh = positivos & xh
+        if ph & ultimo:
+            distancia += 1
+        elif mh & ultimo:
+            distancia -= 1
+        if distancia < mejor:
+            mejor = distancia
+        ph = ((ph << 1) | 1) & todos
+        mh = (mh << 1) & todos
+        positivos = mh | (~(xv | ph) & todos)
+        negativos = ph & xv
+    return distancia, mejor
+
+
+class IndiceTrigramas:
+    def __init__(self, entradas):
+        # entradas: [(tipo, id, nombre_mostrado, alias, pais_id)]
+        self.tipos = []
+        self.ids = []
+        self.nombres = []
+        self.alias = []
+        self.paises = []
+
+        publicaciones = {}
+        cantidades = []
+        for tipo, ident, nombre, alias, pais_id in entradas:
+            normalizado = normalizar_nombre(alias)
+            if not normalizado:
+                continue
+            posicion = len(self.alias)
+            self.tipos.append(tipo)
+            self.ids.append(ident)
+            self.nombres.append(nombre)
+            self.alias.append(normalizado)
+            self.paises.append(pais_id)
+
+            propios = trigramas(normalizado)
+            cantidades.append(len(propios))
+            for trigrama in propios:
+                publicaciones.setdefault(trigrama, []).append(posicion)
+
+        self._paises_np = np.array(self.paises, dtype=np.int64)
+        self._cantidades = np.array(cantidades, dtype=np.float32)
+
+        # Listas de publicaciones en formato CSR: un solo arreglo plano
+        self._rangos = {}
+        planos = []
+        inicio = 0
+        for trigrama, posiciones in publicaciones.items():
+            planos.append(np.array(posiciones, dtype=np.int32))
+            self._rangos[trigrama] = (inicio, inicio + len(posiciones))
+            inicio += len(posiciones)
+        self._publicaciones = np.concatenate(planos) if planos else np.empty(0, dtype=np.int32)
+
+        # Para consultas de 1-2 letras basta con un recorrido por prefijo
+        self._ordenados = sorted((a, i) for i, a in enumerate(self.alias))
+
+    def __len__(self):
+        return len(self.alias)
+
+    def _candidatos_por_prefijo(self, consulta):
+        inicio = bisect_left(self._ordenados, (consulta,))
+        fin = min(inicio + CANDIDATOS_MAXIMOS, len(self._ordenados))
+        posiciones = [
+            posicion for alias, posicion in self._ordenados[inicio:fin]
+            if alias.startswith(consulta)
+        ]
+        return np.array(posiciones, dtype=np.int64)
+
+    def _candidatos_por_trigramas(self, consulta, pais_id):
+        propios = trigramas(consulta)
+        rangos = sorted(
+            (self._rangos[t] for t in propios if t in self._rangos),
+            key=lambda r: r[1] - r[0]
+        )
+        if not rangos:
+            return np.empty(0, dtype=np.int64)
+
+        # Se leen primero los trigramas más selectivos; los muy frecuentes
+        # ("san", "la ") apenas discriminan y dominarían el costo.
+        leidos = []
+        total = 0
+        for a, b in rangos:
+            if len(leidos) >= 2 and total + (b - a) > PUBLICACIONES_MAXIMAS:
+                break
+            leidos.append(self._publicaciones[a:b])
+            total += b - a
+
+        posiciones, comunes = np.unique(np.concatenate(leidos), return_counts=True)
+
+        # Similitud de Jaccard entre conjuntos de trigramas
+        similitud = comunes / (len(propios) + self._cantidades[posiciones] - comunes)
+        if pais_id is not None:
+            similitud = similitud + PESO_PAIS * (self._paises_np[posiciones] == pais_id)
+
+        if len(posiciones) > CANDIDATOS_MAXIMOS:
+            mejores = np.argpartition(-similitud, CANDIDATOS_MAXIMOS)[:CANDIDATOS_MAXIMOS]
+            posiciones = posiciones[mejores]
+        return posiciones
+
+    def buscar(self, texto, pais_id=None, limite=10):
+        consulta = normalizar_nombre(texto)
+        if not consulta:
+            return []
+
+        if len(consulta) < 3:
+            posiciones = self._candidatos_por_prefijo(consulta)
+        else:
+            posiciones = self._candidatos_por_trigramas(consulta, pais_id)
+
+        mascaras = mascaras_consulta(consulta)
+        mejores = {}
+        for posicion in posiciones.tolist():
+            alias = self.alias[posicion]
+            completa, prefijo = distancias_edicion(consulta, alias, mascaras)
+            distancia = min(completa, prefijo)
+            puntaje = 1 - distancia / max(len(consulta), 1)
+            if alias.startswith(consulta):
+                puntaje += PESO_PREFIJO
+            if completa == 0:
+                puntaje += PESO_PREFIJO
+            if pais_id is not None and self.paises[posicion] == pais_id:
+                puntaje += PESO_PAIS
+            if puntaje < PUNTAJE_MINIMO:
+                continue
+
+            # Una misma ciudad/país puede entrar por varios alias (traducciones)
+            clave = (self.tipos[posicion], self.ids[posicion])
+            previo = mejores.get(clave)
+            if previo is None or puntaje > previo[0]:
+                mejores[clave] = (puntaje, distancia, posicion)
+
+        ordenados = sorted(
+            mejores.values(),
+            key=lambda m: (-m[0], m[1], len(self.alias[m[2]]), self.ids[m[2]])
+        )
+        return [
+            {
+                'tipo': 'pais' if self.tipos[p] == TIPO_PAIS else 'ciudad',
+                'id': self.ids[p],
+                'nombre': self.nombres[p],
+                'coincidencia': self.alias[p],
+                'pais_id': self.paises[p],
+                'distancia': distancia,
+                'puntaje': round(puntaje, 3),
+            }
+            for puntaje, distancia, p in ordenados[:limite]
+        ]
+
+
+def entradas_desde_gazetteer(gazetteer, traducciones):
+    for pais in gazetteer.paises.values():
+        yield TIPO_PAIS, pais.id, pais.name, pais.name, pais.id
+        vistos = {normalizar_nombre(pais.name)}
+        for nombre in (traducciones.get(pais.id) or {}).values():
+            if isinstance(nombre, str) and normalizar_nombre(nombre) not in vistos:
+                vistos.add(normalizar_nombre(nombre))
+                yield TIPO_PAIS, pais.id, pais.name, nombre, pais.id
+    for ciudad in gazetteer.ciudades.values():
+        yield TIPO_CIUDAD, ciudad.id, ciudad.name, ciudad.name, ciudad.country_id
+
+
+_indice = None
+_origen = None
+_lock = threading.Lock()
+
+
+def obtener_indice():
+    # El índice se reconstruye cuando el gazetteer se renueva
+    global _indice, _origen
+    gazetteer = obtener_gazetteer()
+    if _origen is not gazetteer:
+        with _lock:
+            if _origen is not gazetteer:
+                traducciones = dict(Countries.objects.values_list('id', 'translations'))
+                _indice = IndiceTrigramas(entradas_desde_gazetteer(gazetteer, traducciones))
+                _origen = gazetteer
+    return _indice
@@ -0,0 +1,135 @@
+# cache_local.py
+# Utilidades de caché en memoria del proceso: LRU con expiración por entrada
+# y "single-flight" para que llamadas concurrentes con la misma clave
+# compartan un único cálculo.
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Hilos compartidos por todas las actualizaciones en segundo plano: un hilo
+# nuevo por actualización abriría además una sesión HTTP (y su conexión) nueva
+_ejecutor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'CACHE_HILOS_SEGUNDO_PLANO', 4), thread_name_prefix='segundo-plano'
+)
+
+
+class CacheLRU:
+    def __init__(self, maximo=1000):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return defecto
+            valor, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return defecto
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._vuelos = {}
+        self._lock = threading.Lock()
+
+    def en_curso(self, clave):
+        return clave in self._vuelos
+
+    def ejecutar(self, clave, funcion):
+        # El primer hilo ejecuta `funcion`; los demás esperan su resultado
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            propio = vuelo is None
+            if propio:
+                vuelo = self._vuelos[clave] = _Vuelo()
+
+        if not propio:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.resultado
+        return self._volar(clave, vuelo, funcion)
+
+    def _volar(self, clave, vuelo, funcion):
+        try:
+            vuelo.resultado = funcion()
+            return vuelo.resultado
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.listo.set()
+
+    def en_segundo_plano(self, clave, funcion):
+        # Encola `funcion` en el pool compartido si no hay otro cálculo en
+        # curso (o en cola) para la clave. Devuelve False si ya había uno.
+        with self._lock:
+            if clave in self._vuelos:
+                return False
+            # Se registra al encolar: mientras espera un hilo libre, otras
+            # llamadas con la misma clave no encolan una segunda tarea
+            vuelo = self._vuelos[clave] = _Vuelo()
+
+        def tarea():
+            try:
+                self._volar(clave, vuelo, funcion)
+            except Exception as e:
+                print(f"Error en actualización en segundo plano ({clave}): {e}")
+
+        _ejecutor.submit(tarea)
+        return True
+
+
+class SingleFlightAsync:
+    # Equivalente para corrutinas: las tareas pertenecen a un event loop,
+    # así que se agrupan por loop.
+    def __init__(self):
+        self._por_loop = weakref.WeakKeyDictionary()
+
+    async def ejecutar(self, clave, fabrica):
+        vuelos = self._por_loop.setdefault(asyncio.get_running_loop(), {})
+        tarea = vuelos.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(fabrica())
+            vuelos[clave] = tarea
+            tarea.add_done_callback(lambda _: vuelos.pop(clave, None))
+        # shield: si un cliente cancela su petición, los demás siguen esperando
+        return await asyncio.shield(tarea)
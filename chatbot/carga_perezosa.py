@@ -0,0 +1,29 @@
+# carga_perezosa.py
+# Importación diferida de módulos: los clientes de APIs externas (y con
+# ellos requests/httpx) se cargan con la primera petición que los usa y no
+# al arrancar el worker, al correr un comando de manage.py o los tests.
+import importlib
+import threading
+
+
+class ModuloPerezoso:
+    def __init__(self, nombre, paquete=None):
+        self._nombre = nombre
+        self._paquete = paquete
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nombre, self._paquete)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        # Solo se invoca para atributos que no son del propio proxy
+        return getattr(self._cargar(), atributo)
+
+    def __repr__(self):
+        estado = 'cargado' if self._modulo is not None else 'sin cargar'
+        return f"<ModuloPerezoso {self._nombre!r} ({estado})>"
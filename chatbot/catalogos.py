@@ -0,0 +1,106 @@
+# catalogos.py
+# Catálogos de países y de ciudades por país: datos de referencia que casi
+# no cambian. Se sirven como bytes JSON ya armados (y ya comprimidos con
+# gzip) desde una caché por proceso. La versión de cada catálogo es la del
+# gazetteer (MAX(updated_at) y COUNT de la tabla): cuando cambian los datos
+# cambian la clave y el ETag, y la entrada vieja deja de usarse.
+import gzip
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache_local import CacheLRU, SingleFlight
+from .gazetteer import obtener_gazetteer
+from .models import Cities, Countries
+
+_catalogos = CacheLRU(settings.CATALOGO_CACHE_MAXIMO)
+_vuelos = SingleFlight()
+_acepta_gzip = re.compile(r'\bgzip\b')
+
+
+class Catalogo:
+    def __init__(self, datos, version, ultima_modificacion):
+        self.cuerpo = json.dumps(
+            {'status': 'success', 'data': datos}, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+        # mtime=0: mismos bytes en todos los procesos
+        self.comprimido = gzip.compress(self.cuerpo, mtime=0)
+        # Débil: el cuerpo cambia según Content-Encoding, el contenido no
+        self.etag = 'W/"%s"' % hashlib.sha256(repr(version).encode('utf-8')).hexdigest()[:32]
+        self.ultima_modificacion = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+
+
+def _obtener(clave, construir):
+    catalogo = _catalogos.get(clave)
+    if catalogo is not None:
+        return catalogo
+
+    def calcular():
+        guardado = _catalogos.get(clave)
+        if guardado is None:
+            guardado = construir()
+            _catalogos.set(clave, guardado)
+        return guardado
+
+    return _vuelos.ejecutar(clave, calcular)
+
+
+def paises():
+    version = obtener_gazetteer().version[0]
+
+    def construir():
+        filas = list(Countries.objects.order_by('name').values_list('id', 'name', 'updated_at'))
+        return Catalogo(
+            [{"id": ident, "name": nombre} for ident, nombre, _ in filas],
+            version,
+            max((f[2] for f in filas if f[2]), default=None),
+        )
+
+    return _obtener(('paises', version), construir)
+
+
+def ciudades(pais_id):
+    version = obtener_gazetteer().version[2]
+
+    def construir():
+        filas = list(
+            Cities.objects.filter(country_id=pais_id).order_by('name')
+            .values_list('id', 'name', 'latitude', 'longitude', 'updated_at')
+        )
+        return Catalogo(
+            [{"id": ident, "name": nombre, "latitude": lat, "longitude": lon} for ident, nombre, lat, lon, _ in filas],
+            (pais_id, version),
+            max((f[4] for f in filas if f[4]), default=None),
+        )
+
+    return _obtener(('ciudades', pais_id, version), construir)
+
+
+def respuesta(request, catalogo):
+    # 304 si el cliente ya tiene esta versión (If-None-Match / If-Modified-Since)
+    respuesta = get_conditional_response(
+        request, etag=catalogo.etag, last_modified=catalogo.ultima_modificacion
+    )
+    if respuesta is None:
+        if _acepta_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            respuesta = HttpResponse(catalogo.comprimido, content_type='application/json')
+            respuesta['Content-Encoding'] = 'gzip'
+        else:
+            respuesta = HttpResponse(catalogo.cuerpo, content_type='application/json')
+        respuesta['Content-Length'] = len(respuesta.content)
+
+    respuesta['ETag'] = catalogo.etag
+    if catalogo.ultima_modificacion is not None:
+        respuesta['Last-Modified'] = http_date(catalogo.ultima_modificacion)
+    respuesta['Cache-Control'] = f'public, max-age={settings.CATALOGO_MAX_AGE}'
+    patch_vary_headers(respuesta, ['Accept-Encoding'])
+    return respuesta
+
+
+def vaciar():
+    _catalogos.clear()
@@ -0,0 +1,281 @@
+# clima_cache.py
+# Caché de pronósticos en tres niveles alrededor de openweather.obtener_clima:
+# memoria del proceso (LRU) -> tabla Clima -> API de OpenWeather.
+# Un pronóstico "fresco" se sirve directamente; uno "obsoleto" se sirve
+# mientras se actualiza en segundo plano, de modo que una ciudad muy
+# consultada nunca bloquea la petición esperando a la red.
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .cache_local import CacheLRU, SingleFlight, SingleFlightAsync
+from .carga_perezosa import ModuloPerezoso
+from .geo_espacial import ciudades_cercanas
+from .models import Clima
+
+openweather = ModuloPerezoso('.openweather', __package__)
+
+DIAS_POR_DEFECTO = 3
+# Filas de Clima creadas solo para enlazar itinerarios a fechas sin
+# pronóstico todavía; nunca se sirven y la API las sobrescribe al guardar.
+ESTADO_SIN_PRONOSTICO = 'sin pronóstico'
+CAMPOS_ACTUALIZABLES = [
+    'temperatura_maxima', 'temperatura_minima', 'estado_clima',
+    'humedad', 'probabilidad_lluvia', 'updated_at',
+]
+
+_memoria = CacheLRU(getattr(settings, 'CLIMA_CACHE_MAXIMO', 1000))
+_vuelos = SingleFlight()
+_vuelos_async = SingleFlightAsync()
+# Pool compartido por todas las peticiones por lotes: acota las llamadas
+# simultáneas a OpenWeather del proceso, no solo las de cada petición
+_ejecutor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'CLIMA_BATCH_CONCURRENCIA', 8), thread_name_prefix='clima'
+)
+
+
+def _ttl_fresco():
+    return getattr(settings, 'CLIMA_TTL_FRESCO', 3 * 3600)
+
+
+def _ttl_obsoleto():
+    return getattr(settings, 'CLIMA_TTL_OBSOLETO', 24 * 3600)
+
+
+def _espera_tras_fallo():
+    return getattr(settings, 'CLIMA_ESPERA_TRAS_FALLO', 300)
+
+
+def _es_fresco(entrada):
+    # Un pronóstico obtenido otro día ya no es fresco aunque no haya vencido
+    # su TTL: los días del pronóstico se desplazaron.
+    obtenido = entrada['obtenido_en']
+    if datetime.fromtimestamp(obtenido).date() != datetime.now().date():
+        return False
+    return time.time() - obtenido < _ttl_fresco()
+
+
+def _es_utilizable(entrada):
+    return time.time() - entrada['obtenido_en'] < _ttl_obsoleto()
+
+
+def _clima_a_dict(clima):
+    return {
+        "fecha": clima.fecha.strftime('%Y-%m-%d'),
+        "temperatura": {
+            "maxima": clima.temperatura_maxima,
+            "minima": clima.temperatura_minima
+        },
+        "estado": clima.estado_clima,
+        "humedad": clima.humedad,
+        "probabilidad_lluvia": clima.probabilidad_lluvia
+    }
+
+
+def _entrada_desde_filas(filas):
+    if not filas:
+        return None
+    marcas = [c.updated_at or c.created_at for c in filas if c.updated_at or c.created_at]
+    return {
+        'datos': [_clima_a_dict(c) for c in filas],
+        # Sin marcas de tiempo no se sabe su antigüedad: se trata como obsoleto
+        'obtenido_en': min(marcas).timestamp() if marcas else time.time() - _ttl_fresco(),
+    }
+
+
+def _desde_bd(ciudad):
+    hoy = datetime.now().date()
+    filas = list(Clima.objects.filter(
+        ciudad_id=ciudad.id,
+        pais_id=ciudad.country_id,
+        fecha__gte=hoy
+    ).exclude(estado_clima=ESTADO_SIN_PRONOSTICO).order_by('fecha'))
+    if filas:
+        return _entrada_desde_filas(filas)
+
+    # Reutilizar el pronóstico guardado de una ciudad muy cercana
+    cercanas = ciudades_cercanas(ciudad.id, settings.CLIMA_RADIO_COMPARTIDO_KM, limite=20)
+    if not cercanas:
+        return None
+    filas = list(Clima.objects.filter(
+        ciudad_id__in=[ident for ident, _ in cercanas],
+        fecha__gte=hoy
+    ).exclude(estado_clima=ESTADO_SIN_PRONOSTICO).order_by('fecha'))
+    for ident, _ in cercanas:
+        propias = [c for c in filas if c.ciudad_id == ident]
+        if propias:
+            return _entrada_desde_filas(propias)
+    return None
+
+
+def _guardar(ciudad, pronostico):
+    # Todos los días del pronóstico en un único INSERT ... ON CONFLICT/
+    # ON DUPLICATE KEY UPDATE sobre ('fecha', 'ciudad', 'pais').
+    filas = [
+        Clima(
+            fecha=datetime.strptime(dia_clima['fecha'], '%Y-%m-%d').date(),
+            ciudad_id=ciudad.id,
+            pais_id=ciudad.country_id,
+            temperatura_maxima=dia_clima['temperatura']['maxima'],
+            temperatura_minima=dia_clima['temperatura']['minima'],
+            estado_clima=dia_clima['estado'],
+            humedad=dia_clima['humedad'],
+            probabilidad_lluvia=dia_clima['probabilidad_lluvia'],
+        )
+        for dia_clima in pronostico
+    ]
+    # MySQL no admite indicar las columnas del conflicto: usa la clave única
+    unicos = ['fecha', 'ciudad', 'pais'] if connection.features.supports_update_conflicts_with_target else None
+    with transaction.atomic():
+        Clima.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=unicos,
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+
+
+def _desde_api(ciudad):
+    pronostico = openweather.obtener_clima(ciudad.latitude, ciudad.longitude)
+    if not pronostico:
+        return None
+    entrada = {'datos': pronostico, 'obtenido_en': time.time()}
+    _guardar(ciudad, pronostico)
+    _memoria.set(ciudad.id, entrada, ttl=_ttl_obsoleto())
+    return entrada
+
+
+def _actualizar_en_segundo_plano(ciudad, entrada):
+    # Si la última actualización falló se sigue sirviendo la entrada obsoleta
+    # sin volver a llamar a la API hasta que pase la espera: con la API caída,
+    # cada lectura lanzaría un hilo y una llamada nuevos.
+    if time.time() - entrada.get('fallo_en', 0) < _espera_tras_fallo():
+        return
+
+    def tarea():
+        nueva = None
+        try:
+            nueva = _desde_api(ciudad)
+            return nueva
+        finally:
+            if nueva is None:
+                entrada['fallo_en'] = time.time()
+            connections.close_all()
+
+    _vuelos.en_segundo_plano(('api', ciudad.id), tarea)
+
+
+def _vigentes(entrada, dias):
+    hoy = datetime.now().strftime('%Y-%m-%d')
+    return [d for d in entrada['datos'] if d['fecha'] >= hoy][:dias]
+
+
+def obtener_pronostico(ciudad, dias=DIAS_POR_DEFECTO):
+    # `ciudad` es un CiudadGeo del gazetteer. Devuelve la lista de días o None.
+    entrada = _memoria.get(ciudad.id)
+    if entrada is None:
+        entrada = _vuelos.ejecutar(('bd', ciudad.id), lambda: _desde_bd(ciudad))
+        if entrada is not None:
+            _memoria.set(ciudad.id, entrada, ttl=_ttl_obsoleto())
+
+    if entrada is not None and not _vigentes(entrada, dias):
+        entrada = None
+
+    if entrada is None or not _es_utilizable(entrada):
+        # Sin nada que servir: hay que esperar a la API (una sola llamada por ciudad)
+        nueva = _vuelos.ejecutar(('api', ciudad.id), lambda: _desde_api(ciudad))
+        entrada = nueva or entrada
+    elif not _es_fresco(entrada):
+        _actualizar_en_segundo_plano(ciudad, entrada)
+
+    return _vigentes(entrada, dias) if entrada else None
+
+
+def obtener_pronosticos(ciudades, dias=DIAS_POR_DEFECTO):
+    # Versión por lotes de obtener_pronostico: una sola consulta a Clima para
+    # todas las ciudades que no están en memoria y llamadas a la API en
+    # paralelo (acotadas) para las que tampoco están en la tabla.
+    # Devuelve {ciudad_id: lista de días o None}.
+    ciudades = {c.id: c for c in ciudades}
+    entradas = {}
+    pendientes = []
+    for ident in ciudades:
+        entrada = _memoria.get(ident)
+        if entrada is not None and _vigentes(entrada, dias):
+            entradas[ident] = entrada
+        else:
+            pendientes.append(ident)
+
+    if pendientes:
+        filas = Clima.objects.filter(
+            ciudad_id__in=pendientes,
+            fecha__gte=datetime.now().date()
+        ).exclude(estado_clima=ESTADO_SIN_PRONOSTICO).order_by('fecha')
+        por_ciudad = {}
+        for clima in filas:
+            if clima.pais_id == ciudades[clima.ciudad_id].country_id:
+                por_ciudad.setdefault(clima.ciudad_id, []).append(clima)
+        for ident, propias in por_ciudad.items():
+            entradas[ident] = _entrada_desde_filas(propias)
+            _memoria.set(ident, entradas[ident], ttl=_ttl_obsoleto())
+
+    faltantes = [i for i in ciudades if i not in entradas or not _es_utilizable(entradas[i])]
+    for ident in ciudades:
+        if ident not in faltantes and not _es_fresco(entradas[ident]):
+            _actualizar_en_segundo_plano(ciudades[ident], entradas[ident])
+
+    def desde_api(ident):
+        try:
+            return _vuelos.ejecutar(('api', ident), lambda: _desde_api(ciudades[ident]))
+        except Exception as e:
+            print(f"Error al obtener el clima de la ciudad {ident}: {e}")
+            return None
+        finally:
+            connections.close_all()
+
+    for ident, nueva in zip(faltantes, _ejecutor.map(desde_api, faltantes)):
+        if nueva is not None:
+            entradas[ident] = nueva
+
+    return {
+        ident: (_vigentes(entradas[ident], dias) or None) if ident in entradas else None
+        for ident in ciudades
+    }
+
+
+async def _desde_api_async(ciudad):
+    pronostico = await openweather.obtener_clima_async(ciudad.latitude, ciudad.longitude)
+    if not pronostico:
+        return None
+    entrada = {'datos': pronostico, 'obtenido_en': time.time()}
+    await sync_to_async(_guardar)(ciudad, pronostico)
+    _memoria.set(ciudad.id, entrada, ttl=_ttl_obsoleto())
+    return entrada
+
+
+async def obtener_pronostico_async(ciudad, dias=DIAS_POR_DEFECTO):
+    # Igual que obtener_pronostico, pero la llamada a la API no ocupa un hilo
+    entrada = _memoria.get(ciudad.id)
+    if entrada is None:
+        entrada = await sync_to_async(_desde_bd)(ciudad)
+        if entrada is not None:
+            _memoria.set(ciudad.id, entrada, ttl=_ttl_obsoleto())
+
+    if entrada is not None and not _vigentes(entrada, dias):
+        entrada = None
+
+    if entrada is None or not _es_utilizable(entrada):
+        nueva = await _vuelos_async.ejecutar(('api', ciudad.id), lambda: _desde_api_async(ciudad))
+        entrada = nueva or entrada
+    elif not _es_fresco(entrada):
+        _actualizar_en_segundo_plano(ciudad, entrada)
+
+    return _vigentes(entrada, dias) if entrada else None
+
+
+def invalidar(ciudad_id):
+    _memoria.delete(ciudad_id)
@@ -1,22 +1,61 @@
+import json
 import os
 import requests
+from django.conf import settings
+
+from . import upstream
 
 API_KEY = os.getenv("API_KEY_OPENAI")
 API_URL = "https://api.deepseek.com/v1/chat/completions"
 
-def enviar_prompt(prompt_usuario):
+class ErrorDeepSeek(Exception):
+    # Falla de la API durante una respuesta en streaming
+    pass
+
+def _peticion(prompt_usuario, stream=False, formato_json=False):
     headers = {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type": "application/json"
     }
 
     data = {
-        "model": "deepseek-chat",
+        "model": settings.DEEPSEEK_MODELO,
         "messages": [{"role": "user", "content": prompt_usuario}],
-        "temperature": 0.7
+        "temperature": settings.DEEPSEEK_TEMPERATURA
     }
+    if stream:
+        data["stream"] = True
+    if formato_json:
+        # Modo JSON: el prompt debe pedir explícitamente una respuesta en JSON
+        data["response_format"] = {"type": "json_object"}
+    return headers, data
+
+def _fragmento(linea):
+    # Cada evento del stream es "data: {json}"; el último es "data: [DONE]".
+    # Devuelve el texto nuevo, "" si la línea no trae texto o None al terminar.
+    if not linea.startswith("data:"):
+        return ""
+    contenido = linea[len("data:"):].strip()
+    if contenido == "[DONE]":
+        return None
+    try:
+        opciones = json.loads(contenido).get("choices") or [{}]
+        return opciones[0].get("delta", {}).get("content") or ""
+    except (ValueError, AttributeError, TypeError, KeyError) as e:
+        print(f"Error en DeepSeek API: evento inválido {contenido[:200]!r}")
+        raise ErrorDeepSeek(f"Evento inválido en el stream: {e}")
+
+def _timeout():
+    return (settings.UPSTREAM_TIMEOUT_CONEXION, settings.DEEPSEEK_TIMEOUT)
+
+def enviar_prompt(prompt_usuario, formato_json=False):
+    headers, data = _peticion(prompt_usuario, formato_json=formato_json)
 
-    response = requests.post(API_URL, headers=headers, json=data)
+    try:
+        response = upstream.post('deepseek', API_URL, headers=headers, json=data, timeout=_timeout())
+    except requests.exceptions.RequestException as e:
+        print(f"Error en DeepSeek API: {e}")
+        return None
 
     if response.status_code == 200:
         respuesta = response.json()
@@ -24,3 +63,77 @@ def enviar_prompt(prompt_usuario):
     else:
         print(f"Error {response.status_code}: {response.text}")
         return None
+
+async def enviar_prompt_async(prompt_usuario):
+    headers, data = _peticion(prompt_usuario)
+
+    try:
+        response = await upstream.post_async('deepseek', API_URL, headers=headers, json=data, timeout=_timeout())
+    except upstream.ERRORES_ASYNC as e:
+        print(f"Error en DeepSeek API: {e}")
+        return None
+
+    if response.status_code == 200:
+        respuesta = response.json()
+        return respuesta['choices'][0]['message']['content']
+    else:
+        print(f"Error {response.status_code}: {response.text}")
+        return None
+
+def enviar_prompt_stream(prompt_usuario):
+    # Generador con los fragmentos de texto a medida que DeepSeek los produce
+    headers, data = _peticion(prompt_usuario, stream=True)
+
+    try:
+        response = upstream.post('deepseek', API_URL, headers=headers, json=data, timeout=_timeout(), stream=True)
+    except requests.exceptions.RequestException as e:
+        print(f"Error en DeepSeek API: {e}")
+        raise ErrorDeepSeek(str(e))
+
+    with response:
+        if response.status_code != 200:
+            print(f"Error {response.status_code}: {response.text}")
+            raise ErrorDeepSeek(f"DeepSeek respondió {response.status_code}")
+        # SSE siempre es UTF-8; sin charset en la cabecera requests usaría ISO-8859-1
+        response.encoding = 'utf-8'
+        try:
+            for linea in response.iter_lines(decode_unicode=True):
+                fragmento = _fragmento(linea or "")
+                if fragmento is None:
+                    return
+                if fragmento:
+                    yield fragmento
+        except requests.exceptions.RequestException as e:
+            print(f"Error en DeepSeek API: {e}")
+            raise ErrorDeepSeek(str(e))
+        # Sin "[DONE]" la conexión se cortó a mitad de la respuesta
+        print("Error en DeepSeek API: el stream terminó sin [DONE]")
+        raise ErrorDeepSeek("Stream incompleto")
+
+async def enviar_prompt_stream_async(prompt_usuario):
+    headers, data = _peticion(prompt_usuario, stream=True)
+
+    try:
+        response = await upstream.post_async('deepseek', API_URL, headers=headers, json=data, timeout=_timeout(), stream=True)
+    except upstream.ERRORES_ASYNC as e:
+        print(f"Error en DeepSeek API: {e}")
+        raise ErrorDeepSeek(str(e))
+
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            print(f"Error {response.status_code}: {response.text}")
+            raise ErrorDeepSeek(f"DeepSeek respondió {response.status_code}")
+        async for linea in response.aiter_lines():
+            fragmento = _fragmento(linea)
+            if fragmento is None:
+                return
+            if fragmento:
+                yield fragmento
+        print("Error en DeepSeek API: el stream terminó sin [DONE]")
+        raise ErrorDeepSeek("Stream incompleto")
+    except upstream.ERRORES_ASYNC as e:
+        print(f"Error en DeepSeek API: {e}")
+        raise ErrorDeepSeek(str(e))
+    finally:
+        await response.aclose()
@@ -0,0 +1,80 @@
+# deepseek_cache.py
+# Caché de respuestas de DeepSeek alrededor de deepseek.enviar_prompt. La
+# clave es el hash del prompt normalizado junto con el modelo y la
+# temperatura; prompts idénticos que llegan a la vez comparten una única
+# llamada a la API (single-flight).
+import hashlib
+import json
+import unicodedata
+
+from django.conf import settings
+
+from .cache_local import CacheLRU, SingleFlight, SingleFlightAsync
+from .carga_perezosa import ModuloPerezoso
+
+deepseek = ModuloPerezoso('.deepseek', __package__)
+
+_respuestas = CacheLRU(settings.DEEPSEEK_CACHE_MAXIMO)
+_vuelos = SingleFlight()
+_vuelos_async = SingleFlightAsync()
+
+
+def normalizar_prompt(prompt):
+    # Espacios y saltos de línea sobrantes no cambian la respuesta
+    return ' '.join(unicodedata.normalize('NFC', prompt).split())
+
+
+def clave_prompt(prompt, formato_json=False):
+    contenido = json.dumps(
+        [settings.DEEPSEEK_MODELO, settings.DEEPSEEK_TEMPERATURA, formato_json, normalizar_prompt(prompt)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _guardar(clave, respuesta):
+    # Los errores (None) no se guardan
+    if respuesta is not None and settings.DEEPSEEK_CACHE_TTL > 0:
+        _respuestas.set(clave, respuesta, ttl=settings.DEEPSEEK_CACHE_TTL)
+    return respuesta
+
+
+def obtener_respuesta(prompt, formato_json=False):
+    clave = clave_prompt(prompt, formato_json)
+    respuesta = _respuestas.get(clave)
+    if respuesta is not None:
+        return respuesta
+
+    def calcular():
+        # Otro hilo pudo terminar la misma llamada mientras se buscaba en caché
+        guardada = _respuestas.get(clave)
+        if guardada is not None:
+            return guardada
+        return _guardar(clave, deepseek.enviar_prompt(prompt, formato_json=formato_json))
+
+    return _vuelos.ejecutar(clave, calcular)
+
+
+async def obtener_respuesta_async(prompt):
+    clave = clave_prompt(prompt)
+    respuesta = _respuestas.get(clave)
+    if respuesta is not None:
+        return respuesta
+
+    async def calcular():
+        return _guardar(clave, await deepseek.enviar_prompt_async(prompt))
+
+    return await _vuelos_async.ejecutar(clave, calcular)
+
+
+def respuesta_guardada(prompt):
+    return _respuestas.get(clave_prompt(prompt))
+
+
+def guardar_respuesta(prompt, respuesta):
+    # Para respuestas armadas fuera de obtener_respuesta (p. ej. en streaming)
+    _guardar(clave_prompt(prompt), respuesta or None)
+
+
+def invalidar(prompt, formato_json=False):
+    _respuestas.delete(clave_prompt(prompt, formato_json))
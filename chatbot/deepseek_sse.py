@@ -0,0 +1,76 @@
+# deepseek_sse.py
+# Reenvía al cliente la respuesta de DeepSeek en streaming como Server-Sent
+# Events: el primer fragmento llega en cuanto DeepSeek genera el primer
+# token, en lugar de esperar la respuesta completa.
+#
+# Eventos: "message" con {"contenido": texto} por cada fragmento, y al final
+# "fin" con {"status": "success"} o "error" con {"status": "error", "message"}.
+import json
+
+from django.http import StreamingHttpResponse
+
+from . import deepseek_cache
+from .carga_perezosa import ModuloPerezoso
+
+deepseek = ModuloPerezoso('.deepseek', __package__)
+
+
+def evento_sse(datos, evento=None):
+    # json.dumps escapa los saltos de línea, que romperían el formato SSE
+    cabecera = f"event: {evento}\n" if evento else ""
+    return f"{cabecera}data: {json.dumps(datos, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def _fin():
+    return evento_sse({'status': 'success'}, 'fin')
+
+
+def _error(mensaje):
+    return evento_sse({'status': 'error', 'message': mensaje}, 'error')
+
+
+def eventos(prompt):
+    guardada = deepseek_cache.respuesta_guardada(prompt)
+    if guardada is not None:
+        yield evento_sse({'contenido': guardada})
+        yield _fin()
+        return
+
+    partes = []
+    try:
+        for fragmento in deepseek.enviar_prompt_stream(prompt):
+            partes.append(fragmento)
+            yield evento_sse({'contenido': fragmento})
+    except deepseek.ErrorDeepSeek:
+        yield _error('Error al generar respuesta desde DeepSeek.')
+        return
+    # Solo se guarda si el stream terminó completo
+    deepseek_cache.guardar_respuesta(prompt, ''.join(partes))
+    yield _fin()
+
+
+async def eventos_async(prompt):
+    guardada = deepseek_cache.respuesta_guardada(prompt)
+    if guardada is not None:
+        yield evento_sse({'contenido': guardada})
+        yield _fin()
+        return
+
+    partes = []
+    try:
+        async for fragmento in deepseek.enviar_prompt_stream_async(prompt):
+            partes.append(fragmento)
+            yield evento_sse({'contenido': fragmento})
+    except deepseek.ErrorDeepSeek:
+        yield _error('Error al generar respuesta desde DeepSeek.')
+        return
+    deepseek_cache.guardar_respuesta(prompt, ''.join(partes))
+    yield _fin()
+
+
+def respuesta_sse(generador):
+    respuesta = StreamingHttpResponse(generador, content_type='text/event-stream; charset=utf-8')
+    respuesta['Cache-Control'] = 'no-cache'
+    # Evita que nginx acumule la respuesta antes de enviarla
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
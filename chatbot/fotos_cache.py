@@ -0,0 +1,234 @@
+# fotos_cache.py
+# Caché persistente alrededor de la cadena de Google Places de images.py, en
+# dos niveles: consulta normalizada -> place_id (tabla foto_consulta) y
+# place_id -> photo_references (tabla foto_lugar). Variantes con errores de
+# escritura que Google resuelve al mismo lugar comparten la entrada del
+# segundo nivel. Se guardan las referencias y no las URLs, que llevan la
+# API key y se arman al leer.
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .carga_perezosa import ModuloPerezoso
+from .gazetteer import normalizar_nombre
+from .models import Foto_Consulta, Foto_Lugar
+
+images = ModuloPerezoso('.images', __package__)
+
+MAX_FOTOS = 5
+
+
+class Estadisticas:
+    def __init__(self):
+        self.solicitudes = 0
+        self.aciertos_consulta = 0
+        self.aciertos_lugar = 0
+        self.fallos = 0
+        self.parciales = 0
+        self.no_encontrados = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, resultado):
+        with self._lock:
+            self.solicitudes += 1
+            setattr(self, resultado, getattr(self, resultado) + 1)
+
+    def como_dict(self):
+        aciertos = self.aciertos_consulta + self.aciertos_lugar
+        return {
+            'solicitudes': self.solicitudes,
+            'aciertos_consulta': self.aciertos_consulta,
+            'aciertos_lugar': self.aciertos_lugar,
+            'fallos': self.fallos,
+            'parciales': self.parciales,
+            'no_encontrados': self.no_encontrados,
+            'tasa_aciertos': round(aciertos / self.solicitudes, 4) if self.solicitudes else None,
+            'tasa_aciertos_consulta': round(self.aciertos_consulta / self.solicitudes, 4) if self.solicitudes else None,
+        }
+
+
+_estadisticas = Estadisticas()
+_ultimo_desalojo = 0.0
+_lock_desalojo = threading.Lock()
+
+
+def _clave(nombre_lugar):
+    return normalizar_nombre(nombre_lugar)[:255]
+
+
+def _tocar(modelo, fila, ahora):
+    # ultimo_acceso (para el desalojo LRU) se escribe como mucho una vez por
+    # FOTOS_CACHE_GRANULARIDAD, no en cada lectura
+    if fila.ultimo_acceso < ahora - timedelta(seconds=settings.FOTOS_CACHE_GRANULARIDAD):
+        modelo.objects.filter(pk=fila.pk).update(ultimo_acceso=ahora)
+
+
+def _por_consulta(consulta):
+    try:
+        ahora = timezone.now()
+        fila = Foto_Consulta.objects.select_related('lugar').filter(consulta=consulta).first()
+        if fila is None or fila.lugar.expira_en <= ahora:
+            return None
+        _tocar(Foto_Consulta, fila, ahora)
+        _tocar(Foto_Lugar, fila.lugar, ahora)
+        return fila.lugar.referencias
+    except DatabaseError as e:
+        print(f"Error al leer la caché de fotos: {e}")
+        return None
+
+
+def _por_lugar(consulta, place_id):
+    # Segundo nivel: si el lugar ya está, la consulta nueva queda apuntando a él
+    try:
+        ahora = timezone.now()
+        lugar = Foto_Lugar.objects.filter(place_id=place_id, expira_en__gt=ahora).first()
+        if lugar is None:
+            return None
+        _tocar(Foto_Lugar, lugar, ahora)
+        _guardar_consulta(consulta, lugar.id, ahora)
+        return lugar.referencias
+    except DatabaseError as e:
+        print(f"Error al leer la caché de fotos: {e}")
+        return None
+
+
+def _upsert(modelo, fila, unicos, actualizables):
+    # MySQL no admite indicar las columnas del conflicto: usa la clave única
+    modelo.objects.bulk_create(
+        [fila],
+        update_conflicts=True,
+        unique_fields=unicos if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=actualizables,
+    )
+
+
+def _guardar_consulta(consulta, lugar_id, ahora):
+    _upsert(
+        Foto_Consulta,
+        Foto_Consulta(consulta=consulta, lugar_id=lugar_id, ultimo_acceso=ahora),
+        ['consulta'], ['lugar', 'ultimo_acceso'],
+    )
+
+
+def _desalojar(modelo, maximo):
+    # Borra las filas menos usadas recientemente que excedan el máximo
+    exceso = modelo.objects.count() - maximo
+    if exceso > 0:
+        viejas = list(modelo.objects.order_by('ultimo_acceso').values_list('id', flat=True)[:exceso])
+        modelo.objects.filter(id__in=viejas).delete()
+
+
+def _toca_desalojar():
+    # Borrar vencidas y contar filas cuesta tres consultas: se hace como mucho
+    # una vez por FOTOS_CACHE_DESALOJO_INTERVALO, no en cada fallo de caché.
+    # Los máximos se pueden superar un poco entre dos desalojos.
+    global _ultimo_desalojo
+    with _lock_desalojo:
+        if time.monotonic() - _ultimo_desalojo < settings.FOTOS_CACHE_DESALOJO_INTERVALO:
+            return False
+        _ultimo_desalojo = time.monotonic()
+        return True
+
+
+def _vigencia(referencias):
+    # Un lugar sin fotos puede tenerlas pronto: se vuelve a consultar antes
+    if not referencias:
+        return timedelta(hours=settings.FOTOS_CACHE_TTL_VACIO_HORAS)
+    return timedelta(days=settings.FOTOS_CACHE_TTL_DIAS)
+
+
+def _guardar(consulta, place_id, referencias):
+    ahora = timezone.now()
+    try:
+        with transaction.atomic():
+            _upsert(
+                Foto_Lugar,
+                Foto_Lugar(
+                    place_id=place_id,
+                    referencias=referencias,
+                    expira_en=ahora + _vigencia(referencias),
+                    ultimo_acceso=ahora,
+                ),
+                ['place_id'], ['referencias', 'expira_en', 'ultimo_acceso'],
+            )
+            # bulk_create no devuelve el id en MySQL
+            lugar_id = Foto_Lugar.objects.filter(place_id=place_id).values_list('id', flat=True).get()
+            _guardar_consulta(consulta, lugar_id, ahora)
+
+        if _toca_desalojar():
+            Foto_Lugar.objects.filter(expira_en__lte=ahora).delete()
+            _desalojar(Foto_Lugar, settings.FOTOS_CACHE_MAXIMO_LUGARES)
+            _desalojar(Foto_Consulta, settings.FOTOS_CACHE_MAXIMO_CONSULTAS)
+    except DatabaseError as e:
+        print(f"Error al guardar en la caché de fotos: {e}")
+
+
+def obtener_fotos(nombre_lugar, api_key, max_fotos=MAX_FOTOS, plazo=None):
+    # Misma salida que images.obtener_fotos_lugar_mejoradas (lista de URLs)
+    consulta = _clave(nombre_lugar)
+    referencias = _por_consulta(consulta)
+    if referencias is not None:
+        _estadisticas.registrar('aciertos_consulta')
+        return images.urls_de_fotos(referencias[:max_fotos], api_key)
+
+    limite = images.calcular_limite(plazo)
+    place_id, nombre = images.resolver_lugar(nombre_lugar, api_key, limite)
+    if place_id is None:
+        _estadisticas.registrar('no_encontrados')
+        return []
+
+    referencias = _por_lugar(consulta, place_id)
+    if referencias is not None:
+        _estadisticas.registrar('aciertos_lugar')
+        return images.urls_de_fotos(referencias[:max_fotos], api_key)
+
+    referencias, completo = images.referencias_de_lugar(place_id, nombre, api_key, max_fotos, limite)
+    if completo:
+        _estadisticas.registrar('fallos')
+        _guardar(consulta, place_id, referencias)
+    else:
+        # Un resultado parcial por vencimiento del plazo no se guarda
+        _estadisticas.registrar('parciales')
+    return images.urls_de_fotos(referencias, api_key)
+
+
+async def obtener_fotos_async(nombre_lugar, api_key, max_fotos=MAX_FOTOS, plazo=None):
+    consulta = _clave(nombre_lugar)
+    referencias = await sync_to_async(_por_consulta)(consulta)
+    if referencias is not None:
+        _estadisticas.registrar('aciertos_consulta')
+        return images.urls_de_fotos(referencias[:max_fotos], api_key)
+
+    limite = images.calcular_limite(plazo)
+    place_id, nombre = await images.resolver_lugar_async(nombre_lugar, api_key, limite)
+    if place_id is None:
+        _estadisticas.registrar('no_encontrados')
+        return []
+
+    referencias = await sync_to_async(_por_lugar)(consulta, place_id)
+    if referencias is not None:
+        _estadisticas.registrar('aciertos_lugar')
+        return images.urls_de_fotos(referencias[:max_fotos], api_key)
+
+    referencias, completo = await images.referencias_de_lugar_async(place_id, nombre, api_key, max_fotos, limite)
+    if completo:
+        _estadisticas.registrar('fallos')
+        await sync_to_async(_guardar)(consulta, place_id, referencias)
+    else:
+        _estadisticas.registrar('parciales')
+    return images.urls_de_fotos(referencias, api_key)
+
+
+def estadisticas():
+    datos = _estadisticas.como_dict()
+    try:
+        datos['lugares_guardados'] = Foto_Lugar.objects.count()
+        datos['consultas_guardadas'] = Foto_Consulta.objects.count()
+    except DatabaseError as e:
+        print(f"Error al contar la caché de fotos: {e}")
+    return datos
@@ -0,0 +1,246 @@
+# gazetteer.py
+# Índice geográfico en memoria (países, estados y ciudades) para no hacer
+# búsquedas `icontains` sobre la base de datos en cada petición.
+import gc
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Cities, Countries, States
+from .normalizacion import normalizar_nombre
+
+PaisGeo = namedtuple('PaisGeo', ['id', 'name'])
+CiudadGeo = namedtuple('CiudadGeo', [
+    'id', 'name', 'country_id', 'state_id', 'state_name', 'latitude', 'longitude'
+])
+
+TAMANO_LOTE = 5000
+
+
+def _buscar_en_ordenados(ordenados, nombre):
+    # `ordenados` es una lista de tuplas (nombre_normalizado, id) ordenada.
+    # Prioridad: coincidencia exacta, luego prefijo (nombre más corto) y por
+    # último subcadena, igual que el antiguo `icontains` pero determinista.
+    if not nombre:
+        return None
+
+    inicio = bisect_left(ordenados, (nombre,))
+    if inicio < len(ordenados) and ordenados[inicio][0] == nombre:
+        return ordenados[inicio][1]
+
+    mejor = None
+    for i in range(inicio, len(ordenados)):
+        candidato, ident = ordenados[i]
+        if not candidato.startswith(nombre):
+            break
+        if mejor is None or (len(candidato), ident) < mejor:
+            mejor = (len(candidato), ident)
+    if mejor:
+        return mejor[1]
+
+    for candidato, ident in ordenados:
+        if nombre in candidato and (mejor is None or (len(candidato), ident) < mejor):
+            mejor = (len(candidato), ident)
+    return mejor[1] if mejor else None
+
+
+def alias_de_paises(filas):
+    # filas: [(id, native, iso2, iso3, translations)]. Devuelve pares
+    # (alias normalizado, id) en orden de prioridad: ante un alias repetido
+    # gana el primero (iso3 antes que iso2, luego el nombre nativo y por
+    # último las traducciones). Los nombres propios van antes que todo.
+    filas = list(filas)
+    for posicion in (3, 2, 1):
+        for fila in filas:
+            yield normalizar_nombre(fila[posicion]), fila[0]
+    for ident, *_, traducciones in filas:
+        if isinstance(traducciones, dict):
+            for nombre in traducciones.values():
+                if isinstance(nombre, str):
+                    yield normalizar_nombre(nombre), ident
+
+
+@contextmanager
+def _sin_gc():
+    # Crear cientos de miles de tuplas dispara recolecciones del GC que
+    # recorren todo el índice sin liberar nada; se pausan mientras se arma.
+    activo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if activo:
+            gc.enable()
+
+
+def version_actual():
+    # Cambia cuando se modifica (updated_at) o se borra/inserta una fila.
+    return tuple(
+        tuple(modelo.objects.aggregate(Max('updated_at'), Count('id')).values())
+        for modelo in (Countries, States, Cities)
+    )
+
+
+class Gazetteer:
+    def __init__(self, paises, estados, ciudades, version=None, alias_paises=()):
+        # paises: [(id, name)], estados: [(id, name)],
+        # ciudades: [(id, name, country_id, state_id, latitude, longitude)],
+        # alias_paises: [(alias normalizado, id)] (ver alias_de_paises)
+        self.version = version
+        self.verificado_en = time.monotonic()
+        self.instantanea = None
+        with _sin_gc():
+            self._indexar(paises, estados, ciudades, alias_paises)
+
+    def _indexar(self, paises, estados, ciudades, alias_paises):
+        # Cada fila puede traer al final su nombre ya normalizado
+        # (name_normalized o la instantánea); si viene vacío se calcula
+        self.paises = {}
+        ordenados = []
+        for ident, nombre, *normalizado in paises:
+            self.paises[ident] = PaisGeo(ident, nombre)
+            ordenados.append((normalizado and normalizado[0] or normalizar_nombre(nombre), ident))
+        self._paises_ordenados = sorted(ordenados)
+
+        # Nombre, códigos ISO, nombre nativo y traducciones -> id
+        self.alias_paises = {}
+        for alias, ident in (*ordenados, *alias_paises):
+            if alias and ident in self.paises:
+                self.alias_paises.setdefault(alias, ident)
+
+        nombres_estado = dict(estados)
+
+        self.ciudades = {}
+        por_pais = {}
+        for ident, nombre, pais_id, estado_id, lat, lon, *normalizado in ciudades:
+            self.ciudades[ident] = CiudadGeo(
+                ident, nombre, pais_id, estado_id, nombres_estado.get(estado_id), lat, lon
+            )
+            por_pais.setdefault(pais_id, []).append(
+                (normalizado and normalizado[0] or normalizar_nombre(nombre), ident)
+            )
+        for lista in por_pais.values():
+            lista.sort()
+        self._ciudades_por_pais = por_pais
+
+    @classmethod
+    def desde_bd(cls):
+        version = version_actual()
+        paises = list(Countries.objects.values_list(
+            'id', 'name', 'name_normalized', 'native', 'iso2', 'iso3', 'translations'
+        ))
+        estados = States.objects.values_list('id', 'name').iterator(chunk_size=TAMANO_LOTE)
+        ciudades = Cities.objects.values_list(
+            'id', 'name', 'country_id', 'state_id', 'latitude', 'longitude', 'name_normalized'
+        ).iterator(chunk_size=TAMANO_LOTE)
+        return cls(
+            [fila[:3] for fila in paises], estados, ciudades, version=version,
+            alias_paises=alias_de_paises((fila[0], *fila[3:]) for fila in paises),
+        )
+
+    @classmethod
+    def desde_instantanea(cls, instantanea):
+        # Misma estructura que desde_bd, leída del archivo de geo_instantanea
+        gazetteer = cls(
+            instantanea.paises(), instantanea.estados(), instantanea.ciudades(), version=instantanea.version,
+            alias_paises=instantanea.alias_paises(),
+        )
+        gazetteer.instantanea = instantanea
+        return gazetteer
+
+    def buscar_pais(self, nombre, exacto=False):
+        # Primero cualquier alias exacto ("Alemania", "DEU", "Deutschland");
+        # si no (y exacto=False), prefijo o subcadena del nombre
+        normalizado = normalizar_nombre(nombre)
+        ident = self.alias_paises.get(normalizado)
+        if ident is None and not exacto:
+            ident = _buscar_en_ordenados(self._paises_ordenados, normalizado)
+        return self.paises.get(ident)
+
+    def buscar_ciudad(self, nombre, pais_id):
+        ordenados = self._ciudades_por_pais.get(pais_id, [])
+        ident = _buscar_en_ordenados(ordenados, normalizar_nombre(nombre))
+        return self.ciudades.get(ident)
+
+
+_gazetteer = None
+_obsoleto = False
+_lock = threading.Lock()
+
+
+def _intervalo_verificacion():
+    return getattr(settings, 'GEO_GAZETTEER_VERIFICACION', 300)
+
+
+def _construir():
+    # La primera carga del proceso usa la instantánea (GEO_INSTANTANEA) si
+    # existe y su versión coincide con la de la base de datos
+    ruta = getattr(settings, 'GEO_INSTANTANEA', '')
+    if ruta and os.path.exists(ruta):
+        from . import geo_instantanea
+        try:
+            instantanea = geo_instantanea.cargar(ruta)
+            if instantanea.version == version_actual():
+                return Gazetteer.desde_instantanea(instantanea)
+            print(f"La instantánea geográfica {ruta} está desactualizada; se carga desde la base de datos.")
+        except (OSError, geo_instantanea.InstantaneaInvalida) as e:
+            print(f"No se pudo usar la instantánea geográfica: {e}")
+    return Gazetteer.desde_bd()
+
+
+def obtener_gazetteer():
+    # Se construye una sola vez por proceso y se revisa periódicamente si los
+    # datos cambiaron. Mientras se reconstruye se sigue sirviendo la versión
+    # anterior; solo el hilo que obtiene el lock hace el trabajo.
+    global _gazetteer, _obsoleto
+    actual = _gazetteer
+    if actual is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = _construir()
+                _obsoleto = False
+            return _gazetteer
+
+    vencido = time.monotonic() - actual.verificado_en > _intervalo_verificacion()
+    if (_obsoleto or vencido) and _lock.acquire(blocking=False):
+        try:
+            if _obsoleto or version_actual() != actual.version:
+                _obsoleto = False
+                _gazetteer = Gazetteer.desde_bd()
+            else:
+                actual.verificado_en = time.monotonic()
+        finally:
+            _lock.release()
+    return _gazetteer
+
+
+def refrescar_gazetteer():
+    global _gazetteer, _obsoleto
+    with _lock:
+        _gazetteer = Gazetteer.desde_bd()
+        _obsoleto = False
+    return _gazetteer
+
+
+def buscar_pais(nombre, exacto=False):
+    return obtener_gazetteer().buscar_pais(nombre, exacto)
+
+
+def buscar_ciudad(nombre, pais_id):
+    return obtener_gazetteer().buscar_ciudad(nombre, pais_id)
+
+
+@receiver([post_save, post_delete], sender=Countries)
+@receiver([post_save, post_delete], sender=States)
+@receiver([post_save, post_delete], sender=Cities)
+def _marcar_obsoleto(sender, **kwargs):
+    global _obsoleto
+    _obsoleto = True
@@ -0,0 +1,379 @@
+# generador_viajes.py
+# Genera un viaje completo con DeepSeek (respuesta en JSON), lo valida y lo
+# guarda en una sola transacción: Viaje -> Itinerario -> Actividad ->
+# Actividad_Lugar, cada nivel con un único bulk_create.
+import json
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from . import deepseek_cache
+from .clima_cache import ESTADO_SIN_PRONOSTICO
+from .gazetteer import normalizar_nombre, obtener_gazetteer
+from .models import Actividad, Actividad_Lugar, Clima, Itinerario, Lugar, Tipo_Lugar, Transporte, Viaje
+from .persistencia import crear_en_bloque
+from .registro_masivo import COSTO_MAXIMO
+
+TURNOS = ('mañana', 'tarde', 'noche')
+_TURNOS_NORMALIZADOS = {normalizar_nombre(t): t for t in TURNOS}
+
+
+class DatosInvalidos(ValueError):
+    def __init__(self, errores):
+        super().__init__('; '.join(errores))
+        self.errores = errores
+
+
+def _texto(valor, maximo=None):
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+    valor = valor.strip()
+    return valor[:maximo] if maximo else valor
+
+
+def _monto(valor):
+    # Decimal acepta "NaN" e "Infinity": se rechazan antes de comparar
+    try:
+        monto = Decimal(str(valor))
+        if not monto.is_finite():
+            return None
+        monto = monto.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return monto if 0 <= monto <= COSTO_MAXIMO else None
+
+
+def validar_solicitud(data):
+    # Devuelve la solicitud con las ciudades resueltas en el gazetteer
+    if not isinstance(data, dict):
+        raise DatosInvalidos(['El cuerpo debe ser un objeto JSON.'])
+    errores = []
+    gazetteer = obtener_gazetteer()
+
+    def ciudad(campo_ciudad, campo_pais):
+        nombre, nombre_pais = _texto(data.get(campo_ciudad)), _texto(data.get(campo_pais))
+        if not nombre or not nombre_pais:
+            errores.append(f"Los campos '{campo_ciudad}' y '{campo_pais}' son obligatorios.")
+            return None
+        pais = gazetteer.buscar_pais(nombre_pais)
+        encontrada = gazetteer.buscar_ciudad(nombre, pais.id) if pais else None
+        if not encontrada:
+            errores.append(f"No se encontró la ciudad '{nombre}' en el país '{nombre_pais}'.")
+        return encontrada
+
+    destino = ciudad('ciudad', 'pais')
+    if data.get('ciudad_salida') or data.get('pais_salida'):
+        salida = ciudad('ciudad_salida', 'pais_salida')
+    else:
+        salida = destino
+
+    try:
+        dia_salida = date.fromisoformat(str(data.get('dia_salida')))
+    except ValueError:
+        dia_salida = None
+        errores.append("El campo 'dia_salida' debe tener el formato AAAA-MM-DD.")
+
+    try:
+        duracion = int(data.get('duracion_viaje'))
+    except (TypeError, ValueError):
+        duracion = 0
+    if not 1 <= duracion <= settings.VIAJE_DURACION_MAXIMA:
+        errores.append(f"El campo 'duracion_viaje' debe ser un entero entre 1 y {settings.VIAJE_DURACION_MAXIMA}.")
+
+    presupuesto = _monto(data.get('presupuesto'))
+    if presupuesto is None:
+        errores.append(f"El campo 'presupuesto' debe ser un número entre 0 y {COSTO_MAXIMO}.")
+
+    if errores:
+        raise DatosInvalidos(errores)
+    return {
+        'destino': destino,
+        'salida': salida,
+        'dia_salida': dia_salida,
+        'duracion': duracion,
+        'presupuesto': presupuesto,
+        'preferencias': _texto(data.get('preferencias'), 500) or '',
+    }
+
+
+def _prompt(solicitud, transportes, tipos_lugar):
+    gazetteer = obtener_gazetteer()
+    destino = solicitud['destino']
+    pais = gazetteer.paises[destino.country_id]
+    return (
+        f"Genera un itinerario de viaje de {solicitud['duracion']} días por {destino.name}, {pais.name} "
+        f"saliendo desde {solicitud['salida'].name} el {solicitud['dia_salida'].isoformat()}, "
+        f"con un presupuesto total de {solicitud['presupuesto']}. "
+        f"{('Preferencias del viajero: ' + solicitud['preferencias'] + '. ') if solicitud['preferencias'] else ''}"
+        "Responde únicamente con un objeto JSON con esta forma: "
+        '{"dias": [{"dia": 1, "ciudad": "nombre de la ciudad", "lugar": "zona o lugar principal del día", '
+        '"costo": 0.0, "transporte": "...", "actividades": [{"turno": "mañana", "lugares": '
+        '[{"nombre": "...", "descripcion": "...", "ubicacion": "...", "tipo": "..."}]}]}]}. '
+        f"Incluye exactamente {solicitud['duracion']} días numerados desde 1. "
+        f"'turno' debe ser uno de: {', '.join(TURNOS)}. "
+        f"'transporte' debe ser uno de: {', '.join(transportes)}. "
+        f"'tipo' debe ser uno de: {', '.join(tipos_lugar)}."
+    )
+
+
+def validar_plan(plan, duracion):
+    # Valida la estructura devuelta por DeepSeek y la normaliza
+    if not isinstance(plan, dict) or not isinstance(plan.get('dias'), list) or not plan['dias']:
+        raise DatosInvalidos(["La respuesta no contiene una lista 'dias'."])
+
+    errores = []
+    dias = []
+    vistos = set()
+    for i, dia in enumerate(plan['dias']):
+        ruta = f"dias[{i}]"
+        if not isinstance(dia, dict):
+            errores.append(f"{ruta}: debe ser un objeto.")
+            continue
+        numero = dia.get('dia')
+        if isinstance(numero, str) and numero.strip().isdigit():
+            numero = int(numero)
+        if not isinstance(numero, int) or not 1 <= numero <= duracion or numero in vistos:
+            errores.append(f"{ruta}.dia: debe ser un entero único entre 1 y {duracion}.")
+            continue
+        vistos.add(numero)
+
+        costo = _monto(dia.get('costo', 0))
+        if costo is None:
+            errores.append(f"{ruta}.costo: debe ser un número entre 0 y {COSTO_MAXIMO}.")
+
+        actividades = []
+        for j, actividad in enumerate(dia.get('actividades') or []):
+            ruta_actividad = f"{ruta}.actividades[{j}]"
+            turno = _texto(actividad.get('turno')) if isinstance(actividad, dict) else None
+            turno = _TURNOS_NORMALIZADOS.get(normalizar_nombre(turno)) if turno else None
+            if turno is None:
+                errores.append(f"{ruta_actividad}.turno: debe ser uno de {', '.join(TURNOS)}.")
+                continue
+            lugares = []
+            for k, lugar in enumerate(actividad.get('lugares') or []):
+                nombre = _texto(lugar.get('nombre'), 255) if isinstance(lugar, dict) else None
+                if nombre is None:
+                    errores.append(f"{ruta_actividad}.lugares[{k}].nombre: es obligatorio.")
+                    continue
+                lugares.append({
+                    'nombre': nombre,
+                    'descripcion': _texto(lugar.get('descripcion')) or '',
+                    'ubicacion': _texto(lugar.get('ubicacion'), 255) or '',
+                    'tipo': _texto(lugar.get('tipo')) or '',
+                })
+            actividades.append({'turno': turno, 'orden': j + 1, 'lugares': lugares})
+
+        dias.append({
+            'dia': numero,
+            'ciudad': _texto(dia.get('ciudad')),
+            'lugar': _texto(dia.get('lugar'), 255) or '',
+            'costo': costo,
+            'transporte': _texto(dia.get('transporte')) or '',
+            'actividades': actividades,
+        })
+
+    faltantes = sorted(set(range(1, duracion + 1)) - vistos)
+    if faltantes:
+        errores.append(f"Faltan los días: {', '.join(map(str, faltantes))}.")
+    if errores:
+        raise DatosInvalidos(errores)
+    return sorted(dias, key=lambda d: d['dia'])
+
+
+def _por_nombre(filas, atributo):
+    # {nombre normalizado: fila}; el primero (menor id) gana si se repite
+    mapa = {}
+    for fila in filas:
+        mapa.setdefault(normalizar_nombre(getattr(fila, atributo)), fila)
+    return mapa
+
+
+def _defecto(mapa):
+    # Para valores fuera del catálogo: "Otro"/"Otros" si existe, si no el primero
+    for clave in ('otro', 'otros'):
+        if clave in mapa:
+            return mapa[clave]
+    return next(iter(mapa.values()))
+
+
+def generar_plan(solicitud):
+    # Pide el plan a DeepSeek (vía la caché de prompts) y lo valida. Si la
+    # respuesta no es válida se descarta de la caché y se reintenta una vez.
+    transportes = list(Transporte.objects.select_related('tipo_transporte').order_by('id'))
+    tipos_lugar = list(Tipo_Lugar.objects.order_by('id'))
+    if not transportes or not tipos_lugar:
+        raise RuntimeError("No hay transportes o tipos de lugar registrados.")
+
+    prompt = _prompt(solicitud, [t.nombre for t in transportes], [t.nombre for t in tipos_lugar])
+    errores = []
+    for _ in range(2):
+        respuesta = deepseek_cache.obtener_respuesta(prompt, formato_json=True)
+        if respuesta is None:
+            return None
+        try:
+            dias = validar_plan(json.loads(respuesta), solicitud['duracion'])
+            return {'dias': dias, 'transportes': transportes, 'tipos_lugar': tipos_lugar}
+        except (ValueError, TypeError, AttributeError) as e:
+            errores = e.errores if isinstance(e, DatosInvalidos) else [f"JSON inválido: {e}"]
+            deepseek_cache.invalidar(prompt, formato_json=True)
+    raise DatosInvalidos(errores)
+
+
+def _climas(claves):
+    # Una fila de Clima por (fecha, ciudad, pais). Las que faltan se crean
+    # como marcadores ESTADO_SIN_PRONOSTICO en un solo INSERT.
+    ciudades = {ciudad_id for _, ciudad_id, _ in claves}
+    fechas = {fecha for fecha, _, _ in claves}
+
+    def existentes():
+        return {
+            (c.fecha, c.ciudad_id, c.pais_id): c.id
+            for c in Clima.objects.filter(ciudad_id__in=ciudades, fecha__in=fechas).only('id', 'fecha', 'ciudad_id', 'pais_id')
+        }
+
+    ids = existentes()
+    faltantes = [clave for clave in claves if clave not in ids]
+    if faltantes:
+        Clima.objects.bulk_create([
+            Clima(fecha=fecha, ciudad_id=ciudad_id, pais_id=pais_id,
+                  estado_clima=ESTADO_SIN_PRONOSTICO, humedad=0, probabilidad_lluvia=0)
+            for fecha, ciudad_id, pais_id in faltantes
+        ], ignore_conflicts=True)
+        ids = existentes()
+    return ids
+
+
+def guardar_viaje(solicitud, plan):
+    gazetteer = obtener_gazetteer()
+    destino = solicitud['destino']
+    transportes = _por_nombre(plan['transportes'], 'nombre')
+    tipos_lugar = _por_nombre(plan['tipos_lugar'], 'nombre')
+
+    # Ciudad de cada día: la que indique DeepSeek si existe en el país del
+    # destino (o en el de salida); si no, el destino.
+    dias = plan['dias']
+    for dia in dias:
+        ciudad = None
+        if dia['ciudad']:
+            ciudad = (gazetteer.buscar_ciudad(dia['ciudad'], destino.country_id)
+                      or gazetteer.buscar_ciudad(dia['ciudad'], solicitud['salida'].country_id))
+        dia['ciudad_geo'] = ciudad or destino
+        dia['fecha'] = solicitud['dia_salida'] + timedelta(days=dia['dia'] - 1)
+        dia['transporte_obj'] = transportes.get(normalizar_nombre(dia['transporte'])) or _defecto(transportes)
+
+    # Lugares: se reutilizan los ya registrados con el mismo nombre y ubicación
+    nuevos_lugares = {}
+    for dia in dias:
+        for actividad in dia['actividades']:
+            for lugar in actividad['lugares']:
+                nuevos_lugares.setdefault((lugar['nombre'], lugar['ubicacion']), lugar)
+
+    with transaction.atomic():
+        climas = _climas({
+            (dia['fecha'], dia['ciudad_geo'].id, dia['ciudad_geo'].country_id) for dia in dias
+        })
+
+        lugares = {
+            (l.nombre, l.ubicacion): l
+            for l in Lugar.objects.filter(nombre__in={nombre for nombre, _ in nuevos_lugares}).select_related('tipo_lugar')
+        }
+        por_crear = [
+            Lugar(
+                nombre=nombre,
+                ubicacion=ubicacion,
+                descripcion=datos['descripcion'],
+                tipo_lugar=tipos_lugar.get(normalizar_nombre(datos['tipo'])) or _defecto(tipos_lugar),
+            )
+            for (nombre, ubicacion), datos in nuevos_lugares.items()
+            if (nombre, ubicacion) not in lugares
+        ]
+        crear_en_bloque(Lugar, por_crear, ['nombre', 'ubicacion'])
+        lugares.update({(l.nombre, l.ubicacion): l for l in por_crear})
+
+        viaje = Viaje.objects.create(
+            presupuesto=solicitud['presupuesto'],
+            dia_salida=solicitud['dia_salida'],
+            ciudad_salida_id=solicitud['salida'].id,
+            duracion_viaje=solicitud['duracion'],
+        )
+
+        itinerarios = [
+            Itinerario(
+                viaje=viaje,
+                lugar=dia['lugar'],
+                ciudad_id=dia['ciudad_geo'].id,
+                pais_id=dia['ciudad_geo'].country_id,
+                dia=dia['dia'],
+                costo=dia['costo'],
+                clima_id=climas[(dia['fecha'], dia['ciudad_geo'].id, dia['ciudad_geo'].country_id)],
+                transporte=dia['transporte_obj'],
+            )
+            for dia in dias
+        ]
+        crear_en_bloque(Itinerario, itinerarios, ['viaje_id', 'dia'])
+
+        actividades = []
+        for dia, itinerario in zip(dias, itinerarios):
+            for actividad in dia['actividades']:
+                actividad['obj'] = Actividad(itinerario=itinerario, turno=actividad['turno'], orden=actividad['orden'])
+                actividades.append(actividad['obj'])
+        crear_en_bloque(Actividad, actividades, ['itinerario_id', 'orden'])
+
+        # unique_together (actividad, lugar): un lugar repetido en la misma actividad se omite
+        enlaces = {
+            (actividad['obj'].id, lugares[(lugar['nombre'], lugar['ubicacion'])].id)
+            for dia in dias for actividad in dia['actividades'] for lugar in actividad['lugares']
+        }
+        Actividad_Lugar.objects.bulk_create(
+            [Actividad_Lugar(actividad_id=a, lugar_id=l) for a, l in sorted(enlaces)]
+        )
+
+    # La respuesta se arma con los objetos en memoria, sin volver a consultar
+    return {
+        'id': viaje.id,
+        'presupuesto': float(viaje.presupuesto),
+        'dia_salida': viaje.dia_salida.isoformat(),
+        'ciudad_salida': {'id': solicitud['salida'].id, 'nombre': solicitud['salida'].name},
+        'duracion_viaje': viaje.duracion_viaje,
+        'estado': viaje.estado,
+        'itinerarios': [
+            {
+                'id': itinerario.id,
+                'dia': itinerario.dia,
+                'fecha': dia['fecha'].isoformat(),
+                'lugar': itinerario.lugar,
+                'ciudad': {'id': dia['ciudad_geo'].id, 'nombre': dia['ciudad_geo'].name},
+                'pais': {
+                    'id': dia['ciudad_geo'].country_id,
+                    'nombre': gazetteer.paises[dia['ciudad_geo'].country_id].name,
+                },
+                'costo': float(itinerario.costo),
+                'clima_id': itinerario.clima_id,
+                'transporte': {
+                    'id': dia['transporte_obj'].id,
+                    'nombre': dia['transporte_obj'].nombre,
+                    'tipo_transporte': dia['transporte_obj'].tipo_transporte.nombre,
+                },
+                'actividades': [
+                    {
+                        'id': actividad['obj'].id,
+                        'turno': actividad['turno'],
+                        'orden': actividad['orden'],
+                        'lugares': [
+                            {
+                                'id': lugares[(lugar['nombre'], lugar['ubicacion'])].id,
+                                'nombre': lugar['nombre'],
+                                'ubicacion': lugar['ubicacion'],
+                                'tipo_lugar': lugares[(lugar['nombre'], lugar['ubicacion'])].tipo_lugar.nombre,
+                            }
+                            for lugar in actividad['lugares']
+                        ],
+                    }
+                    for actividad in dia['actividades']
+                ],
+            }
+            for dia, itinerario in zip(dias, itinerarios)
+        ],
+    }
@@ -0,0 +1,139 @@
+# geo_espacial.py
+# Índice espacial (grilla de celdas lat/lon) sobre las coordenadas de Cities
+# para consultas de ciudad más cercana y de ciudades dentro de un radio.
+import math
+import threading
+
+import numpy as np
+
+from .gazetteer import obtener_gazetteer
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = 111.195
+TAMANO_CELDA = 0.5  # grados
+
+
+class IndiceEspacial:
+    def __init__(self, ids, latitudes, longitudes, tamano_celda=TAMANO_CELDA):
+        ids = np.asarray(ids, dtype=np.int64)
+        latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -90.0, 90.0)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        self.tamano = tamano_celda
+        self.filas = int(math.ceil(180 / tamano_celda))
+        self.columnas = int(math.ceil(360 / tamano_celda))
+
+        # Una sola pasada vectorizada: celda de cada punto y orden por celda
+        celdas = self._celdas(latitudes, longitudes)
+        orden = np.argsort(celdas, kind='stable')
+        self.celdas = celdas[orden]
+        self.ids = ids[orden]
+        self.latitudes = latitudes[orden]
+        self.longitudes = longitudes[orden]
+        self._lat_rad = np.radians(self.latitudes)
+        self._lon_rad = np.radians(self.longitudes)
+        self._cos_lat = np.cos(self._lat_rad)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _fila(self, lat):
+        return np.minimum(((lat + 90.0) // self.tamano).astype(np.int64), self.filas - 1)
+
+    def _columna(self, lon):
+        return ((lon + 180.0) // self.tamano).astype(np.int64) % self.columnas
+
+    def _celdas(self, lat, lon):
+        return self._fila(lat) * self.columnas + self._columna(lon)
+
+    def _distancias(self, posiciones, lat, lon):
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        dlat = self._lat_rad[posiciones] - lat_r
+        dlon = self._lon_rad[posiciones] - lon_r
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat_r) * self._cos_lat[posiciones] * np.sin(dlon / 2) ** 2
+        return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _posiciones_en_caja(self, lat, lon, km):
+        dlat = km / KM_POR_GRADO
+        fila_min = int(self._fila(np.array(max(lat - dlat, -90.0))))
+        fila_max = int(self._fila(np.array(min(lat + dlat, 90.0))))
+
+        lat_extrema = min(abs(lat) + dlat, 90.0)
+        coseno = math.cos(math.radians(lat_extrema))
+        dlon = km / (KM_POR_GRADO * coseno) if coseno > 1e-9 else 360.0
+        if dlon >= 180.0:
+            columnas = np.arange(self.columnas)
+        else:
+            inicio = int(self._columna(np.array(lon - dlon)))
+            cantidad = int(math.ceil(2 * dlon / self.tamano)) + 1
+            columnas = np.unique((inicio + np.arange(cantidad)) % self.columnas)
+
+        claves = (np.arange(fila_min, fila_max + 1)[:, None] * self.columnas + columnas).ravel()
+        inicios = np.searchsorted(self.celdas, claves, side='left')
+        fines = np.searchsorted(self.celdas, claves, side='right')
+        rangos = [np.arange(a, b) for a, b in zip(inicios.tolist(), fines.tolist()) if b > a]
+        return np.concatenate(rangos) if rangos else np.empty(0, dtype=np.int64)
+
+    def en_radio(self, lat, lon, km, limite=None):
+        # Devuelve [(ciudad_id, distancia_km)] ordenado por distancia
+        posiciones = self._posiciones_en_caja(lat, lon, km)
+        if not len(posiciones):
+            return []
+        distancias = self._distancias(posiciones, lat, lon)
+        dentro = distancias <= km
+        posiciones, distancias = posiciones[dentro], distancias[dentro]
+        orden = np.argsort(distancias, kind='stable')
+        if limite is not None:
+            orden = orden[:limite]
+        return list(zip(self.ids[posiciones[orden]].tolist(), distancias[orden].tolist()))
+
+    def mas_cercanas(self, lat, lon, k=1):
+        # Se duplica el radio hasta reunir k ciudades; el resultado es exacto
+        # porque en_radio devuelve todas las ciudades dentro del radio.
+        k = min(k, len(self))
+        km = 25.0
+        while True:
+            resultados = self.en_radio(lat, lon, km, limite=k)
+            if len(resultados) >= k or km > math.pi * RADIO_TIERRA_KM:
+                return resultados
+            km *= 2
+
+
+_indice = None
+_origen = None
+_lock = threading.Lock()
+
+
+def obtener_indice_espacial():
+    # El índice se reconstruye cuando el gazetteer se renueva
+    global _indice, _origen
+    gazetteer = obtener_gazetteer()
+    if _origen is not gazetteer:
+        with _lock:
+            if _origen is not gazetteer and gazetteer.instantanea is not None:
+                # Columnas de la instantánea mapeada, sin recorrer los objetos
+                columnas = gazetteer.instantanea.columnas
+                _indice = IndiceEspacial(
+                    columnas['ciudades_id'], columnas['ciudades_latitud'], columnas['ciudades_longitud']
+                )
+                _origen = gazetteer
+            elif _origen is not gazetteer:
+                ciudades = gazetteer.ciudades.values()
+                total = len(gazetteer.ciudades)
+                _indice = IndiceEspacial(
+                    np.fromiter((c.id for c in ciudades), dtype=np.int64, count=total),
+                    np.fromiter((c.latitude for c in ciudades), dtype=np.float64, count=total),
+                    np.fromiter((c.longitude for c in ciudades), dtype=np.float64, count=total),
+                )
+                _origen = gazetteer
+    return _indice
+
+
+def ciudades_cercanas(ciudad_id, km, limite=None):
+    # Ciudades dentro de `km` de otra ciudad, excluyéndola a ella misma
+    ciudad = obtener_gazetteer().ciudades.get(ciudad_id)
+    if ciudad is None:
+        return []
+    resultados = obtener_indice_espacial().en_radio(ciudad.latitude, ciudad.longitude, km)
+    resultados = [(ident, distancia) for ident, distancia in resultados if ident != ciudad_id]
+    return resultados[:limite] if limite is not None else resultados
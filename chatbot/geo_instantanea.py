@@ -0,0 +1,207 @@
+# geo_instantanea.py
+# Instantánea binaria de Countries/States/Cities para arrancar los workers
+# sin descargar las tablas de la base de datos. Cada columna (ids, FKs,
+# lat/lon) es un arreglo contiguo y los nombres van en una tabla de cadenas
+# (offsets + bytes UTF-8). El archivo se abre con mmap y las columnas son
+# vistas numpy sobre el mapeo, sin copiar: los procesos que abren el mismo
+# archivo comparten esas páginas en la caché del sistema operativo.
+#
+# Formato: MAGIA (8 bytes) | longitud de la cabecera (uint64) | cabecera JSON
+# | columnas alineadas a 8 bytes. La cabecera guarda la versión de los datos
+# (la misma que usa el gazetteer) para detectar una instantánea desactualizada.
+# Si cambia el formato o normalizar_nombre hay que cambiar MAGIA.
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from .gazetteer import alias_de_paises, version_actual
+from .models import Cities, Countries, States
+from .normalizacion import normalizar_nombre
+
+MAGIA = b'GEOSNAP2'
+_LONGITUD = struct.Struct('<Q')
+ALINEACION = 8
+TAMANO_LOTE = 5000
+SIN_ESTADO = -1
+
+
+class InstantaneaInvalida(ValueError):
+    pass
+
+
+def _version_a_json(version):
+    return [[fecha.isoformat() if fecha else None, total] for fecha, total in version]
+
+
+def _version_desde_json(datos):
+    return tuple((datetime.fromisoformat(fecha) if fecha else None, total) for fecha, total in datos)
+
+
+def _tabla_de_cadenas(nombres):
+    # offsets[i]:offsets[i + 1] delimita el nombre i dentro de `datos`
+    codificados = [nombre.encode('utf-8') for nombre in nombres]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.uint64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(codificados), dtype=np.uint8)
+
+
+class TablaDeCadenas:
+    def __init__(self, offsets, datos):
+        self._offsets = offsets
+        self._datos = datos
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._datos[int(self._offsets[i]):int(self._offsets[i + 1])].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        # Decodifica todo el bloque una vez y lo corta por offsets
+        texto = self._datos.tobytes()
+        offsets = self._offsets.tolist()
+        for inicio, fin in zip(offsets, offsets[1:]):
+            yield texto[inicio:fin].decode('utf-8')
+
+
+def _columnas_desde_bd():
+    paises = list(Countries.objects.order_by('id').values_list(
+        'id', 'name', 'name_normalized', 'native', 'iso2', 'iso3', 'translations'
+    ))
+    estados = list(States.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=TAMANO_LOTE))
+    ciudades = list(Cities.objects.order_by('id').values_list(
+        'id', 'name', 'country_id', 'state_id', 'latitude', 'longitude', 'name_normalized'
+    ).iterator(chunk_size=TAMANO_LOTE))
+
+    columnas = {
+        'paises_id': np.array([p[0] for p in paises], dtype=np.int64),
+        'estados_id': np.array([e[0] for e in estados], dtype=np.int64),
+        'ciudades_id': np.array([c[0] for c in ciudades], dtype=np.int64),
+        'ciudades_pais': np.array([c[2] for c in ciudades], dtype=np.int64),
+        'ciudades_estado': np.array(
+            [c[3] if c[3] is not None else SIN_ESTADO for c in ciudades], dtype=np.int64
+        ),
+        'ciudades_latitud': np.array([c[4] for c in ciudades], dtype=np.float64),
+        'ciudades_longitud': np.array([c[5] for c in ciudades], dtype=np.float64),
+    }
+    for tabla, filas in (('paises', paises), ('estados', estados), ('ciudades', ciudades)):
+        offsets, datos = _tabla_de_cadenas(fila[1] for fila in filas)
+        columnas[f'{tabla}_nombre_offsets'] = offsets
+        columnas[f'{tabla}_nombre_datos'] = datos
+    # Nombres ya normalizados (name_normalized): normalizar_nombre es lo más
+    # costoso de construir el gazetteer
+    for tabla, filas, posicion in (('paises', paises, 2), ('ciudades', ciudades, -1)):
+        offsets, datos = _tabla_de_cadenas(fila[posicion] or normalizar_nombre(fila[1]) for fila in filas)
+        columnas[f'{tabla}_normalizado_offsets'] = offsets
+        columnas[f'{tabla}_normalizado_datos'] = datos
+
+    # Alias de países sin repetidos, conservando el orden de prioridad
+    alias = {}
+    for nombre, ident in alias_de_paises((p[0], *p[3:]) for p in paises):
+        if nombre:
+            alias.setdefault(nombre, ident)
+    columnas['paises_alias_offsets'], columnas['paises_alias_datos'] = _tabla_de_cadenas(alias)
+    columnas['paises_alias_id'] = np.array(list(alias.values()), dtype=np.int64)
+    return columnas
+
+
+def exportar(ruta):
+    # Escribe en un temporal y lo renombra: los workers que ya tienen mapeado
+    # el archivo anterior siguen leyendo una versión completa. La versión se
+    # lee antes que las filas: si cambian durante la exportación, la
+    # instantánea queda marcada como vieja y no se usa.
+    version = version_actual()
+    columnas = _columnas_desde_bd()
+    descriptores = {}
+    posicion = 0
+    for nombre, arreglo in columnas.items():
+        posicion += -posicion % ALINEACION
+        descriptores[nombre] = {'dtype': arreglo.dtype.str, 'longitud': len(arreglo), 'offset': posicion}
+        posicion += arreglo.nbytes
+
+    cabecera = json.dumps({
+        'version': _version_a_json(version),
+        'columnas': descriptores,
+    }).encode('utf-8')
+    inicio_datos = len(MAGIA) + _LONGITUD.size + len(cabecera)
+    inicio_datos += -inicio_datos % ALINEACION
+
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(MAGIA)
+        archivo.write(_LONGITUD.pack(len(cabecera)))
+        archivo.write(cabecera)
+        for nombre, arreglo in columnas.items():
+            archivo.seek(inicio_datos + descriptores[nombre]['offset'])
+            archivo.write(arreglo.tobytes())
+        archivo.truncate(inicio_datos + posicion)
+    os.replace(temporal, ruta)
+    return {nombre: len(arreglo) for nombre, arreglo in columnas.items() if nombre.endswith('_id')}
+
+
+class InstantaneaGeo:
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._leer_columnas()
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            raise InstantaneaInvalida(f"Instantánea geográfica inválida ({ruta}): {e}")
+
+    def _leer_columnas(self):
+        if self._mapa[:len(MAGIA)] != MAGIA:
+            raise ValueError('encabezado desconocido')
+        (longitud,) = _LONGITUD.unpack_from(self._mapa, len(MAGIA))
+        inicio = len(MAGIA) + _LONGITUD.size
+        cabecera = json.loads(self._mapa[inicio:inicio + longitud])
+        inicio_datos = inicio + longitud
+        inicio_datos += -inicio_datos % ALINEACION
+
+        self.version = _version_desde_json(cabecera['version'])
+        # np.frombuffer sobre el mmap: vistas de solo lectura, sin copia
+        self.columnas = {
+            nombre: np.frombuffer(
+                self._mapa, dtype=np.dtype(d['dtype']), count=d['longitud'], offset=inicio_datos + d['offset']
+            )
+            for nombre, d in cabecera['columnas'].items()
+        }
+
+    def nombres(self, tabla, columna='nombre'):
+        return TablaDeCadenas(
+            self.columnas[f'{tabla}_{columna}_offsets'], self.columnas[f'{tabla}_{columna}_datos']
+        )
+
+    def paises(self):
+        # [(id, name, nombre normalizado)]
+        return list(zip(
+            self.columnas['paises_id'].tolist(), self.nombres('paises'), self.nombres('paises', 'normalizado')
+        ))
+
+    def alias_paises(self):
+        # [(alias normalizado, id)] como Gazetteer.alias_paises
+        return zip(self.nombres('paises', 'alias'), self.columnas['paises_alias_id'].tolist())
+
+    def estados(self):
+        return zip(self.columnas['estados_id'].tolist(), self.nombres('estados'))
+
+    def ciudades(self):
+        # (id, name, country_id, state_id, latitude, longitude) como
+        # Gazetteer.desde_bd, más el nombre normalizado
+        c = self.columnas
+        return zip(
+            c['ciudades_id'].tolist(),
+            self.nombres('ciudades'),
+            c['ciudades_pais'].tolist(),
+            (None if e == SIN_ESTADO else e for e in c['ciudades_estado'].tolist()),
+            c['ciudades_latitud'].tolist(),
+            c['ciudades_longitud'].tolist(),
+            self.nombres('ciudades', 'normalizado'),
+        )
+
+
+def cargar(ruta):
+    return InstantaneaGeo(ruta)
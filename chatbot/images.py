@@ -1,26 +1,42 @@
-import requests
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
 
-def sugerir_lugar(nombre_lugar, api_key):
-    url_autocomplete = "https://maps.googleapis.com/maps/api/place/autocomplete/json"
-    params_autocomplete = {
+from django.conf import settings
+
+from . import upstream
+
+URL_AUTOCOMPLETE = "https://maps.googleapis.com/maps/api/place/autocomplete/json"
+URL_TEXTSEARCH = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+URL_BUSQUEDA = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
+URL_DETALLES = "https://maps.googleapis.com/maps/api/place/details/json"
+
+# Pool compartido para lanzar en paralelo las llamadas a Google Places
+_ejecutor = ThreadPoolExecutor(max_workers=settings.FOTOS_HILOS, thread_name_prefix='fotos')
+
+def _url_foto(referencia, api_key):
+    return f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photoreference={referencia}&key={api_key}"
+
+def _params_autocomplete(nombre_lugar, api_key):
+    return {
         'input': nombre_lugar,
         'types': 'geocode',  # puedes usar 'establishment' si prefieres solo negocios
         'key': api_key
     }
-    respuesta = requests.get(url_autocomplete, params=params_autocomplete)
-    data = respuesta.json()
 
+def _sugerencia(data):
     if data.get('predictions'):
         return data['predictions'][0]['description']
     return None
 
-def buscar_lugares_relacionados(nombre_lugar, api_key):
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
-    params = {
+def _params_relacionados(nombre_lugar, api_key):
+    return {
         "query": f"{nombre_lugar} playa OR turismo OR atracción",
         "key": api_key
     }
-    r = requests.get(url, params=params).json()
+
+def _filtrar_relacionados(r):
     resultados = r.get('results', [])
 
     # Filtrar solo los bien valorados
@@ -37,63 +53,191 @@ def buscar_lugares_relacionados(nombre_lugar, api_key):
     )
     return lugares_ordenados
 
-def obtener_fotos_lugar_mejoradas(nombre_lugar, api_key, max_fotos=5):
-    # Buscar el lugar original
-    url_busqueda = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    params_busqueda = {
+def _params_busqueda(nombre_lugar, api_key):
+    return {
         'input': nombre_lugar,
         'inputtype': 'textquery',
         'fields': 'place_id',
         'key': api_key
     }
-    resp_busqueda = requests.get(url_busqueda, params=params_busqueda).json()
-
-    if not resp_busqueda.get('candidates'):
-        sugerido = sugerir_lugar(nombre_lugar, api_key)
-        if sugerido:
-            print(f"⚠️ No se encontró '{nombre_lugar}'. Usando sugerencia: '{sugerido}'")
-            return obtener_fotos_lugar_mejoradas(sugerido, api_key, max_fotos)
-        else:
-            print("❌ No se encontró el lugar ni sugerencias.")
-            return []
-
-    place_id = resp_busqueda['candidates'][0]['place_id']
-
-    # Detalles del lugar
-    url_detalles = "https://maps.googleapis.com/maps/api/place/details/json"
-    params_detalles = {
+
+def _params_detalles(place_id, api_key):
+    return {
         'place_id': place_id,
         'fields': 'photo,rating,user_ratings_total',
         'key': api_key
     }
-    datos = requests.get(url_detalles, params=params_detalles).json()
-    result = datos.get('result', {})
-
-    if result.get('rating', 0) >= 4.0 and result.get('user_ratings_total', 0) >= 30:
-        fotos = result.get('photos', [])
-        fotos_ordenadas = sorted(fotos, key=lambda x: x.get('width', 0), reverse=True)
-        return [
-            f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photoreference={foto['photo_reference']}&key={api_key}"
-            for foto in fotos_ordenadas[:max_fotos]
-        ]
-    else:
-        print("⚠️ Lugar con baja calificación o pocas reseñas. Buscando lugares cercanos destacados...")
-        lugares_populares = buscar_lugares_relacionados(nombre_lugar, api_key)
-
-        urls_fotos = []
-        for lugar in lugares_populares:
-            for foto in lugar.get('photos', [])[:1]:  # solo 1 foto por lugar para diversidad
-                url_foto = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photoreference={foto['photo_reference']}&key={api_key}"
-                urls_fotos.append(url_foto)
-                if len(urls_fotos) >= max_fotos:
-                    return urls_fotos
-        return urls_fotos
-
-# Ejemplo de uso
-api_key = ''
-nombre_lugar = 'Pimentel'  # error de escritura
-imagenes = obtener_fotos_lugar_mejoradas(nombre_lugar, api_key)
-# for img in imagenes:
-#     print(img)
 
+def _es_bien_valorado(result):
+    return result.get('rating', 0) >= 4.0 and result.get('user_ratings_total', 0) >= 30
+
+def _fotos_del_lugar(result, max_fotos):
+    fotos = result.get('photos', [])
+    fotos_ordenadas = sorted(fotos, key=lambda x: x.get('width', 0), reverse=True)
+    return [foto['photo_reference'] for foto in fotos_ordenadas[:max_fotos]]
+
+def _fotos_de_relacionados(lugares_populares, max_fotos):
+    referencias = []
+    for lugar in lugares_populares:
+        for foto in lugar.get('photos', [])[:1]:  # solo 1 foto por lugar para diversidad
+            referencias.append(foto['photo_reference'])
+            if len(referencias) >= max_fotos:
+                return referencias
+    return referencias
+
+def sugerir_lugar(nombre_lugar, api_key):
+    respuesta = upstream.get('google_places', URL_AUTOCOMPLETE, params=_params_autocomplete(nombre_lugar, api_key))
+    return _sugerencia(respuesta.json())
+
+def buscar_lugares_relacionados(nombre_lugar, api_key):
+    r = upstream.get('google_places', URL_TEXTSEARCH, params=_params_relacionados(nombre_lugar, api_key)).json()
+    return _filtrar_relacionados(r)
+
+def calcular_limite(plazo=None):
+    # Instante (time.monotonic) en que vence el plazo para resolver las fotos
+    return time.monotonic() + (plazo if plazo is not None else settings.FOTOS_PLAZO)
+
+def _restante(limite):
+    return limite - time.monotonic()
+
+def _timeout_hasta(limite):
+    # Ninguna llamada individual puede pasarse del plazo global
+    restante = max(_restante(limite), 0.1)
+    return (min(settings.UPSTREAM_TIMEOUT_CONEXION, restante), restante)
+
+def _get_json(url, params, limite):
+    return upstream.get('google_places', url, params=params, timeout=_timeout_hasta(limite)).json()
+
+def _esperar(futuro, limite):
+    # Resultado del futuro o None si se acabó el plazo
+    try:
+        return futuro.result(timeout=max(_restante(limite), 0))
+    except FuturesTimeout:
+        futuro.cancel()
+        return None
+
+def urls_de_fotos(referencias, api_key):
+    return [_url_foto(referencia, api_key) for referencia in referencias]
+
+def resolver_lugar(nombre_lugar, api_key, limite):
+    # Devuelve (place_id, nombre con el que se encontró) o (None, None),
+    # probando como mucho FOTOS_MAX_SUGERENCIAS sugerencias de autocompletado.
+    nombre = nombre_lugar
+    vistos = set()
+    for intento in range(settings.FOTOS_MAX_SUGERENCIAS + 1):
+        vistos.add(nombre.casefold())
+        resp_busqueda = _esperar(_ejecutor.submit(_get_json, URL_BUSQUEDA, _params_busqueda(nombre, api_key), limite), limite)
+        if resp_busqueda is None:
+            print(f"⏱️ Plazo agotado buscando '{nombre}'.")
+            return None, None
+        if resp_busqueda.get('candidates'):
+            return resp_busqueda['candidates'][0]['place_id'], nombre
+
+        if intento == settings.FOTOS_MAX_SUGERENCIAS:
+            break
+        data = _esperar(_ejecutor.submit(_get_json, URL_AUTOCOMPLETE, _params_autocomplete(nombre, api_key), limite), limite)
+        sugerido = _sugerencia(data) if data else None
+        if not sugerido or sugerido.casefold() in vistos:
+            break
+        print(f"⚠️ No se encontró '{nombre}'. Usando sugerencia: '{sugerido}'")
+        nombre = sugerido
+    return None, None
+
+def referencias_de_lugar(place_id, nombre, api_key, max_fotos, limite):
+    # Devuelve (photo_references, completo). `completo` es False si el plazo
+    # venció antes de tener todas las respuestas necesarias.
+    # Los detalles del lugar y, de forma especulativa, los lugares
+    # relacionados se piden a la vez; una llamada ya iniciada en el pool no
+    # se puede interrumpir, pero su resultado se descarta y su timeout está
+    # acotado por el mismo plazo.
+    detalles = _ejecutor.submit(_get_json, URL_DETALLES, _params_detalles(place_id, api_key), limite)
+    relacionados = _ejecutor.submit(_get_json, URL_TEXTSEARCH, _params_relacionados(nombre, api_key), limite)
+
+    datos = _esperar(detalles, limite)
+    result = (datos or {}).get('result', {})
+
+    if _es_bien_valorado(result):
+        relacionados.cancel()
+        return _fotos_del_lugar(result, max_fotos), True
+
+    print("⚠️ Lugar con baja calificación o pocas reseñas. Buscando lugares cercanos destacados...")
+    r = _esperar(relacionados, limite)
+    if r is None:
+        # Resultado parcial: las fotos del propio lugar, si llegaron a tiempo
+        print("⏱️ Plazo agotado; se devuelven resultados parciales.")
+        return _fotos_del_lugar(result, max_fotos), False
+    return _fotos_de_relacionados(_filtrar_relacionados(r), max_fotos), datos is not None
+
+def obtener_fotos_lugar_mejoradas(nombre_lugar, api_key, max_fotos=5, plazo=None):
+    limite = calcular_limite(plazo)
+    place_id, nombre = resolver_lugar(nombre_lugar, api_key, limite)
+    if place_id is None:
+        print("❌ No se encontró el lugar ni sugerencias.")
+        return []
+    referencias, _ = referencias_de_lugar(place_id, nombre, api_key, max_fotos, limite)
+    return urls_de_fotos(referencias, api_key)
+
+async def sugerir_lugar_async(nombre_lugar, api_key):
+    respuesta = await upstream.get_async('google_places', URL_AUTOCOMPLETE, params=_params_autocomplete(nombre_lugar, api_key))
+    return _sugerencia(respuesta.json())
+
+async def buscar_lugares_relacionados_async(nombre_lugar, api_key):
+    r = await upstream.get_async('google_places', URL_TEXTSEARCH, params=_params_relacionados(nombre_lugar, api_key))
+    return _filtrar_relacionados(r.json())
+
+async def _get_json_async(url, params, limite):
+    respuesta = await upstream.get_async('google_places', url, params=params, timeout=_timeout_hasta(limite))
+    return respuesta.json()
+
+async def _esperar_async(tarea, limite):
+    try:
+        return await asyncio.wait_for(tarea, timeout=max(_restante(limite), 0))
+    except asyncio.TimeoutError:
+        return None
+
+async def resolver_lugar_async(nombre_lugar, api_key, limite):
+    nombre = nombre_lugar
+    vistos = set()
+    for intento in range(settings.FOTOS_MAX_SUGERENCIAS + 1):
+        vistos.add(nombre.casefold())
+        resp_busqueda = await _esperar_async(_get_json_async(URL_BUSQUEDA, _params_busqueda(nombre, api_key), limite), limite)
+        if resp_busqueda is None:
+            return None, None
+        if resp_busqueda.get('candidates'):
+            return resp_busqueda['candidates'][0]['place_id'], nombre
+
+        if intento == settings.FOTOS_MAX_SUGERENCIAS:
+            break
+        data = await _esperar_async(_get_json_async(URL_AUTOCOMPLETE, _params_autocomplete(nombre, api_key), limite), limite)
+        sugerido = _sugerencia(data) if data else None
+        if not sugerido or sugerido.casefold() in vistos:
+            break
+        nombre = sugerido
+    return None, None
+
+async def referencias_de_lugar_async(place_id, nombre, api_key, max_fotos, limite):
+    # Igual que referencias_de_lugar; aquí cancelar una tarea sí corta la
+    # petición HTTP en curso.
+    detalles = asyncio.ensure_future(_get_json_async(URL_DETALLES, _params_detalles(place_id, api_key), limite))
+    relacionados = asyncio.ensure_future(_get_json_async(URL_TEXTSEARCH, _params_relacionados(nombre, api_key), limite))
+    try:
+        datos = await _esperar_async(detalles, limite)
+        result = (datos or {}).get('result', {})
+
+        if _es_bien_valorado(result):
+            return _fotos_del_lugar(result, max_fotos), True
+
+        r = await _esperar_async(relacionados, limite)
+        if r is None:
+            return _fotos_del_lugar(result, max_fotos), False
+        return _fotos_de_relacionados(_filtrar_relacionados(r), max_fotos), datos is not None
+    finally:
+        relacionados.cancel()
 
+async def obtener_fotos_lugar_mejoradas_async(nombre_lugar, api_key, max_fotos=5, plazo=None):
+    limite = calcular_limite(plazo)
+    place_id, nombre = await resolver_lugar_async(nombre_lugar, api_key, limite)
+    if place_id is None:
+        return []
+    referencias, _ = await referencias_de_lugar_async(place_id, nombre, api_key, max_fotos, limite)
+    return urls_de_fotos(referencias, api_key)
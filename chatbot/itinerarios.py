@@ -0,0 +1,241 @@
+# itinerarios.py
+# Listado de itinerarios: filtros, campos solicitados (sparse fieldsets),
+# paginación por cursor sobre el id, serialización y exportación en
+# streaming. Las relaciones solo se cargan si se pidió el campo que las usa,
+# y cada página cuesta un número fijo de consultas.
+import base64
+import binascii
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .clima_cache import ESTADO_SIN_PRONOSTICO
+from .gazetteer import obtener_gazetteer
+from .models import Actividad, Itinerario, Lugar
+
+CAMPOS = (
+    'id', 'lugar', 'ciudad', 'pais', 'dia', 'costo', 'estado',
+    'viaje', 'clima', 'transporte', 'actividades',
+)
+# Relaciones que necesita cada campo anidado
+_SELECT_RELATED = {
+    'ciudad': ['ciudad'],
+    'pais': ['pais'],
+    'viaje': ['viaje'],
+    'clima': ['clima'],
+    'transporte': ['transporte__tipo_transporte'],
+}
+
+
+class ParametrosInvalidos(ValueError):
+    pass
+
+
+def codificar_cursor(ultimo_id):
+    contenido = json.dumps({'id': ultimo_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(contenido).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        ultimo_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))['id']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ParametrosInvalidos("El parámetro 'cursor' no es válido.")
+    if not isinstance(ultimo_id, int):
+        raise ParametrosInvalidos("El parámetro 'cursor' no es válido.")
+    return ultimo_id
+
+
+def _entero(parametros, nombre):
+    valor = parametros.get(nombre, '').strip()
+    if not valor:
+        return None
+    if not valor.isdigit():
+        raise ParametrosInvalidos(f"El parámetro '{nombre}' debe ser un número entero.")
+    return int(valor)
+
+
+def leer_campos(parametros):
+    # ?campos=id,lugar,dia ; sin el parámetro se devuelven todos
+    valor = parametros.get('campos', '').strip()
+    if not valor:
+        return CAMPOS
+    pedidos = [c.strip() for c in valor.split(',') if c.strip()]
+    desconocidos = [c for c in pedidos if c not in CAMPOS]
+    if desconocidos:
+        raise ParametrosInvalidos(
+            f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(CAMPOS)}."
+        )
+    # El id siempre se incluye: es el cursor
+    return tuple(c for c in CAMPOS if c == 'id' or c in pedidos)
+
+
+def leer_filtros(parametros):
+    # viaje_id, ciudad (id, o nombre junto con ?pais=), estado y dia
+    filtros = {}
+    viaje_id = _entero(parametros, 'viaje_id')
+    if viaje_id is not None:
+        filtros['viaje_id'] = viaje_id
+
+    ciudad = parametros.get('ciudad', '').strip()
+    if ciudad:
+        if ciudad.isdigit():
+            filtros['ciudad_id'] = int(ciudad)
+        else:
+            pais_nombre = parametros.get('pais', '').strip()
+            if not pais_nombre:
+                raise ParametrosInvalidos("Para filtrar por nombre de ciudad se requiere el parámetro 'pais'.")
+            gazetteer = obtener_gazetteer()
+            pais = gazetteer.buscar_pais(pais_nombre)
+            encontrada = gazetteer.buscar_ciudad(ciudad, pais.id) if pais else None
+            if not encontrada:
+                raise ParametrosInvalidos(f"No se encontró la ciudad '{ciudad}' en el país '{pais_nombre}'.")
+            filtros['ciudad_id'] = encontrada.id
+
+    estado = parametros.get('estado', '').strip()
+    if estado:
+        validos = [clave for clave, _ in Itinerario.ESTADOS]
+        if estado not in validos:
+            raise ParametrosInvalidos(f"El parámetro 'estado' debe ser uno de: {', '.join(validos)}.")
+        filtros['estado'] = estado
+
+    dia = _entero(parametros, 'dia')
+    if dia is not None:
+        filtros['dia'] = dia
+    return filtros
+
+
+def consulta(filtros, campos):
+    relaciones = [r for campo in campos for r in _SELECT_RELATED.get(campo, [])]
+    itinerarios = Itinerario.objects.filter(**filtros).order_by('id')
+    if relaciones:
+        itinerarios = itinerarios.select_related(*relaciones)
+    if 'actividades' in campos:
+        itinerarios = itinerarios.prefetch_related(
+            Prefetch('actividad_set', queryset=Actividad.objects.order_by('orden', 'id').prefetch_related(
+                Prefetch('lugares', queryset=Lugar.objects.select_related('tipo_lugar'))
+            ))
+        )
+    return itinerarios
+
+
+def pagina(filtros, campos, limite, cursor=None):
+    # Devuelve (itinerarios, último id si hay otra página o None). Se lee una
+    # fila de más para saber si hay otra página, sin COUNT.
+    itinerarios = consulta(filtros, campos)
+    if cursor is not None:
+        itinerarios = itinerarios.filter(id__gt=cursor)
+    filas = list(itinerarios[:limite + 1])
+    if len(filas) > limite:
+        filas = filas[:limite]
+        return filas, filas[-1].id
+    return filas, None
+
+
+def _actividad_a_dict(actividad):
+    return {
+        'id': actividad.id,
+        'turno': actividad.turno,
+        'orden': actividad.orden,
+        'estado': actividad.estado,
+        'lugares': [
+            {
+                'id': lugar.id,
+                'nombre': lugar.nombre,
+                'descripcion': lugar.descripcion,
+                'ubicacion': lugar.ubicacion,
+                'tipo_lugar': lugar.tipo_lugar.nombre
+            }
+            for lugar in actividad.lugares.all()
+        ]
+    }
+
+
+def _clima_a_dict(clima):
+    # Los marcadores que crea generador_viajes para días aún sin pronóstico
+    # no son un pronóstico: se devuelven como null
+    if clima.estado_clima == ESTADO_SIN_PRONOSTICO:
+        return None
+    return {
+        'id': clima.id,
+        'fecha': clima.fecha,
+        'temperatura_maxima': clima.temperatura_maxima,
+        'temperatura_minima': clima.temperatura_minima,
+        'estado_clima': clima.estado_clima,
+        'humedad': clima.humedad,
+        'probabilidad_lluvia': clima.probabilidad_lluvia
+    }
+
+
+_SERIALIZADORES = {
+    'id': lambda i: i.id,
+    'lugar': lambda i: i.lugar,
+    'ciudad': lambda i: {'id': i.ciudad.id, 'nombre': i.ciudad.name},
+    'pais': lambda i: {'id': i.pais.id, 'nombre': i.pais.name},
+    'dia': lambda i: i.dia,
+    'costo': lambda i: float(i.costo),
+    'estado': lambda i: i.estado,
+    'viaje': lambda i: {
+        'id': i.viaje.id,
+        'presupuesto': float(i.viaje.presupuesto),
+        'dia_salida': i.viaje.dia_salida,
+        'duracion_viaje': i.viaje.duracion_viaje,
+        'estado': i.viaje.estado
+    },
+    'clima': lambda i: _clima_a_dict(i.clima),
+    'transporte': lambda i: {
+        'id': i.transporte.id,
+        'nombre': i.transporte.nombre,
+        'tipo_transporte': i.transporte.tipo_transporte.nombre
+    },
+    'actividades': lambda i: [_actividad_a_dict(a) for a in i.actividad_set.all()],
+}
+
+
+def itinerario_a_dict(itinerario, campos=CAMPOS):
+    return {campo: _SERIALIZADORES[campo](itinerario) for campo in campos}
+
+
+def _lotes(filtros, campos, tamano_lote):
+    # Recorre todos los itinerarios página a página (id > último id) en vez de
+    # QuerySet.iterator(): con MySQL el driver carga el resultado completo en
+    # memoria aunque se lea por partes. Así solo hay un lote en memoria.
+    cursor = None
+    while True:
+        filas, cursor = pagina(filtros, campos, tamano_lote, cursor)
+        yield [itinerario_a_dict(itinerario, campos) for itinerario in filas]
+        if cursor is None:
+            return
+
+
+def _json(datos):
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def exportar_ndjson(filtros, campos, tamano_lote):
+    # Un itinerario por línea. Si falla a mitad, la última línea lo indica.
+    try:
+        for lote in _lotes(filtros, campos, tamano_lote):
+            if lote:
+                yield ''.join(_json(fila) + '\n' for fila in lote).encode('utf-8')
+    except Exception as e:
+        print(f"Error al exportar itinerarios: {e}")
+        yield (_json({'status': 'error', 'message': f'Exportación incompleta: {e}'}) + '\n').encode('utf-8')
+
+
+def exportar_json(filtros, campos, tamano_lote):
+    # Un arreglo JSON emitido por partes. Si falla a mitad el arreglo queda
+    # sin cerrar, así el cliente no confunde el resultado con uno completo.
+    yield b'['
+    primero = True
+    try:
+        for lote in _lotes(filtros, campos, tamano_lote):
+            if lote:
+                yield (('' if primero else ',') + ','.join(_json(fila) for fila in lote)).encode('utf-8')
+                primero = False
+    except Exception as e:
+        print(f"Error al exportar itinerarios: {e}")
+        return
+    yield b']'
@@ -0,0 +1,161 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Deben cargarse con la primera petición que los usa, nunca al arrancar
+MODULOS_PEREZOSOS = [
+    'chatbot.deepseek', 'chatbot.images', 'chatbot.openweather',
+    'chatbot.place_search', 'chatbot.upstream', 'httpx',
+]
+
+# Se ejecuta en un proceso nuevo con -X importtime. El audit hook registra
+# cualquier acceso a la red (o proceso lanzado) durante el arranque junto
+# con el módulo que lo provocó.
+SCRIPT_HIJO = r'''
+import json, sys, time
+
+EVENTOS = {
+    'socket.connect', 'socket.getaddrinfo', 'socket.gethostbyname',
+    'socket.gethostbyname_ex', 'socket.sendto', 'subprocess.Popen',
+}
+registrados = []
+
+import threading
+
+def modulo_en_ejecucion():
+    # Si la E/S ocurre en otro hilo, se busca el import en curso en el principal
+    marcos = [sys._getframe(2), sys._current_frames().get(threading.main_thread().ident)]
+    for marco in marcos:
+        while marco is not None:
+            if marco.f_code.co_name == '<module>' and marco.f_globals.get('__name__') != '__main__':
+                return marco.f_globals.get('__name__')
+            marco = marco.f_back
+    return None
+
+def hook(evento, argumentos):
+    if evento in EVENTOS:
+        registrados.append({
+            'evento': evento,
+            'argumentos': repr(argumentos)[:200],
+            'modulo': modulo_en_ejecucion(),
+        })
+
+sys.addaudithook(hook)
+
+inicio = time.perf_counter()
+error = None
+try:
+    import django
+    django.setup()
+    from django.conf import settings
+    import importlib
+    importlib.import_module(settings.ROOT_URLCONF)
+except Exception as e:
+    error = repr(e)
+duracion = time.perf_counter() - inicio
+
+print(json.dumps({
+    'duracion_ms': duracion * 1000,
+    'error': error,
+    'eventos': registrados,
+    'modulos': sorted(sys.modules),
+}))
+'''
+
+
+def _importtime(stderr):
+    # Líneas "import time: propio | acumulado | módulo" (microsegundos)
+    tiempos = {}
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:'):
+            continue
+        partes = linea[len('import time:'):].split('|')
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue
+        tiempos[partes[2].strip()] = (int(partes[0]) / 1000, int(partes[1]) / 1000)
+    return tiempos
+
+
+class Command(BaseCommand):
+    help = (
+        'Audita el arranque de la aplicación: falla si al importar las URLs hay '
+        'accesos a la red o se cargan los clientes de APIs externas, y mide el '
+        'tiempo de importación y de "manage.py check".'
+    )
+    # Los checks importan las URLs: justo lo que se quiere auditar
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Módulos más lentos a mostrar')
+        parser.add_argument('--max-ms', type=float, default=None, help='Umbral para la mediana del arranque')
+        parser.add_argument('--sin-check', action='store_true', help='No medir "manage.py check"')
+
+    def _arrancar(self):
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT_HIJO],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        resultado['importtime'] = _importtime(proceso.stderr)
+        return resultado
+
+    def _medir_check(self):
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, 'manage.py', 'check'],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"manage.py check falló:\n{proceso.stderr[-2000:]}")
+        return (time.perf_counter() - inicio) * 1000
+
+    def handle(self, *args, **options):
+        arranques = [self._arrancar() for _ in range(options['repeticiones'])]
+        duraciones = [a['duracion_ms'] for a in arranques]
+        mediana = statistics.median(duraciones)
+
+        # Módulos propios ordenados por tiempo acumulado (mediana entre corridas)
+        nombres = {n for a in arranques for n in a['importtime'] if n.startswith('chatbot')}
+        propios = sorted(
+            ((n, statistics.median(a['importtime'][n][1] for a in arranques if n in a['importtime'])) for n in nombres),
+            key=lambda x: -x[1]
+        )
+        self.stdout.write("Módulos de chatbot más costosos (acumulado, ms):")
+        for nombre, acumulado in propios[:options['top']]:
+            self.stdout.write(f"  {acumulado:9.1f}  {nombre}")
+        self.stdout.write(
+            f"Arranque (django.setup + {settings.ROOT_URLCONF}): mediana={mediana:.1f} ms "
+            f"min={min(duraciones):.1f} ms max={max(duraciones):.1f} ms"
+        )
+
+        if not options['sin_check']:
+            checks = [self._medir_check() for _ in range(options['repeticiones'])]
+            self.stdout.write(
+                f"manage.py check: mediana={statistics.median(checks):.1f} ms min={min(checks):.1f} ms"
+            )
+
+        errores = []
+        if arranques[0]['error']:
+            errores.append(f"Error al importar las URLs: {arranques[0]['error']}")
+        for evento in arranques[0]['eventos']:
+            errores.append(
+                f"E/S al importar ({evento['modulo'] or 'desconocido'}): {evento['evento']} {evento['argumentos']}"
+            )
+        cargados = [m for m in MODULOS_PEREZOSOS if m in arranques[0]['modulos']]
+        if cargados:
+            errores.append(f"Módulos que deberían cargarse de forma diferida: {', '.join(cargados)}")
+        if options['max_ms'] is not None and mediana > options['max_ms']:
+            errores.append(f"La mediana del arranque ({mediana:.1f} ms) supera el umbral de {options['max_ms']} ms")
+
+        if errores:
+            raise CommandError('\n'.join(errores))
+        self.stdout.write(self.style.SUCCESS('Arranque sin E/S ni clientes externos cargados.'))
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from chatbot import deepseek
+
+RESPUESTA_STUB = json.dumps({
+    'choices': [{'message': {'role': 'assistant', 'content': 'Itinerario de prueba'}}]
+}).encode()
+
+
+class UpstreamStub:
+    # Servidor HTTP/1.1 mínimo (keep-alive) que responde tras una latencia fija
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.puerto = None
+        self._listo = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+    async def _atender(self, lector, escritor):
+        try:
+            while True:
+                cabeceras = await lector.readuntil(b'\r\n\r\n')
+                largo = 0
+                for linea in cabeceras.split(b'\r\n'):
+                    if linea.lower().startswith(b'content-length:'):
+                        largo = int(linea.split(b':', 1)[1])
+                if largo:
+                    await lector.readexactly(largo)
+                await asyncio.sleep(self.latencia)
+                escritor.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(RESPUESTA_STUB)).encode() + b'\r\n\r\n' + RESPUESTA_STUB
+                )
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    def _ejecutar(self):
+        asyncio.set_event_loop(self._loop)
+        servidor = self._loop.run_until_complete(
+            asyncio.start_server(self._atender, '127.0.0.1', 0, backlog=1024)
+        )
+        self.puerto = servidor.sockets[0].getsockname()[1]
+        self._listo.set()
+        self._loop.run_forever()
+
+    def iniciar(self):
+        threading.Thread(target=self._ejecutar, daemon=True).start()
+        self._listo.wait()
+        return f'http://127.0.0.1:{self.puerto}/v1/chat/completions'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara peticiones/seg de /api/deepseek/ (WSGI, hilos) contra '
+        '/api/async/deepseek/ (ASGI, un solo event loop) con un upstream local simulado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=400)
+        parser.add_argument('--latencia', type=float, default=0.2, help='Latencia del upstream en segundos')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos del worker WSGI simulado')
+        parser.add_argument('--concurrencia', type=int, default=200, help='Peticiones simultáneas en ASGI')
+
+    def handle(self, *args, **options):
+        # Los clientes de prueba usan el host 'testserver'
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self._medir(options)
+
+    def _medir(self, options):
+        deepseek.API_URL = UpstreamStub(options['latencia']).iniciar()
+        total = options['peticiones']
+
+        def peticion_wsgi(i):
+            respuesta = Client().post(
+                '/api/deepseek/', {'prompt': f'prompt wsgi {i}'},
+                content_type='application/json'
+            )
+            return respuesta.status_code
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['hilos']) as ejecutor:
+            codigos_wsgi = list(ejecutor.map(peticion_wsgi, range(total)))
+        duracion_wsgi = time.perf_counter() - inicio
+
+        async def carga_asgi():
+            cliente = AsyncClient()
+            semaforo = asyncio.Semaphore(options['concurrencia'])
+
+            async def peticion(i):
+                async with semaforo:
+                    respuesta = await cliente.post(
+                        '/api/async/deepseek/', {'prompt': f'prompt asgi {i}'},
+                        content_type='application/json'
+                    )
+                    return respuesta.status_code
+
+            return await asyncio.gather(*(peticion(i) for i in range(total)))
+
+        inicio = time.perf_counter()
+        codigos_asgi = asyncio.run(carga_asgi())
+        duracion_asgi = time.perf_counter() - inicio
+
+        for nombre, codigos, duracion in (
+            (f"WSGI ({options['hilos']} hilos)", codigos_wsgi, duracion_wsgi),
+            (f"ASGI (concurrencia {options['concurrencia']})", codigos_asgi, duracion_asgi),
+        ):
+            exitosas = sum(1 for c in codigos if c == 200)
+            self.stdout.write(
+                f"{nombre}: {total / duracion:.1f} req/s "
+                f"({exitosas}/{total} exitosas en {duracion:.2f} s)"
+            )
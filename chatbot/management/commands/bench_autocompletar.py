@@ -0,0 +1,94 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.autocompletar import TIPO_CIUDAD, TIPO_PAIS, IndiceTrigramas
+
+SILABAS = [
+    'san', 'ta', 'ma', 'ri', 'a', 'chi', 'cla', 'yo', 'pi', 'men', 'tel', 'lo', 'ca',
+    'bo', 'go', 'tá', 'lí', 'ma', 'cu', 'zco', 'ber', 'lin', 'mú', 'nich', 'que', 'ro',
+    'va', 'lle', 'du', 'par', 'ís', 'to', 'le', 'do', 'se', 'vi', 'lla', 'gua', 'na',
+]
+PREFIJOS = ['San ', 'Santa ', 'Puerto ', 'Villa ', 'La ', 'El ', 'Nueva ', '']
+
+
+def _nombre_aleatorio(rnd):
+    nombre = ''.join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4)))
+    return (rnd.choice(PREFIJOS) + nombre).title()
+
+
+def _con_error(rnd, texto):
+    if len(texto) < 4:
+        return texto
+    i = rnd.randrange(1, len(texto) - 1)
+    tipo = rnd.randrange(3)
+    if tipo == 0:
+        return texto[:i] + rnd.choice('aeiourstnl') + texto[i + 1:]
+    if tipo == 1:
+        return texto[:i] + texto[i + 1:]
+    return texto[:i - 1] + texto[i] + texto[i - 1] + texto[i + 1:]
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia del autocompletado de ciudades con un dataset sintético.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ciudades', type=int, default=150000)
+        parser.add_argument('--paises', type=int, default=250)
+        parser.add_argument('--consultas', type=int, default=3000)
+        parser.add_argument('--p99-max', type=float, default=5.0, help='Umbral de p99 en ms')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+        paises = [(i, _nombre_aleatorio(rnd)) for i in range(1, options['paises'] + 1)]
+        ciudades = [
+            (i, _nombre_aleatorio(rnd), rnd.randint(1, options['paises']))
+            for i in range(1, options['ciudades'] + 1)
+        ]
+        entradas = [(TIPO_PAIS, i, n, n, i) for i, n in paises]
+        entradas += [(TIPO_CIUDAD, i, n, n, p) for i, n, p in ciudades]
+
+        inicio = time.perf_counter()
+        indice = IndiceTrigramas(entradas)
+        construccion = time.perf_counter() - inicio
+
+        consultas = []
+        for _ in range(options['consultas']):
+            _, nombre, pais_id = rnd.choice(ciudades)
+            modo = rnd.randrange(3)
+            if modo == 0:
+                texto = nombre
+            elif modo == 1:
+                texto = nombre[:rnd.randint(3, max(3, len(nombre)))]
+            else:
+                texto = _con_error(rnd, nombre)
+            consultas.append((texto, pais_id if rnd.random() < 0.5 else None))
+
+        # Calentamiento
+        for texto, pais_id in consultas[:100]:
+            indice.buscar(texto, pais_id=pais_id)
+
+        tiempos = []
+        for texto, pais_id in consultas:
+            inicio = time.perf_counter_ns()
+            indice.buscar(texto, pais_id=pais_id)
+            tiempos.append((time.perf_counter_ns() - inicio) / 1e6)
+        tiempos.sort()
+
+        p99 = _percentil(tiempos, 0.99)
+        self.stdout.write(f"Entradas indexadas: {len(indice)}")
+        self.stdout.write(f"Construcción del índice: {construccion:.2f} s")
+        self.stdout.write(
+            f"Latencia (ms) p50={_percentil(tiempos, 0.50):.3f} "
+            f"p95={_percentil(tiempos, 0.95):.3f} p99={p99:.3f} max={tiempos[-1]:.3f}"
+        )
+
+        if p99 > options['p99_max']:
+            raise CommandError(f"p99 de {p99:.3f} ms supera el umbral de {options['p99_max']} ms")
+        self.stdout.write(self.style.SUCCESS('Latencia dentro del umbral.'))
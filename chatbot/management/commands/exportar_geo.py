@@ -0,0 +1,30 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot import geo_instantanea
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta Countries/States/Cities a la instantánea binaria (GEO_INSTANTANEA) '
+        'que los workers mapean en memoria al arrancar en lugar de leer las tablas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default=settings.GEO_INSTANTANEA, help='Ruta del archivo')
+
+    def handle(self, *args, **options):
+        ruta = options['salida']
+        if not ruta:
+            raise CommandError('Indique --salida o configure GEO_INSTANTANEA.')
+
+        totales = geo_instantanea.exportar(ruta)
+        self.stdout.write(
+            f"Países: {totales['paises_id']}  Estados: {totales['estados_id']}  "
+            f"Ciudades: {totales['ciudades_id']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantánea escrita en {ruta} ({os.path.getsize(ruta) / 1024 / 1024:.1f} MB)."
+        ))
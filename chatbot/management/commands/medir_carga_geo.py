@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un proceso nuevo por medición, como un worker recién lanzado.
+# Modos: "bd" (gazetteer leyendo las tablas con el ORM), "instantanea"
+# (gazetteer desde el archivo mapeado) y "mmap" (solo mapear el archivo e
+# indexar las coordenadas, sin los diccionarios del gazetteer).
+SCRIPT_HIJO = r'''
+import json, sys, time
+
+modo, ruta = sys.argv[1], sys.argv[2]
+
+def memoria():
+    # kB. RssAnon es memoria propia del proceso; RssFile son páginas de
+    # archivos (como el mmap) que se comparten entre procesos.
+    datos = {}
+    try:
+        with open('/proc/self/status') as archivo:
+            for linea in archivo:
+                clave, _, valor = linea.partition(':')
+                if clave in ('VmRSS', 'RssAnon', 'RssFile'):
+                    datos[clave] = int(valor.split()[0])
+    except OSError:
+        import resource
+        datos['VmRSS'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return datos
+
+import django
+django.setup()
+from django.conf import settings
+from chatbot import gazetteer, geo_espacial, geo_instantanea
+
+antes = memoria()
+inicio = time.perf_counter()
+if modo == 'mmap':
+    columnas = geo_instantanea.cargar(ruta).columnas
+    indice = geo_espacial.IndiceEspacial(
+        columnas['ciudades_id'], columnas['ciudades_latitud'], columnas['ciudades_longitud']
+    )
+    ciudades, instantanea = len(indice), True
+else:
+    settings.GEO_INSTANTANEA = ruta if modo == 'instantanea' else ''
+    cargado = gazetteer.obtener_gazetteer()
+    geo_espacial.obtener_indice_espacial()
+    ciudades, instantanea = len(cargado.ciudades), cargado.instantanea is not None
+duracion = time.perf_counter() - inicio
+despues = memoria()
+
+print(json.dumps({
+    'duracion_ms': duracion * 1000,
+    'memoria_kb': {clave: despues[clave] - antes.get(clave, 0) for clave in despues},
+    'ciudades': ciudades,
+    'instantanea': instantanea,
+}))
+'''
+
+MODOS = ('bd', 'instantanea', 'mmap')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el arranque en frío de un worker cargando los datos geográficos '
+        'con el ORM y desde la instantánea mapeada (tiempo y RSS).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument('--instantanea', default=settings.GEO_INSTANTANEA, help='Ruta del archivo')
+
+    def _medir(self, modo, ruta):
+        proceso = subprocess.run(
+            [sys.executable, '-c', SCRIPT_HIJO, modo, ruta],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"La medición '{modo}' falló:\n{proceso.stderr[-2000:]}")
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        ruta = options['instantanea']
+        if not ruta or not os.path.exists(ruta):
+            raise CommandError(f"No existe la instantánea '{ruta}'. Ejecute primero manage.py exportar_geo.")
+
+        for modo in MODOS:
+            medidas = [self._medir(modo, ruta) for _ in range(options['repeticiones'])]
+            if modo == 'instantanea' and not medidas[0]['instantanea']:
+                self.stdout.write(self.style.WARNING(
+                    'La instantánea no coincide con la base de datos; se cargó con el ORM.'
+                ))
+            memoria = {
+                clave: statistics.median(m['memoria_kb'][clave] for m in medidas) / 1024
+                for clave in medidas[0]['memoria_kb']
+            }
+            self.stdout.write(
+                f"{modo:12} ciudades={medidas[0]['ciudades']} "
+                f"tiempo mediana={statistics.median(m['duracion_ms'] for m in medidas):.1f} ms  "
+                + '  '.join(f"{clave}=+{valor:.1f} MB" for clave, valor in memoria.items())
+            )
@@ -0,0 +1,101 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+# (nombre, CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+MODOS = [
+    ('por_peticion', 0, False),
+    ('persistente', 600, False),
+    ('persistente_verificada', 600, True),
+]
+
+
+def _peticion(handler, entorno):
+    # Igual que un servidor WSGI: cerrar la respuesta dispara request_finished,
+    # que es donde Django cierra (o conserva) la conexión. El Client de
+    # pruebas desconecta esas señales, por eso no se usa aquí.
+    estados = []
+    respuesta = handler(dict(entorno), lambda estado, cabeceras, *_: estados.append(estado))
+    try:
+        for _ in respuesta:
+            pass
+    finally:
+        respuesta.close()
+    return estados[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el costo de abrir una conexión por petición frente a reutilizarla '
+        '(CONN_MAX_AGE / CONN_HEALTH_CHECKS) contra la base de datos configurada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruta', default='/api/itinerario/?limite=1', help='Vista que hace al menos una consulta')
+        parser.add_argument('--peticiones', type=int, default=200)
+        parser.add_argument(
+            '--latencia-conexion', type=float, default=0,
+            help='ms añadidos al abrir cada conexión, para simular el handshake TCP + autenticación '
+                 'de un servidor remoto cuando se mide contra SQLite o un MySQL local'
+        )
+
+    def handle(self, *args, **options):
+        latencia = options['latencia_conexion'] / 1000
+        abiertas = []
+
+        def al_conectar(**kwargs):
+            abiertas.append(1)
+            if latencia:
+                time.sleep(latencia)
+
+        ruta, _, consulta = options['ruta'].partition('?')
+        entorno = RequestFactory()._base_environ(PATH_INFO=ruta, QUERY_STRING=consulta, HTTP_HOST='localhost')
+        handler = WSGIHandler()
+        configuracion = {clave: connection.settings_dict[clave] for clave in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+
+        connection_created.connect(al_conectar)
+        try:
+            self._medir(handler, entorno, abiertas, options)
+        finally:
+            connection_created.disconnect(al_conectar)
+            connection.close()
+            connection.settings_dict.update(configuracion)
+
+    def _medir(self, handler, entorno, abiertas, options):
+        # Costo de una conexión nueva, sin la petición
+        conexiones = []
+        for _ in range(20):
+            connection.close()
+            inicio = time.perf_counter()
+            connection.ensure_connection()
+            conexiones.append((time.perf_counter() - inicio) * 1000)
+        self.stdout.write(
+            f"Motor: {connection.vendor}  abrir conexión: mediana={statistics.median(conexiones):.3f} ms"
+            + (f" (incluye {options['latencia_conexion']} ms simulados)" if options['latencia_conexion'] else '')
+        )
+
+        for nombre, max_age, verificar in MODOS:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            connection.settings_dict['CONN_HEALTH_CHECKS'] = verificar
+            estado = _peticion(handler, entorno)  # calentamiento
+            if not estado.startswith('200'):
+                raise CommandError(f"{options['ruta']} respondió {estado}")
+
+            abiertas.clear()
+            tiempos = []
+            for _ in range(options['peticiones']):
+                inicio = time.perf_counter()
+                _peticion(handler, entorno)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            self.stdout.write(
+                f"{nombre:<24} CONN_MAX_AGE={max_age:<4} health_checks={verificar!s:<5} "
+                f"mediana={statistics.median(tiempos):.3f} ms  "
+                f"p95={tiempos[int(len(tiempos) * 0.95)]:.3f} ms  conexiones abiertas={len(abiertas)}"
+            )
@@ -0,0 +1,212 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.test.utils import CaptureQueriesContext
+
+from chatbot.models import (
+    Actividad, Cities, Clima, Countries, Itinerario, States, Tipo_Transporte, Transporte, Viaje,
+)
+
+# Modelos cuyos Meta.indexes (migración 0005) se quitan con --comparar
+MODELOS_CON_INDICES = [Cities, Clima, Itinerario]
+LOTE = 2000
+SILABAS = ['san', 'ta', 'ma', 'ri', 'chi', 'cla', 'yo', 'pi', 'men', 'lo', 'ca', 'bo', 'go', 'lí', 'cu', 'ber', 'va', 'lle']
+
+
+def _nombre(rnd):
+    return ''.join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4))).title()
+
+
+def _crear(modelo, objetos):
+    modelo.objects.bulk_create(objetos, batch_size=LOTE)
+
+
+def _sembrar_geo(rnd, n_paises, n_estados, n_ciudades, salida):
+    if Countries.objects.exists():
+        salida.write('Países/estados/ciudades ya existen; no se siembran.')
+        return
+    _crear(Countries, [
+        Countries(
+            name=_nombre(rnd), iso2='XX', iso3='XXX', numeric_code='000', phonecode='0', capital='',
+            currency='', currency_name='', currency_symbol='', tld='', native='', region='', subregion='',
+            timezones=[], translations={}, latitude=0, longitude=0, emoji='', emojiU='', flag=True,
+        )
+        for _ in range(n_paises)
+    ])
+    paises = list(Countries.objects.values_list('id', flat=True))
+    _crear(States, [
+        States(country_id=rnd.choice(paises), name=_nombre(rnd), latitude=0, longitude=0)
+        for _ in range(n_estados)
+    ])
+    estados = list(States.objects.values_list('id', 'country_id'))
+    _crear(Cities, [
+        Cities(
+            country_id=pais_id, state_id=estado_id, name=_nombre(rnd),
+            latitude=rnd.uniform(-60, 70), longitude=rnd.uniform(-180, 180),
+        )
+        for estado_id, pais_id in (rnd.choice(estados) for _ in range(n_ciudades))
+    ])
+
+
+def _sembrar_viajes(rnd, n_climas, n_viajes, salida):
+    if Itinerario.objects.exists():
+        salida.write('Ya hay itinerarios; no se siembran climas ni viajes.')
+        return
+    ciudades = list(Cities.objects.values_list('id', 'country_id')[:max(n_climas // 7, 1)])
+    hoy = date.today()
+    _crear(Clima, [
+        Clima(
+            fecha=hoy + timedelta(days=d), ciudad_id=ciudad_id, pais_id=pais_id, temperatura_maxima=25,
+            temperatura_minima=15, estado_clima='Despejado', humedad=50, probabilidad_lluvia=0,
+        )
+        for ciudad_id, pais_id in ciudades for d in range(-3, 4)
+    ])
+    climas = list(Clima.objects.values_list('id', 'ciudad_id', 'pais_id'))
+    tipo = Tipo_Transporte.objects.create(nombre='Bus')
+    transporte = Transporte.objects.create(nombre='Bus', tipo_transporte=tipo)
+
+    _crear(Viaje, [
+        Viaje(presupuesto=Decimal('1000'), dia_salida=hoy, ciudad_salida_id=rnd.choice(ciudades)[0], duracion_viaje=5)
+        for _ in range(n_viajes)
+    ])
+    itinerarios = []
+    for viaje_id in Viaje.objects.values_list('id', flat=True):
+        for dia in range(1, 6):
+            clima_id, ciudad_id, pais_id = rnd.choice(climas)
+            itinerarios.append(Itinerario(
+                lugar=_nombre(rnd), ciudad_id=ciudad_id, pais_id=pais_id, dia=dia, costo=Decimal('50'),
+                viaje_id=viaje_id, clima_id=clima_id, transporte=transporte,
+            ))
+    _crear(Itinerario, itinerarios)
+    _crear(Actividad, [
+        Actividad(turno=turno, orden=orden, itinerario_id=itinerario_id)
+        for itinerario_id in Itinerario.objects.values_list('id', flat=True)
+        for orden, turno in enumerate(('mañana', 'tarde'), start=1)
+    ])
+
+
+def _consultas(rnd):
+    # Las mismas consultas que hacen las vistas (catalogos, gazetteer,
+    # clima_cache, itinerarios, generador_viajes), con parámetros reales.
+    pais_id = Cities.objects.values_list('country_id', flat=True).order_by('?').first()
+    ciudad = Cities.objects.filter(country_id=pais_id).values_list('name', flat=True).first()
+    clima = Clima.objects.values_list('ciudad_id', 'pais_id').order_by('?').first() or (0, 0)
+    viaje_id = Itinerario.objects.values_list('viaje_id', flat=True).order_by('?').first() or 0
+    itinerarios = list(Itinerario.objects.filter(viaje_id=viaje_id).values_list('id', flat=True))
+    cercanas = list(Clima.objects.values_list('ciudad_id', flat=True).distinct()[:20])
+    hoy = date.today()
+
+    return [
+        ('catalogo_paises', lambda: list(
+            Countries.objects.order_by('name').values_list('id', 'name', 'updated_at'))),
+        ('catalogo_ciudades', lambda: list(
+            Cities.objects.filter(country_id=pais_id).order_by('name')
+            .values_list('id', 'name', 'latitude', 'longitude', 'updated_at'))),
+        ('ciudad_por_nombre', lambda: list(
+            Cities.objects.filter(country_id=pais_id, name=ciudad).values_list('id', flat=True))),
+        ('version_gazetteer', lambda: Cities.objects.aggregate(Max('updated_at'), Count('id'))),
+        ('clima_ciudad', lambda: list(
+            Clima.objects.filter(ciudad_id=clima[0], pais_id=clima[1], fecha__gte=hoy).order_by('fecha'))),
+        ('clima_cercanas', lambda: list(
+            Clima.objects.filter(ciudad_id__in=cercanas, fecha__gte=hoy).order_by('fecha'))),
+        ('itinerarios_viaje', lambda: list(
+            Itinerario.objects.filter(viaje_id=viaje_id).order_by('id')[:51])),
+        ('itinerarios_viaje_dia', lambda: list(
+            Itinerario.objects.filter(viaje_id=viaje_id, dia__in=[1, 2, 3]).values_list('pk', 'viaje_id', 'dia'))),
+        ('actividades_itinerarios', lambda: list(
+            Actividad.objects.filter(itinerario_id__in=itinerarios).order_by('orden', 'id'))),
+    ]
+
+
+def _explicar(sql):
+    # EXPLAIN sobre el SQL que ejecutó la consulta (ya con los parámetros)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return [' | '.join(str(c) for c in fila) for fila in cursor.fetchall()]
+
+
+def _medir(consultas, repeticiones):
+    resultados = {}
+    for nombre, ejecutar in consultas:
+        with CaptureQueriesContext(connection) as capturadas:
+            ejecutar()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            ejecutar()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        resultados[nombre] = (statistics.median(tiempos), _explicar(capturadas[-1]['sql']))
+    return resultados
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra un dataset sintético (opcional) y registra el plan (EXPLAIN) y el tiempo de las '
+        'consultas de las vistas, con y sin los índices de la migración 0005.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', action='store_true', help='Sembrar datos si las tablas están vacías')
+        parser.add_argument('--paises', type=int, default=250)
+        parser.add_argument('--estados', type=int, default=5000)
+        parser.add_argument('--ciudades', type=int, default=150000)
+        parser.add_argument('--climas', type=int, default=140000)
+        parser.add_argument('--viajes', type=int, default=20000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument(
+            '--comparar', action='store_true',
+            help='Quitar temporalmente los índices para medir el antes. Modifica el esquema: no usar en producción.'
+        )
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+        if options['sembrar']:
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                _sembrar_geo(rnd, options['paises'], options['estados'], options['ciudades'], self.stdout)
+                _sembrar_viajes(rnd, options['climas'], options['viajes'], self.stdout)
+            self.stdout.write(f"Datos sembrados en {time.perf_counter() - inicio:.1f} s")
+        if not Cities.objects.exists():
+            raise CommandError('No hay ciudades. Use --sembrar para generar el dataset.')
+
+        self.stdout.write(
+            f"Motor: {connection.vendor}  ciudades={Cities.objects.count()}  climas={Clima.objects.count()}  "
+            f"itinerarios={Itinerario.objects.count()}  actividades={Actividad.objects.count()}"
+        )
+        consultas = _consultas(rnd)
+        indices = [(modelo, indice) for modelo in MODELOS_CON_INDICES for indice in modelo._meta.indexes]
+
+        antes = None
+        if options['comparar']:
+            # Cada índice se quita en su propio bloque para saber cuáles se
+            # quitaron de verdad: ante un error o Ctrl+C a mitad, el finally
+            # recrea exactamente esos y el esquema queda como estaba.
+            quitados = []
+            try:
+                for modelo, indice in indices:
+                    with connection.schema_editor() as editor:
+                        editor.remove_index(modelo, indice)
+                    quitados.append((modelo, indice))
+                antes = _medir(consultas, options['repeticiones'])
+            finally:
+                with connection.schema_editor() as editor:
+                    for modelo, indice in quitados:
+                        editor.add_index(modelo, indice)
+        despues = _medir(consultas, options['repeticiones'])
+
+        for nombre, _ in consultas:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{nombre}"))
+            etapas = [('sin índices', antes[nombre]), ('con índices', despues[nombre])] if antes else [
+                ('actual', despues[nombre])
+            ]
+            for etiqueta, (mediana, plan) in etapas:
+                self.stdout.write(f"  {etiqueta}: mediana={mediana:.3f} ms")
+                for linea in plan:
+                    self.stdout.write(f"      {linea}")
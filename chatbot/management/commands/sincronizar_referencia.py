@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count, Max
+
+from chatbot.models import Cities, Countries, States, Tipo_Lugar, Tipo_Transporte
+from chatbot.routers import ALIAS
+
+# Padres antes que hijos (FKs)
+MODELOS = [Countries, States, Cities, Tipo_Transporte, Tipo_Lugar]
+LOTE = 5000
+
+
+def _version(modelo, alias):
+    # Igual que la versión del gazetteer: MAX(updated_at) y COUNT; los tipos
+    # no tienen updated_at y se comparan por MAX(id) y COUNT
+    campo = 'updated_at' if any(f.name == 'updated_at' for f in modelo._meta.concrete_fields) else 'id'
+    return tuple(modelo.objects.using(alias).aggregate(Max(campo), Count('id')).values())
+
+
+def _copiar(modelo, destino):
+    # INSERT directo: bulk_create volvería a poner updated_at (auto_now) y la
+    # versión del espejo dejaría de coincidir con la de default
+    conexion = connections[destino]
+    ops = conexion.ops
+    campos = modelo._meta.concrete_fields
+    tabla = ops.quote_name(modelo._meta.db_table)
+    columnas = ', '.join(ops.quote_name(campo.column) for campo in campos)
+    sql = f"INSERT INTO {tabla} ({columnas}) VALUES ({', '.join(['%s'] * len(campos))})"
+
+    total = 0
+    ultimo = None
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabla}')
+        while True:
+            filas = modelo.objects.using('default').order_by('pk')
+            if ultimo is not None:
+                filas = filas.filter(pk__gt=ultimo)
+            filas = list(filas.values_list(*[campo.attname for campo in campos])[:LOTE])
+            if not filas:
+                return total
+            cursor.executemany(sql, [
+                [campo.get_db_prep_save(valor, connection=conexion) for campo, valor in zip(campos, fila)]
+                for fila in filas
+            ])
+            total += len(filas)
+            ultimo = filas[-1][0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia países, estados, ciudades y tipos de la base default al espejo SQLite local '
+        '(DB_ESPEJO=True). Solo copia las tablas que cambiaron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help='Copiar todas las tablas aunque no hayan cambiado')
+
+    def handle(self, *args, **options):
+        if ALIAS not in settings.DATABASES or not getattr(settings, 'REFERENCIA_ESPEJO', False):
+            raise CommandError('No hay un espejo local configurado (DB_ESPEJO=True).')
+
+        # Crea o actualiza solo las tablas de referencia (ver RouterReferencia.allow_migrate)
+        call_command('migrate', 'chatbot', database=ALIAS, verbosity=0)
+
+        inicio = time.perf_counter()
+        copiadas = {}
+        # Una sola transacción: los lectores ven el espejo anterior hasta el final
+        with transaction.atomic(using=ALIAS):
+            for modelo in MODELOS:
+                if options['forzar'] or _version(modelo, 'default') != _version(modelo, ALIAS):
+                    copiadas[modelo._meta.db_table] = _copiar(modelo, ALIAS)
+
+        if not copiadas:
+            self.stdout.write('El espejo ya está al día.')
+            return
+        detalle = '  '.join(f'{tabla}: {total}' for tabla, total in copiadas.items())
+        self.stdout.write(f"Espejo actualizado en {time.perf_counter() - inicio:.1f} s  {detalle}")
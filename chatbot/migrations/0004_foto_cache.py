@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_alter_clima_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Foto_Lugar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place_id', models.CharField(max_length=255, unique=True)),
+                ('referencias', models.JSONField()),
+                ('expira_en', models.DateTimeField()),
+                ('ultimo_acceso', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'foto_lugar',
+            },
+        ),
+        migrations.CreateModel(
+            name='Foto_Consulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consulta', models.CharField(max_length=255, unique=True)),
+                ('ultimo_acceso', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lugar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chatbot.foto_lugar')),
+            ],
+            options={
+                'db_table': 'foto_consulta',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_foto_cache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cities',
+            index=models.Index(fields=['country', 'name'], name='cities_country_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cities',
+            index=models.Index(fields=['updated_at'], name='cities_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clima',
+            index=models.Index(fields=['ciudad', 'fecha'], name='clima_ciudad_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itinerario',
+            index=models.Index(fields=['viaje', 'dia'], name='itinerario_viaje_dia_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+from chatbot.normalizacion import normalizar_nombre
+
+LOTE = 2000
+
+
+def rellenar_nombres_normalizados(apps, schema_editor):
+    # Por lotes de id para no cargar las 150k ciudades a la vez. bulk_update
+    # no toca updated_at: la versión del gazetteer no cambia. using(): se lee
+    # y escribe en la base que se migra aunque un router elija otra.
+    alias = schema_editor.connection.alias
+    for modelo in ('Countries', 'States', 'Cities'):
+        Modelo = apps.get_model('chatbot', modelo)
+        ultimo = 0
+        while True:
+            filas = list(
+                Modelo.objects.using(alias).filter(pk__gt=ultimo).order_by('pk').only('pk', 'name')[:LOTE]
+            )
+            if not filas:
+                break
+            for fila in filas:
+                fila.name_normalized = normalizar_nombre(fila.name)
+            Modelo.objects.using(alias).bulk_update(filas, ['name_normalized'])
+            ultimo = filas[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cities',
+            name='name_normalized',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='countries',
+            name='name_normalized',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='states',
+            name='name_normalized',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(rellenar_nombres_normalizados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-16 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_nombres_normalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actividad',
+            name='lote',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='itinerario',
+            name='lote',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_lote_crear_en_bloque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lugar',
+            name='lote',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+    ]
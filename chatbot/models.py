@@ -3,7 +3,62 @@
 from django.db import models
 from django.contrib.auth.models import User
 
-class Countries(models.Model):
+from .normalizacion import normalizar_nombre
+
+
+class NombreNormalizadoQuerySet(models.QuerySet):
+    # bulk_create, bulk_update y update no pasan por save(): aquí también se
+    # recalcula name_normalized (importaciones masivas)
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.name_normalized = normalizar_nombre(obj.name)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'name' in fields and 'name_normalized' not in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.name_normalized = normalizar_nombre(obj.name)
+            fields = [*fields, 'name_normalized']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # Solo con un valor literal; una expresión (F, Concat) no se puede normalizar en SQL
+        if isinstance(kwargs.get('name'), str):
+            kwargs['name_normalized'] = normalizar_nombre(kwargs['name'])
+        return super().update(**kwargs)
+
+
+class ConNombreNormalizado(models.Model):
+    # name en minúsculas y sin tildes ("Perú" -> "peru"), ya calculado para
+    # armar el gazetteer. Sin índice: las búsquedas se hacen en memoria y
+    # nunca filtran por esta columna en SQL.
+    name_normalized = models.CharField(max_length=255, default='', editable=False)
+
+    objects = NombreNormalizadoQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalizar_nombre(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_normalized'}
+        super().save(*args, **kwargs)
+
+
+class ConLote(models.Model):
+    # Token del bulk_create que insertó la fila: en MySQL (sin RETURNING)
+    # crear_en_bloque relee por él los ids generados (ver persistencia.py)
+    lote = models.CharField(max_length=32, null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class Countries(ConNombreNormalizado):
     name = models.CharField(max_length=100)
     iso2 = models.CharField(max_length=2)
     iso3 = models.CharField(max_length=3)
@@ -35,7 +90,7 @@ class Countries(models.Model):
     def __str__(self):
         return self.name
 
-class States(models.Model):
+class States(ConNombreNormalizado):
     country = models.ForeignKey(Countries, on_delete=models.CASCADE, db_column='country_id')
     name = models.CharField(max_length=100)
     latitude = models.FloatField()
@@ -51,7 +106,7 @@ class States(models.Model):
     def __str__(self):
         return self.name
 
-class Cities(models.Model):
+class Cities(ConNombreNormalizado):
     country = models.ForeignKey(Countries, on_delete=models.CASCADE, db_column='country_id')
     state = models.ForeignKey(States, on_delete=models.CASCADE, db_column='state_id')
     name = models.CharField(max_length=100)
@@ -64,6 +119,12 @@ class Cities(models.Model):
 
     class Meta:
         db_table = 'cities'
+        indexes = [
+            # Ciudades de un país ordenadas por nombre (catálogo) o buscadas por nombre
+            models.Index(fields=['country', 'name'], name='cities_country_name_idx'),
+            # MAX(updated_at) y COUNT de la versión del gazetteer sin leer la tabla
+            models.Index(fields=['updated_at'], name='cities_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -99,7 +160,7 @@ class Tipo_Lugar(models.Model):
     def __str__(self):
         return self.nombre
 
-class Lugar(models.Model):
+class Lugar(ConLote):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
         ('confirmado', 'Confirmado'),
@@ -133,6 +194,10 @@ class Clima(models.Model):
     class Meta:
         db_table = 'clima'
         unique_together = ('fecha', 'ciudad', 'pais')
+        indexes = [
+            # Pronóstico de una ciudad desde hoy: el unique empieza por fecha
+            models.Index(fields=['ciudad', 'fecha'], name='clima_ciudad_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Clima {self.fecha} - {self.ciudad.name if self.ciudad else 'Sin ciudad'}, {self.pais.name if self.pais else 'Sin país'}"
@@ -157,7 +222,7 @@ class Viaje(models.Model):
     def __str__(self):
         return f"Viaje {self.id} - {self.ciudad_salida.name if self.ciudad_salida else 'Sin ciudad de salida'}"
 
-class Itinerario(models.Model):
+class Itinerario(ConLote):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
         ('confirmado', 'Confirmado'),
@@ -176,11 +241,14 @@ class Itinerario(models.Model):
 
     class Meta:
         db_table = 'itinerario'
+        indexes = [
+            models.Index(fields=['viaje', 'dia'], name='itinerario_viaje_dia_idx'),
+        ]
 
     def __str__(self):
         return f"Itinerario {self.id} - {self.lugar}"
 
-class Actividad(models.Model):
+class Actividad(ConLote):
     
     ESTADOS = [
         ('pendiente', 'Pendiente'),
@@ -208,3 +276,30 @@ class Actividad_Lugar(models.Model):
         db_table = 'actividad_lugar'
         unique_together = ('actividad', 'lugar')
 
+
+class Foto_Lugar(models.Model):
+    # Caché de fotos de Google Places por place_id (ver fotos_cache.py)
+    place_id = models.CharField(max_length=255, unique=True)
+    referencias = models.JSONField()
+    expira_en = models.DateTimeField()
+    ultimo_acceso = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'foto_lugar'
+
+    def __str__(self):
+        return self.place_id
+
+class Foto_Consulta(models.Model):
+    # Nombre de lugar normalizado -> lugar resuelto por Google Places
+    consulta = models.CharField(max_length=255, unique=True)
+    lugar = models.ForeignKey(Foto_Lugar, on_delete=models.CASCADE)
+    ultimo_acceso = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'foto_consulta'
+
+    def __str__(self):
+        return f"{self.consulta} -> {self.lugar.place_id}"
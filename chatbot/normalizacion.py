@@ -0,0 +1,13 @@
+# normalizacion.py
+# Normalización de nombres geográficos. Vive aparte para que models.py
+# pueda usarla al guardar (name_normalized) sin importar el gazetteer.
+import unicodedata
+
+
+def normalizar_nombre(texto):
+    # Minúsculas, sin tildes y con espacios colapsados: "  Bogotá D.C." -> "bogota d.c."
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().split())
@@ -3,6 +3,8 @@ import os
 import requests
 from datetime import datetime
 
+from . import upstream
+
 API_KEY = os.getenv("OPENWEATHER_API_KEY")  # Esto lo pones en tu .env
 BASE_URL = "https://api.openweathermap.org/data/3.0/onecall"
 
@@ -53,8 +55,8 @@ def formatear_clima_para_ia(datos_clima):
     
     return pronostico
 
-def obtener_clima(lat, lon):
-    params = {
+def _parametros(lat, lon):
+    return {
         "lat": lat,
         "lon": lon,
         "lang": "sp",
@@ -62,7 +64,30 @@ def obtener_clima(lat, lon):
         "appid": API_KEY
     }
 
-    response = requests.get(BASE_URL, params=params)
+def obtener_clima(lat, lon):
+    params = _parametros(lat, lon)
+
+    try:
+        response = upstream.get('openweather', BASE_URL, params=params)
+    except requests.exceptions.RequestException as e:
+        print(f"Error en OpenWeather API: {e}")
+        return None
+
+    if response.status_code == 200:
+        datos_originales = response.json()
+        return formatear_clima_para_ia(datos_originales)
+    else:
+        print(f"Error {response.status_code}: {response.text}")
+        return None
+
+async def obtener_clima_async(lat, lon):
+    params = _parametros(lat, lon)
+
+    try:
+        response = await upstream.get_async('openweather', BASE_URL, params=params)
+    except upstream.ERRORES_ASYNC as e:
+        print(f"Error en OpenWeather API: {e}")
+        return None
 
     if response.status_code == 200:
         datos_originales = response.json()
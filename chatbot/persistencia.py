@@ -0,0 +1,66 @@
+# persistencia.py
+# Utilidades para escribir grafos de filas (viaje -> itinerarios ->
+# actividades -> lugares) con bulk_create. En MySQL bulk_create no devuelve
+# los ids generados, y los hijos los necesitan como clave foránea.
+import uuid
+from collections import defaultdict, deque
+
+from django.db import connection
+from django.db.models import Max
+
+
+def _clave_unica(modelo, campos_clave):
+    # True si `campos_clave` (attnames) es un unique_together del modelo
+    campos = {modelo._meta.get_field(campo).attname for campo in campos_clave}
+    return any(
+        {modelo._meta.get_field(campo).attname for campo in unicos} == campos
+        for unicos in modelo._meta.unique_together
+    )
+
+
+def crear_en_bloque(modelo, objetos, campos_clave, batch_size=500):
+    # bulk_create que deja el pk asignado en cada objeto en cualquier motor.
+    # `campos_clave` son atributos (attname, p. ej. 'viaje_id') que
+    # identifican cada fila dentro del lote; el primero debería ser selectivo
+    # (la FK al padre recién creado) porque se usa para filtrar la relectura.
+    # Si varias filas del lote comparten la clave, los ids se reparten en el
+    # orden del lote. Debe llamarse dentro de una transacción.
+    #
+    # Sin RETURNING la relectura no puede mezclar filas de otra petición que
+    # se confirmen entre el MAX(id) y el INSERT con la misma clave: si la
+    # clave es única solo existe una fila por clave; si no, el modelo debe
+    # tener la columna `lote` (ConLote) y se relee solo lo marcado con un
+    # token propio de esta llamada.
+    if not objetos:
+        return objetos
+    if connection.features.can_return_rows_from_bulk_insert:
+        return modelo.objects.bulk_create(objetos, batch_size=batch_size)
+
+    filtros = {}
+    if not _clave_unica(modelo, campos_clave):
+        if not any(campo.name == 'lote' for campo in modelo._meta.concrete_fields):
+            raise TypeError(f'{modelo.__name__} necesita una clave única o la columna lote (ConLote)')
+        filtros['lote'] = uuid.uuid4().hex
+        for objeto in objetos:
+            objeto.lote = filtros['lote']
+        # El rango de pk acota la relectura sin necesitar un índice sobre lote
+        filtros['pk__gt'] = modelo.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+
+    modelo.objects.bulk_create(objetos, batch_size=batch_size)
+
+    primero = campos_clave[0]
+    filas = modelo.objects.filter(
+        **filtros,
+        **{f'{primero}__in': {getattr(o, primero) for o in objetos}}
+    ).order_by('pk').values_list('pk', *campos_clave)
+    ids = defaultdict(deque)
+    for fila in filas:
+        ids[tuple(fila[1:])].append(fila[0])
+    for objeto in objetos:
+        objeto.pk = ids[tuple(getattr(objeto, campo) for campo in campos_clave)].popleft()
+    return objetos
+
+
+def mapa_por(objetos, campo):
+    # {valor del campo: objeto}, para armar respuestas sin consultar cada FK
+    return {getattr(objeto, campo): objeto for objeto in objetos}
@@ -2,6 +2,8 @@
 import os
 import requests
 
+from . import upstream
+
 API_KEY = os.getenv("FOURSQUARE_API_KEY")
 BASE_URL = "https://api.foursquare.com/v3/places/search"
 
@@ -10,8 +12,8 @@ HEADERS = {
     "Authorization": API_KEY
 }
 
-def buscar_lugares_foursquare(lugar, radius=3000, limit=20):
-    params = {
+def _parametros(lugar, radius, limit):
+    return {
         "near": lugar,
         "categories": "13065,19014",
         "radius": radius,
@@ -19,25 +21,40 @@ def buscar_lugares_foursquare(lugar, radius=3000, limit=20):
         "sort": "DISTANCE"
     }
 
+def _formatear_resultados(lugares):
+    resultados = []
+    for sitio in lugares.get("results", []):
+        resultados.append({
+            "nombre": sitio.get("name"),
+            "direccion": sitio.get("location", {}).get("formatted_address", ""),
+            "categorias": [c["name"] for c in sitio.get("categories", [])]
+        })
+    return resultados
+
+def buscar_lugares_foursquare(lugar, radius=3000, limit=20):
+    params = _parametros(lugar, radius, limit)
+
     try:
-        response = requests.get(BASE_URL, headers=HEADERS, params=params)
+        response = upstream.get('foursquare', BASE_URL, headers=HEADERS, params=params)
         
         print(f"Status code: {response.status_code}")
         print(f"Response text: {response.text}")
 
         response.raise_for_status()
-        lugares = response.json()
+        return _formatear_resultados(response.json())
+
+    except requests.exceptions.RequestException as e:
+        print(f"Error en Foursquare API: {e}")
+        return None
 
-        resultados = []
-        for sitio in lugares.get("results", []):
-            resultados.append({
-                "nombre": sitio.get("name"),
-                "direccion": sitio.get("location", {}).get("formatted_address", ""),
-                "categorias": [c["name"] for c in sitio.get("categories", [])]
-            })
+async def buscar_lugares_foursquare_async(lugar, radius=3000, limit=20):
+    params = _parametros(lugar, radius, limit)
 
-        return resultados
+    try:
+        response = await upstream.get_async('foursquare', BASE_URL, headers=HEADERS, params=params)
+        response.raise_for_status()
+        return _formatear_resultados(response.json())
 
-    except requests.exceptions.RequestException as e:
+    except upstream.ERRORES_ASYNC as e:
         print(f"Error en Foursquare API: {e}")
         return None
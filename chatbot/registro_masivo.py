@@ -0,0 +1,277 @@
+# registro_masivo.py
+# Registro en bloque de itinerarios, actividades y relaciones
+# actividad-lugar. Todas las filas se validan antes de escribir (con una
+# consulta por tabla referenciada, no una por fila); si alguna tiene errores
+# no se registra ninguna. Las válidas se insertan con bulk_create en una sola
+# transacción y la respuesta se arma con mapas precargados.
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .gazetteer import obtener_gazetteer
+from .models import Actividad, Actividad_Lugar, Clima, Itinerario, Lugar, Transporte, Viaje
+from .persistencia import crear_en_bloque
+
+COSTO_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+def _entero(valor):
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, str) and valor.strip().lstrip('-').isdigit():
+        return int(valor)
+    return valor if isinstance(valor, int) else None
+
+
+def _texto(valor, maximo):
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+    valor = valor.strip()
+    return valor if len(valor) <= maximo else None
+
+
+def _costo(valor):
+    # Decimal acepta "NaN" e "Infinity": se rechazan antes de comparar
+    try:
+        costo = Decimal(str(valor))
+        if not costo.is_finite():
+            return None
+        costo = costo.quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return costo if 0 <= costo <= COSTO_MAXIMO else None
+
+
+def _ids(entradas, campo):
+    # Ids con formato válido de todas las filas, para una sola consulta
+    ids = set()
+    for entrada in entradas:
+        if isinstance(entrada, dict):
+            valor = _entero(entrada.get(campo))
+            if valor is not None:
+                ids.add(valor)
+    return ids
+
+
+def _existentes(modelo, ids):
+    return set(modelo.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+
+
+def _referencia(entrada, campo, existentes, errores, nombre):
+    valor = _entero(entrada.get(campo))
+    if valor is None:
+        errores.append(f"El campo '{campo}' debe ser un entero.")
+    elif valor not in existentes:
+        errores.append(f"No existe {nombre} con id {valor}.")
+    return valor
+
+
+def _estado(entrada, modelo, errores):
+    estado = entrada.get('estado', 'pendiente')
+    validos = [clave for clave, _ in modelo.ESTADOS]
+    if estado not in validos:
+        errores.append(f"El campo 'estado' debe ser uno de: {', '.join(validos)}.")
+    return estado
+
+
+def _resultado(entrada, errores, data=None):
+    return {
+        'entrada': entrada,
+        'status': 'error' if errores else 'success',
+        'message': ' '.join(errores) if errores else 'Registrado.',
+        'data': data,
+    }
+
+
+def _validar(entradas, validar_fila):
+    # [(entrada, objeto o None, errores)]; objeto solo si la fila es válida
+    validadas = []
+    for entrada in entradas:
+        if not isinstance(entrada, dict):
+            validadas.append((entrada, None, ['Cada elemento debe ser un objeto.']))
+            continue
+        errores = []
+        objeto = validar_fila(entrada, errores)
+        validadas.append((entrada, None if errores else objeto, errores))
+    return validadas
+
+
+def _con_errores(validadas):
+    return [
+        _resultado(entrada, errores) if errores else {
+            'entrada': entrada,
+            'status': 'valido',
+            'message': 'Sin errores; no se registró porque hay otras filas con errores.',
+            'data': None,
+        }
+        for entrada, _, errores in validadas
+    ]
+
+
+def registrar_itinerarios(entradas):
+    # Devuelve (resultados por fila, True si se registraron)
+    gazetteer = obtener_gazetteer()
+    viajes = _existentes(Viaje, _ids(entradas, 'viaje_id'))
+    climas = _existentes(Clima, _ids(entradas, 'clima_id'))
+    transportes = _existentes(Transporte, _ids(entradas, 'transporte_id'))
+
+    def validar_fila(entrada, errores):
+        lugar = _texto(entrada.get('lugar'), 255)
+        if lugar is None:
+            errores.append("El campo 'lugar' es obligatorio (máximo 255 caracteres).")
+        ciudad = gazetteer.ciudades.get(_entero(entrada.get('ciudad_id')))
+        if ciudad is None:
+            errores.append(f"No existe la ciudad con id {entrada.get('ciudad_id')}.")
+        pais_id = _entero(entrada.get('pais_id'))
+        if pais_id not in gazetteer.paises:
+            errores.append(f"No existe el país con id {entrada.get('pais_id')}.")
+        elif ciudad is not None and ciudad.country_id != pais_id:
+            errores.append(f"La ciudad {ciudad.name} no pertenece al país con id {pais_id}.")
+        dia = _entero(entrada.get('dia'))
+        if dia is None or dia < 1:
+            errores.append("El campo 'dia' debe ser un entero mayor o igual a 1.")
+        costo = _costo(entrada.get('costo'))
+        if costo is None:
+            errores.append("El campo 'costo' debe ser un número entre 0 y 99999999.99.")
+        return Itinerario(
+            lugar=lugar,
+            ciudad_id=ciudad.id if ciudad else None,
+            pais_id=pais_id,
+            dia=dia,
+            costo=costo,
+            estado=_estado(entrada, Itinerario, errores),
+            viaje_id=_referencia(entrada, 'viaje_id', viajes, errores, 'el viaje'),
+            clima_id=_referencia(entrada, 'clima_id', climas, errores, 'el clima'),
+            transporte_id=_referencia(entrada, 'transporte_id', transportes, errores, 'el transporte'),
+        )
+
+    validadas = _validar(entradas, validar_fila)
+    if any(errores for _, _, errores in validadas):
+        return _con_errores(validadas), False
+
+    itinerarios = [objeto for _, objeto, _ in validadas]
+    with transaction.atomic():
+        crear_en_bloque(Itinerario, itinerarios, ['viaje_id', 'dia'])
+
+    return [
+        _resultado(entrada, [], {
+            'id': itinerario.id,
+            'lugar': itinerario.lugar,
+            'ciudad': gazetteer.ciudades[itinerario.ciudad_id].name,
+            'pais': gazetteer.paises[itinerario.pais_id].name,
+            'dia': itinerario.dia,
+            'estado': itinerario.estado,
+        })
+        for (entrada, _, _), itinerario in zip(validadas, itinerarios)
+    ], True
+
+
+def _lugares(ids):
+    # {id: Lugar} con el tipo de lugar ya cargado
+    if not ids:
+        return {}
+    return {lugar.id: lugar for lugar in Lugar.objects.filter(pk__in=ids).select_related('tipo_lugar')}
+
+
+def _lugar_a_dict(lugar):
+    return {'id': lugar.id, 'nombre': lugar.nombre, 'tipo_lugar': lugar.tipo_lugar.nombre}
+
+
+def registrar_actividades(entradas):
+    itinerarios = _existentes(Itinerario, _ids(entradas, 'itinerario_id'))
+    lugares = _lugares({
+        lugar_id
+        for entrada in entradas if isinstance(entrada, dict) and isinstance(entrada.get('lugares_ids'), list)
+        for lugar_id in map(_entero, entrada['lugares_ids']) if lugar_id is not None
+    })
+
+    def validar_fila(entrada, errores):
+        turno = _texto(entrada.get('turno'), 10)
+        if turno is None:
+            errores.append("El campo 'turno' es obligatorio (máximo 10 caracteres).")
+        orden = _entero(entrada.get('orden'))
+        if orden is None:
+            errores.append("El campo 'orden' debe ser un entero.")
+        lugares_ids = entrada.get('lugares_ids') or []
+        if not isinstance(lugares_ids, list):
+            errores.append("El campo 'lugares_ids' debe ser una lista.")
+            lugares_ids = []
+        ids = []
+        for valor in lugares_ids:
+            lugar_id = _entero(valor)
+            if lugar_id not in lugares:
+                errores.append(f"No existe el lugar con id {valor}.")
+            elif lugar_id not in ids:
+                ids.append(lugar_id)
+        actividad = Actividad(
+            turno=turno,
+            orden=orden,
+            estado=_estado(entrada, Actividad, errores),
+            itinerario_id=_referencia(entrada, 'itinerario_id', itinerarios, errores, 'el itinerario'),
+        )
+        return actividad, ids
+
+    validadas = _validar(entradas, validar_fila)
+    if any(errores for _, _, errores in validadas):
+        return _con_errores(validadas), False
+
+    actividades = [actividad for _, (actividad, _), _ in validadas]
+    with transaction.atomic():
+        crear_en_bloque(Actividad, actividades, ['itinerario_id', 'orden'])
+        Actividad_Lugar.objects.bulk_create([
+            Actividad_Lugar(actividad_id=actividad.id, lugar_id=lugar_id)
+            for _, (actividad, ids), _ in validadas for lugar_id in ids
+        ], batch_size=500)
+
+    return [
+        _resultado(entrada, [], {
+            'id': actividad.id,
+            'turno': actividad.turno,
+            'orden': actividad.orden,
+            'estado': actividad.estado,
+            'itinerario_id': actividad.itinerario_id,
+            'lugares': [_lugar_a_dict(lugares[lugar_id]) for lugar_id in ids],
+        })
+        for entrada, (actividad, ids), _ in validadas
+    ], True
+
+
+def registrar_actividades_lugar(entradas):
+    actividades = _existentes(Actividad, _ids(entradas, 'actividad_id'))
+    lugares = _lugares(_ids(entradas, 'lugar_id'))
+    # unique_together (actividad, lugar): pares ya registrados o repetidos en el lote
+    registrados = set(
+        Actividad_Lugar.objects.filter(actividad_id__in=actividades, lugar_id__in=lugares)
+        .values_list('actividad_id', 'lugar_id')
+    ) if actividades and lugares else set()
+    vistos = set()
+
+    def validar_fila(entrada, errores):
+        actividad_id = _referencia(entrada, 'actividad_id', actividades, errores, 'la actividad')
+        lugar_id = _referencia(entrada, 'lugar_id', lugares, errores, 'el lugar')
+        par = (actividad_id, lugar_id)
+        if not errores:
+            if par in registrados:
+                errores.append(f"La actividad {actividad_id} ya tiene registrado el lugar {lugar_id}.")
+            elif par in vistos:
+                errores.append(f"La relación actividad {actividad_id} - lugar {lugar_id} está repetida en la lista.")
+            vistos.add(par)
+        return Actividad_Lugar(actividad_id=actividad_id, lugar_id=lugar_id)
+
+    validadas = _validar(entradas, validar_fila)
+    if any(errores for _, _, errores in validadas):
+        return _con_errores(validadas), False
+
+    relaciones = [objeto for _, objeto, _ in validadas]
+    with transaction.atomic():
+        crear_en_bloque(Actividad_Lugar, relaciones, ['actividad_id', 'lugar_id'])
+
+    return [
+        _resultado(entrada, [], {
+            'id': relacion.id,
+            'actividad_id': relacion.actividad_id,
+            'lugar_id': relacion.lugar_id,
+            'lugar': _lugar_a_dict(lugares[relacion.lugar_id]),
+        })
+        for (entrada, _, _), relacion in zip(validadas, relaciones)
+    ], True
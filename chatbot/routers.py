@@ -0,0 +1,42 @@
+# routers.py
+# Lecturas de datos de referencia (países, estados, ciudades y tipos) hacia
+# la base 'referencia' cuando está configurada: una réplica de MySQL o un
+# espejo SQLite local que mantiene manage.py sincronizar_referencia. Las
+# escrituras y las tablas transaccionales (viaje, itinerario, actividad...)
+# siguen en default.
+from django.conf import settings
+
+ALIAS = 'referencia'
+MODELOS_REFERENCIA = {'countries', 'states', 'cities', 'tipo_transporte', 'tipo_lugar'}
+
+
+def es_referencia(model):
+    return model._meta.app_label == 'chatbot' and model._meta.model_name in MODELOS_REFERENCIA
+
+
+def configurada():
+    return ALIAS in settings.DATABASES
+
+
+class RouterReferencia:
+    def db_for_read(self, model, **hints):
+        return ALIAS if configurada() and es_referencia(model) else None
+
+    def db_for_write(self, model, **hints):
+        # Un objeto leído del espejo se guarda en default, no en el espejo
+        return 'default' if configurada() and es_referencia(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Una ciudad leída de la réplica puede asignarse a un itinerario de default
+        if {obj1._state.db, obj2._state.db} <= {'default', ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db != ALIAS:
+            return None
+        # El espejo solo tiene las tablas de referencia; la réplica recibe el
+        # esquema por replicación
+        return bool(getattr(settings, 'REFERENCIA_ESPEJO', False)) and (
+            app_label == 'chatbot' and model_name in MODELOS_REFERENCIA
+        )
@@ -1,3 +1,1521 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from . import (
+    cache_local, catalogos, clima_cache, deepseek_cache, deepseek_sse, fotos_cache, gazetteer, geo_instantanea,
+    images, upstream,
+)
+from .autocompletar import PUNTAJE_MINIMO, TIPO_CIUDAD, TIPO_PAIS, IndiceTrigramas, obtener_indice
+from .gazetteer import buscar_pais, obtener_gazetteer, refrescar_gazetteer, version_actual
+from .geo_espacial import RADIO_TIERRA_KM, IndiceEspacial, obtener_indice_espacial
+from .management.commands.auditar_arranque import MODULOS_PEREZOSOS, SCRIPT_HIJO
+from .management.commands.medir_indices import MODELOS_CON_INDICES
+from .persistencia import crear_en_bloque
+from .routers import ALIAS
+from .models import (
+    Actividad, Actividad_Lugar, Cities, Clima, Countries, Foto_Consulta, Foto_Lugar, Itinerario, Lugar,
+    States, Tipo_Lugar, Tipo_Transporte, Transporte, Viaje
+)
+
+ITINERARIOS = 1000
+CIUDADES = 20
+ACTIVIDADES_POR_ITINERARIO = 2
+LUGARES_POR_ACTIVIDAD = 2
+
+
+def _consultas_crear_en_bloque():
+    # Sin RETURNING (MySQL) crear_en_bloque suma el MAX(id) previo y la relectura
+    return 0 if connection.features.can_return_rows_from_bulk_insert else 2
+
+
+def _pais(nombre, iso2):
+    return Countries(
+        name=nombre, iso2=iso2, iso3=iso2 + 'X', numeric_code='000', phonecode='0',
+        capital='', currency='', currency_name='', currency_symbol='', tld='', native=nombre,
+        region='', subregion='', timezones=[], translations={}, latitude=0, longitude=0,
+        emoji='', emojiU='', flag=True,
+    )
+
+
+class ConsultasPorListadoTests(TestCase):
+    # Fija el número de consultas de los listados: no debe crecer con los datos
+
+    @classmethod
+    def setUpTestData(cls):
+        Countries.objects.bulk_create([_pais('Peru', 'PE'), _pais('Chile', 'CL')])
+        cls.peru, cls.chile = Countries.objects.order_by('id')
+        estado = States.objects.create(country=cls.peru, name='Lima', latitude=0, longitude=0)
+        Cities.objects.bulk_create([
+            Cities(country=cls.peru, state=estado, name=f'Ciudad {i}', latitude=-12 + i * 0.1, longitude=-77)
+            for i in range(CIUDADES)
+        ])
+        ciudades = list(Cities.objects.order_by('id'))
+        cls.ciudad = ciudades[0]
+
+        terrestre = Tipo_Transporte.objects.create(nombre='Terrestre')
+        transportes = Transporte.objects.bulk_create([
+            Transporte(tipo_transporte=terrestre, nombre=n) for n in ('Bus', 'Auto', 'Tren')
+        ])
+        tipos = Tipo_Lugar.objects.bulk_create([Tipo_Lugar(nombre=n) for n in ('Playa', 'Museo', 'Plaza')])
+        Lugar.objects.bulk_create([
+            Lugar(nombre=f'Lugar {i}', descripcion='', ubicacion='Lima', tipo_lugar=tipos[i % len(tipos)])
+            for i in range(50)
+        ])
+        lugares = list(Lugar.objects.values_list('id', flat=True))
+
+        Viaje.objects.bulk_create([
+            Viaje(presupuesto=1000, dia_salida=date(2026, 1, 1), ciudad_salida=cls.ciudad, duracion_viaje=10)
+            for _ in range(ITINERARIOS // 10)
+        ])
+        viajes = list(Viaje.objects.values_list('id', flat=True))
+
+        inicio = date(2026, 1, 1)
+        Clima.objects.bulk_create([
+            Clima(fecha=inicio + timedelta(days=i // CIUDADES), ciudad=ciudades[i % CIUDADES], pais=cls.peru,
+                  temperatura_maxima=25, temperatura_minima=15, estado_clima='Clear', humedad=60,
+                  probabilidad_lluvia=0.1)
+            for i in range(ITINERARIOS)
+        ])
+        climas = list(Clima.objects.order_by('id'))
+
+        Itinerario.objects.bulk_create([
+            Itinerario(lugar=f'Zona {i}', ciudad=clima.ciudad, pais=cls.peru, dia=i % 10 + 1, costo=100,
+                       viaje_id=viajes[i // 10], clima=clima, transporte=transportes[i % len(transportes)])
+            for i, clima in enumerate(climas)
+        ])
+        Actividad.objects.bulk_create([
+            Actividad(turno='mañana', orden=orden, itinerario_id=itinerario_id)
+            for itinerario_id in Itinerario.objects.values_list('id', flat=True)
+            for orden in range(1, ACTIVIDADES_POR_ITINERARIO + 1)
+        ])
+        Actividad_Lugar.objects.bulk_create([
+            Actividad_Lugar(actividad_id=actividad_id, lugar_id=lugares[(actividad_id + k) % len(lugares)])
+            for actividad_id in Actividad.objects.values_list('id', flat=True)
+            for k in range(LUGARES_POR_ACTIVIDAD)
+        ])
+
+    def setUp(self):
+        # Gazetteer e índices en memoria cargados antes de contar consultas
+        refrescar_gazetteer()
+        catalogos.vaciar()
+        obtener_indice()
+        obtener_indice_espacial()
+
+    def test_itinerario_completo(self):
+        # Por página: itinerarios con sus FKs, actividades y lugares con su tipo
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/api/itinerario/', {'limite': 200})
+        self.assertEqual(respuesta.status_code, 200)
+        data = respuesta.json()['data']
+        self.assertEqual(len(data), 200)
+        self.assertEqual(data[0]['transporte']['tipo_transporte'], 'Terrestre')
+        self.assertEqual(data[0]['clima']['temperatura_maxima'], 25)
+        actividades = data[0]['actividades']
+        self.assertEqual([a['orden'] for a in actividades], [1, 2])
+        self.assertEqual(len(actividades[0]['lugares']), LUGARES_POR_ACTIVIDAD)
+        self.assertIn(actividades[0]['lugares'][0]['tipo_lugar'], {'Playa', 'Museo', 'Plaza'})
+
+    def test_itinerario_recorre_todas_las_paginas(self):
+        ids = []
+        parametros = {'limite': 200, 'campos': 'id'}
+        while True:
+            with self.assertNumQueries(1):
+                respuesta = self.client.get('/api/itinerario/', parametros)
+            cuerpo = respuesta.json()
+            ids.extend(i['id'] for i in cuerpo['data'])
+            if not cuerpo['paginacion']['siguiente']:
+                break
+            parametros['cursor'] = cuerpo['paginacion']['siguiente']
+        self.assertEqual(len(ids), ITINERARIOS)
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_itinerario_campos_y_filtros(self):
+        viaje_id = Itinerario.objects.values_list('viaje_id', flat=True).first()
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/itinerario/', {
+                'viaje_id': viaje_id, 'estado': 'pendiente', 'dia': 3, 'campos': 'lugar,dia,ciudad'
+            })
+        data = respuesta.json()['data']
+        self.assertEqual(len(data), 1)
+        self.assertEqual(set(data[0]), {'id', 'lugar', 'dia', 'ciudad'})
+
+        respuesta = self.client.get('/api/itinerario/', {
+            'ciudad': 'ciudad 1', 'pais': 'peru', 'campos': 'ciudad', 'limite': 200
+        })
+        data = respuesta.json()['data']
+        self.assertEqual(len(data), ITINERARIOS // CIUDADES)
+        self.assertEqual({i['ciudad']['nombre'] for i in data}, {'Ciudad 1'})
+
+    def test_itinerario_parametros_invalidos(self):
+        for parametros in ({'campos': 'id,secreto'}, {'cursor': 'no-es-un-cursor'},
+                           {'estado': 'otro'}, {'ciudad': 'Ciudad 1'}, {'limite': 'x'}):
+            respuesta = self.client.get('/api/itinerario/', parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
+
+    @override_settings(ITINERARIO_EXPORTAR_LOTE=250)
+    def test_exportar_itinerarios(self):
+        # Tres consultas por lote de 250: el total no se carga de una vez
+        respuesta = self.client.get('/api/itinerario/exportar/')
+        with self.assertNumQueries(3 * ITINERARIOS // 250):
+            lineas = b''.join(respuesta.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in lineas]
+        self.assertEqual(len(filas), ITINERARIOS)
+        self.assertEqual(len(filas[-1]['actividades']), ACTIVIDADES_POR_ITINERARIO)
+
+        respuesta = self.client.get('/api/itinerario/exportar/', {'formato': 'json', 'campos': 'dia', 'dia': 1})
+        filas = json.loads(b''.join(respuesta.streaming_content))
+        self.assertEqual(len(filas), ITINERARIOS // 10)
+        self.assertEqual(set(filas[0]), {'id', 'dia'})
+
+    def test_listar_paises(self):
+        # Se arma una vez por versión del catálogo; luego sin consultas
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/paises/')
+        self.assertEqual([p['name'] for p in respuesta.json()['data']], ['Chile', 'Peru'])
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/paises/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(respuesta.content))['data'][1]['id'], self.peru.id)
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/paises/', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta = self.client.get('/api/paises/', HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_listar_paises_cambia_etag_al_modificar(self):
+        etag = self.client.get('/api/paises/')['ETag']
+        self.chile.name = 'República de Chile'
+        self.chile.save()
+        respuesta = self.client.get('/api/paises/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['data'][0]['name'], 'Peru')
+
+    def test_listar_ciudades_por_pais(self):
+        with self.assertNumQueries(1):
+            respuesta = self.client.get('/api/ciudades/', {'pais': 'peru'})
+        self.assertEqual(len(respuesta.json()['data']), CIUDADES)
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/ciudades/', {'pais': 'Peru'}, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(self.client.get('/api/ciudades/', {'pais': 'pe'}).status_code, 200)
+        for pais in ('a', 'Per', 'eru'):
+            self.assertEqual(self.client.get('/api/ciudades/', {'pais': pais}).status_code, 404, pais)
+        self.assertEqual(self.client.get('/api/ciudades/', {'pais': 'Narnia'}).status_code, 404)
+
+    def test_buscar_ciudades(self):
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/ciudades/buscar/', {'q': 'Ciudad', 'limite': 50})
+        self.assertEqual(len(respuesta.json()['data']), CIUDADES)
+
+    def test_ciudades_mas_cercanas(self):
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/ciudades/cercanas/', {'ciudad_id': self.ciudad.id, 'k': 10})
+        self.assertEqual(len(respuesta.json()['data']), 10)
+
+    def test_ciudades_en_radio(self):
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/ciudades/radio/', {'ciudad_id': self.ciudad.id, 'km': 1000})
+        self.assertEqual(len(respuesta.json()['data']), CIUDADES - 1)
+
+    def test_clima_batch(self):
+        pronostico = [{'fecha': '2026-01-01', 'estado_clima': 'Clear'}]
+        entradas = [
+            {'ciudad_id': self.ciudad.id}, {'ciudad': 'Ciudad 1', 'pais': 'Peru'},
+            {'ciudad_id': 0}, 'Lima', {'ciudad': 'Ciudad 2'},
+        ]
+        with mock.patch('chatbot.views.obtener_pronosticos') as obtener:
+            obtener.side_effect = lambda ciudades, dias: {c.id: pronostico for c in ciudades[:1]}
+            respuesta = self.client.post(
+                '/api/clima/batch/', {'ciudades': entradas, 'dias': '9'}, content_type='application/json'
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(obtener.call_args.kwargs['dias'], 5)
+        data = respuesta.json()['data']
+        self.assertEqual([r['status'] for r in data], ['success', 'error', 'error', 'error', 'error'])
+        self.assertEqual(data[0]['data'], pronostico)
+        self.assertEqual(data[1]['message'], 'No se pudo obtener el clima.')
+
+    def test_clima_batch_cuerpo_invalido(self):
+        ciudades = [{'ciudad_id': self.ciudad.id}]
+        for cuerpo in ([1, 2], 'hola', {}, {'ciudades': []}, {'ciudades': ciudades, 'dias': 'abc'},
+                       {'ciudades': ciudades * 51}):
+            respuesta = self.client.post('/api/clima/batch/', json.dumps(cuerpo), content_type='application/json')
+            self.assertEqual(respuesta.status_code, 400, cuerpo)
+            self.assertEqual(respuesta.json()['status'], 'error')
+
+    def test_registro_masivo_itinerarios(self):
+        # Tres comprobaciones de FKs, savepoint, INSERT y release, sea cual sea el tamaño
+        # (90 filas caben en un solo INSERT bajo el límite de 999 parámetros de SQLite)
+        esperadas = 6 + _consultas_crear_en_bloque()
+        itinerario = Itinerario.objects.first()
+        for cantidad in (1, 90):
+            filas = [{
+                'lugar': f'Nueva {i}', 'ciudad_id': itinerario.ciudad_id, 'pais_id': itinerario.pais_id,
+                'dia': i + 1, 'costo': 10, 'viaje_id': itinerario.viaje_id, 'clima_id': itinerario.clima_id,
+                'transporte_id': itinerario.transporte_id,
+            } for i in range(cantidad)]
+            with self.assertNumQueries(esperadas):
+                respuesta = self.client.post('/api/registrar/itinerarios/', filas, content_type='application/json')
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertEqual(len(respuesta.json()['data']), cantidad)
+
+    def test_registro_masivo_costo_no_finito(self):
+        itinerario = Itinerario.objects.first()
+        filas = [{
+            'lugar': 'Nueva', 'ciudad_id': itinerario.ciudad_id, 'pais_id': itinerario.pais_id, 'dia': 1,
+            'costo': costo, 'viaje_id': itinerario.viaje_id, 'clima_id': itinerario.clima_id,
+            'transporte_id': itinerario.transporte_id,
+        } for costo in ('NaN', 'Infinity', '-Infinity', 'sNaN', '1e20', 10)]
+        respuesta = self.client.post('/api/registrar/itinerarios/', filas, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(
+            [r['status'] for r in respuesta.json()['data']], ['error'] * 5 + ['valido']
+        )
+
+    def test_crear_en_bloque_sin_returning_ignora_filas_ajenas(self):
+        # Otra petición confirma una fila con la misma clave entre el MAX(id)
+        # y el INSERT (ruta de MySQL, sin RETURNING)
+        base = Itinerario.objects.first()
+        bulk_create = Itinerario.objects.bulk_create
+
+        def insertar_ajena_antes(objetos, **kwargs):
+            ajena = Itinerario.objects.create(
+                lugar='Ajena', ciudad_id=base.ciudad_id, pais_id=base.pais_id, dia=99, costo=1,
+                viaje_id=base.viaje_id, clima_id=base.clima_id, transporte_id=base.transporte_id,
+            )
+            self.ajenas.append(ajena.id)
+            return bulk_create(objetos, **kwargs)
+
+        nuevos = [
+            Itinerario(lugar=f'Propia {i}', ciudad_id=base.ciudad_id, pais_id=base.pais_id, dia=99, costo=1,
+                       viaje_id=base.viaje_id, clima_id=base.clima_id, transporte_id=base.transporte_id)
+            for i in range(3)
+        ]
+        self.ajenas = []
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(Itinerario.objects, 'bulk_create', insertar_ajena_antes):
+            crear_en_bloque(Itinerario, nuevos, ['viaje_id', 'dia'])
+        self.assertEqual(len(self.ajenas), 1)
+        self.assertNotIn(self.ajenas[0], [i.pk for i in nuevos])
+        self.assertEqual(
+            [Itinerario.objects.get(pk=i.pk).lugar for i in nuevos], ['Propia 0', 'Propia 1', 'Propia 2']
+        )
+
+        # Clave única (actividad, lugar): se relee por clave, sin token
+        actividad = Actividad.objects.create(turno='noche', orden=1, itinerario=base)
+        relaciones = [Actividad_Lugar(actividad_id=actividad.id, lugar_id=l) for l in
+                      Lugar.objects.values_list('id', flat=True)[:2]]
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            crear_en_bloque(Actividad_Lugar, relaciones, ['actividad_id', 'lugar_id'])
+        self.assertEqual(
+            sorted(r.pk for r in relaciones),
+            sorted(Actividad_Lugar.objects.filter(actividad=actividad).values_list('id', flat=True)),
+        )
+
+    def test_registro_masivo_actividades(self):
+        itinerarios = list(Itinerario.objects.values_list('id', flat=True)[:100])
+        lugares = list(Lugar.objects.values_list('id', flat=True)[:3])
+        filas = [
+            {'turno': 'tarde', 'orden': 10, 'itinerario_id': itinerario_id, 'lugares_ids': lugares}
+            for itinerario_id in itinerarios
+        ]
+        # Itinerarios, lugares con su tipo, savepoint, dos INSERT y release
+        with self.assertNumQueries(6 + _consultas_crear_en_bloque()):
+            respuesta = self.client.post('/api/registrar/actividades/', filas, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.json()['data'][0]['data']['lugares']), 3)
+
+    def test_registro_masivo_actividades_lugar(self):
+        actividad = Actividad.objects.create(turno='noche', orden=1, itinerario=Itinerario.objects.first())
+        lugares = list(Lugar.objects.values_list('id', flat=True)[:3])
+        filas = [{'actividad_id': actividad.id, 'lugar_id': lugar_id} for lugar_id in lugares]
+        respuesta = self.client.post(
+            '/api/registrar/actividades-lugar/', {'relaciones': filas}, content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual([r['data']['lugar_id'] for r in respuesta.json()['data']], lugares)
+        self.assertEqual(Actividad_Lugar.objects.filter(actividad=actividad).count(), 3)
+
+    def test_registro_masivo_cuerpo_invalido(self):
+        for cuerpo in ('hola', 5, [], {}, {'itinerarios': 'x'}, [{}] * 1001):
+            respuesta = self.client.post(
+                '/api/registrar/itinerarios/', json.dumps(cuerpo), content_type='application/json'
+            )
+            self.assertEqual(respuesta.status_code, 400, cuerpo)
+            self.assertEqual(respuesta.json()['status'], 'error')
+
+    def test_registro_masivo_con_errores_no_registra_ninguno(self):
+        actividad = Actividad.objects.create(turno='noche', orden=1, itinerario=Itinerario.objects.first())
+        lugar_id = Lugar.objects.values_list('id', flat=True).first()
+        filas = [
+            {'actividad_id': actividad.id, 'lugar_id': lugar_id},
+            {'actividad_id': actividad.id, 'lugar_id': lugar_id},
+            {'actividad_id': 0, 'lugar_id': lugar_id},
+        ]
+        antes = Actividad_Lugar.objects.count()
+        respuesta = self.client.post('/api/registrar/actividades-lugar/', filas, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([r['status'] for r in respuesta.json()['data']], ['valido', 'error', 'error'])
+        self.assertEqual(Actividad_Lugar.objects.count(), antes)
+
+
+class GazetteerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        peru = _pais('Perú', 'PE')
+        peru.save()
+        cls.estado = States.objects.create(country=peru, name='Lima', latitude=0, longitude=0)
+        cls.peru = peru
+
+    def setUp(self):
+        refrescar_gazetteer()
+
+    def test_prioridad_exacta_prefijo_subcadena(self):
+        ordenados = sorted([
+            ('san', 1), ('santa ana', 2), ('santiago', 3), ('puerto santo', 4), ('santos', 5), ('santo', 6),
+        ])
+        buscar = gazetteer._buscar_en_ordenados
+        self.assertEqual(buscar(ordenados, 'san'), 1)
+        # Prefijo: gana el nombre más corto aunque haya subcadenas más cortas
+        self.assertEqual(buscar(ordenados, 'sant'), 6)
+        self.assertEqual(buscar(ordenados, 'anti'), 3)
+        self.assertEqual(buscar(ordenados, 'nto'), 6)
+        self.assertIsNone(buscar(ordenados, 'lima'))
+        self.assertIsNone(buscar(ordenados, ''))
+        self.assertIsNone(buscar([], 'san'))
+
+    def test_empates_por_id(self):
+        ordenados = sorted([('sucre', 8), ('sucre', 7), ('abce', 10), ('abcd', 11), ('xbcd', 9)])
+        buscar = gazetteer._buscar_en_ordenados
+        self.assertEqual(buscar(ordenados, 'sucre'), 7)
+        self.assertEqual(buscar(ordenados, 'abc'), 10)
+        self.assertEqual(buscar(ordenados, 'bc'), 9)
+
+    def test_acentos_mayusculas_y_espacios(self):
+        indice = gazetteer.Gazetteer(
+            [(1, 'Perú')], [(5, 'Lima')],
+            [(10, 'Ñuñoa', 1, 5, 0, 0), (11, 'San José', 1, 5, 0, 0)],
+        )
+        for nombre in ('peru', 'PERÚ', '  Perú '):
+            self.assertEqual(indice.buscar_pais(nombre).id, 1, nombre)
+        for nombre, ident in (('nunoa', 10), ('ÑUÑOA', 10), ('san   jose', 11), ('JOSÉ', 11)):
+            self.assertEqual(indice.buscar_ciudad(nombre, 1).id, ident, nombre)
+        self.assertEqual(indice.buscar_ciudad('Ñuñoa', 1).state_name, 'Lima')
+        self.assertIsNone(indice.buscar_ciudad('nunoa', 2))
+
+    def _ciudad(self, nombre):
+        return Cities(country=self.peru, state=self.estado, name=nombre, latitude=0, longitude=0)
+
+    def test_se_reconstruye_tras_guardar_o_borrar(self):
+        self.assertIsNone(obtener_gazetteer().buscar_ciudad('Arequipa', self.peru.id))
+        ciudad = self._ciudad('Arequipa')
+        ciudad.save()
+        self.assertEqual(obtener_gazetteer().buscar_ciudad('arequipa', self.peru.id).id, ciudad.id)
+        ciudad.delete()
+        self.assertIsNone(obtener_gazetteer().buscar_ciudad('arequipa', self.peru.id))
+
+    @override_settings(GEO_GAZETTEER_VERIFICACION=300)
+    def test_verificacion_de_version(self):
+        # bulk_create no emite post_save: solo la verificación periódica lo detecta
+        actual = obtener_gazetteer()
+        Cities.objects.bulk_create([self._ciudad('Tacna')])
+        with self.assertNumQueries(0):
+            self.assertIs(obtener_gazetteer(), actual)
+
+        actual.verificado_en -= 301
+        nuevo = obtener_gazetteer()
+        self.assertIsNot(nuevo, actual)
+        self.assertEqual(nuevo.version, version_actual())
+        self.assertEqual(nuevo.buscar_ciudad('tacna', self.peru.id).name, 'Tacna')
+
+        # Sin cambios solo se renueva la marca de verificación
+        nuevo.verificado_en -= 301
+        self.assertIs(obtener_gazetteer(), nuevo)
+        self.assertLess(time.monotonic() - nuevo.verificado_en, 300)
+
+
+class AutocompletarTests(SimpleTestCase):
+    CIUDADES = (
+        'Arequipa', 'Ayacucho', 'Cusco', 'Chiclayo', 'Lima', 'Limatambo', 'Trujillo', 'Piura', 'Puno',
+        'San Isidro', 'San Borja', 'San Miguel', 'San Luis', 'San Juan',
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.indice = IndiceTrigramas([
+            *((TIPO_CIUDAD, i, nombre, nombre, 1) for i, nombre in enumerate(cls.CIUDADES, 1)),
+            (TIPO_PAIS, 1, 'Perú', 'Perú', 1),
+            (TIPO_PAIS, 1, 'Perú', 'Peru', 1),
+            (TIPO_PAIS, 2, 'Chile', 'Chile', 2),
+        ])
+
+    def _nombres(self, texto, **kwargs):
+        return [r['nombre'] for r in self.indice.buscar(texto, **kwargs)]
+
+    def test_una_letra_de_error(self):
+        for consulta, ciudad in (('Arequpa', 'Arequipa'), ('Cuzco', 'Cusco'), ('Chiclayp', 'Chiclayo')):
+            resultados = self.indice.buscar(consulta)
+            self.assertEqual(resultados[0]['nombre'], ciudad, consulta)
+            self.assertEqual(resultados[0]['distancia'], 1)
+
+    def test_prefijo_antes_que_coincidencia_aproximada(self):
+        # "Lima" es más corta pero está a una edición; "Limatambo" empieza por la consulta
+        self.assertEqual(self._nombres('Limat'), ['Limatambo', 'Lima'])
+        # Los dos alias de Perú cuentan como un solo resultado
+        self.assertEqual(self._nombres('Peru')[0], 'Perú')
+        self.assertEqual(self._nombres('Peru').count('Perú'), 1)
+
+    def test_limite(self):
+        todos = self._nombres('San')
+        self.assertEqual(len(todos), 5)
+        self.assertEqual(self._nombres('San', limite=3), todos[:3])
+        self.assertEqual(self._nombres('San', limite=0), [])
+
+    def test_corte_por_distancia(self):
+        # 5 ediciones sobre 8 letras pasan el mínimo; 6 sobre 9 no
+        self.assertIn('Chiclayo', self._nombres('chixxxxx'))
+        self.assertEqual(self._nombres('chixxxxxx'), [])
+        self.assertEqual(self._nombres('xyz'), [])
+        self.assertEqual(self._nombres(''), [])
+        for resultado in self.indice.buscar('Chiclaxxxxx'):
+            self.assertGreaterEqual(resultado['puntaje'], PUNTAJE_MINIMO)
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class IndiceEspacialTests(SimpleTestCase):
+    # Se compara contra la distancia calculada a fuerza bruta sobre todos los puntos
+    PUNTOS = [
+        (-12.05, -77.04), (-13.52, -71.97), (-16.41, -71.54),     # Lima, Cusco, Arequipa
+        (-17.7, 179.9), (-17.8, -179.95), (-18.1, 178.4),        # a ambos lados de ±180°
+        (89.9, 0.0), (89.8, 120.0), (89.7, -100.0), (-89.9, 45.0),  # cerca de los polos
+    ]
+    # (lat, lon, km)
+    CONSULTAS = [
+        (-12.0, -77.0, 800), (-17.75, 179.99, 300), (-17.75, -179.99, 300), (89.95, -170.0, 500),
+        (-89.5, -90.0, 200), (0.0, 0.0, 2500),
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        azar = random.Random(7)
+        cls.puntos = cls.PUNTOS + [(azar.uniform(-90, 90), azar.uniform(-180, 180)) for _ in range(300)]
+        cls.indice = IndiceEspacial(
+            range(1, len(cls.puntos) + 1), [p[0] for p in cls.puntos], [p[1] for p in cls.puntos]
+        )
+
+    def _fuerza_bruta(self, lat, lon):
+        return sorted(
+            (_haversine(lat, lon, plat, plon), ident) for ident, (plat, plon) in enumerate(self.puntos, 1)
+        )
+
+    def _comparar(self, obtenidos, esperados):
+        self.assertEqual([ident for ident, _ in obtenidos], [ident for _, ident in esperados])
+        for (_, obtenida), (esperada, _) in zip(obtenidos, esperados):
+            self.assertAlmostEqual(obtenida, esperada, places=6)
+
+    def test_en_radio(self):
+        for lat, lon, km in self.CONSULTAS:
+            esperados = [(d, i) for d, i in self._fuerza_bruta(lat, lon) if d <= km]
+            self._comparar(self.indice.en_radio(lat, lon, km), esperados)
+        # Cruzando ±180° aparecen los dos lados
+        ids = [ident for ident, _ in self.indice.en_radio(-17.75, 179.99, 300)]
+        self.assertTrue({4, 5, 6} <= set(ids))
+        ids = [ident for ident, _ in self.indice.en_radio(89.95, -170.0, 50)]
+        self.assertTrue({7, 8, 9} <= set(ids))
+
+    def test_mas_cercanas(self):
+        for lat, lon, _ in self.CONSULTAS:
+            for k in (1, 5):
+                self._comparar(self.indice.mas_cercanas(lat, lon, k), self._fuerza_bruta(lat, lon)[:k])
+
+    def test_k_mayor_que_la_cantidad_de_ciudades(self):
+        indice = IndiceEspacial([1, 2, 3], [-12.05, -13.52, 89.9], [-77.04, -71.97, 0.0])
+        self.assertEqual([ident for ident, _ in indice.mas_cercanas(-12, -77, k=10)], [1, 2, 3])
+
+    def test_indice_vacio(self):
+        indice = IndiceEspacial([], [], [])
+        self.assertEqual(len(indice), 0)
+        self.assertEqual(indice.en_radio(0, 0, 1000), [])
+        self.assertEqual(indice.mas_cercanas(0, 0, k=3), [])
+
+
+class GeoInstantaneaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        peru = _pais('Perú', 'PE')
+        peru.save()
+        estado = States.objects.create(country=peru, name='Lima', latitude=0, longitude=0)
+        Cities.objects.bulk_create([
+            Cities(country=peru, state=estado, name=nombre, latitude=latitud, longitude=longitud)
+            for nombre, latitud, longitud in (('Lima', -12.0464, -77.0428), ('Ñuñoa', -33.4569, -70.5979))
+        ])
+        cls.peru = peru
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'geo.bin')
+
+    def test_ida_y_vuelta(self):
+        geo_instantanea.exportar(self.ruta)
+        instantanea = geo_instantanea.cargar(self.ruta)
+        self.assertEqual(instantanea.version, version_actual())
+        esperadas = list(Cities.objects.order_by('id').values_list('id', 'latitude', 'longitude'))
+        columnas = instantanea.columnas
+        self.assertEqual(
+            list(zip(columnas['ciudades_id'].tolist(), columnas['ciudades_latitud'].tolist(),
+                     columnas['ciudades_longitud'].tolist())),
+            esperadas,
+        )
+        self.assertEqual([fila[1] for fila in instantanea.ciudades()], ['Lima', 'Ñuñoa'])
+
+        # El gazetteer arranca desde el archivo: solo las 3 consultas de la versión
+        with self.assertNumQueries(3):
+            indice = self._construir()
+        self.assertIsNotNone(indice.instantanea)
+        self.assertEqual(indice.buscar_ciudad('nunoa', self.peru.id).latitude, -33.4569)
+
+    def _construir(self):
+        with override_settings(GEO_INSTANTANEA=self.ruta):
+            return gazetteer._construir()
+
+    def test_magia_o_version_distinta_lee_la_bd(self):
+        geo_instantanea.exportar(self.ruta)
+        with open(self.ruta, 'r+b') as archivo:
+            archivo.write(b'GEOSNAP0')
+        with self.assertRaises(geo_instantanea.InstantaneaInvalida):
+            geo_instantanea.cargar(self.ruta)
+        self.assertIsNone(self._construir().instantanea)
+
+        # Instantánea válida pero anterior a un cambio en Cities
+        geo_instantanea.exportar(self.ruta)
+        nueva = Cities.objects.create(
+            country=self.peru, state=States.objects.get(), name='Tacna', latitude=-18, longitude=-70.25
+        )
+        indice = self._construir()
+        self.assertIsNone(indice.instantanea)
+        self.assertEqual(indice.buscar_ciudad('Tacna', self.peru.id).id, nueva.id)
+
+
+class NombreNormalizadoTests(TestCase):
+    def test_se_mantiene_al_guardar_y_en_bloque(self):
+        pais = _pais('Perú', 'PE')
+        pais.save()
+        self.assertEqual(pais.name_normalized, 'peru')
+        estado = States.objects.create(country=pais, name='San Martín', latitude=0, longitude=0)
+        self.assertEqual(estado.name_normalized, 'san martin')
+
+        Cities.objects.bulk_create([
+            Cities(country=pais, state=estado, name=nombre, latitude=0, longitude=0)
+            for nombre in ('Bogotá', '  Ñuñoa  ')
+        ])
+        self.assertEqual(
+            sorted(Cities.objects.values_list('name_normalized', flat=True)), ['bogota', 'nunoa']
+        )
+
+        ciudad = Cities.objects.get(name_normalized='bogota')
+        ciudad.name = 'Cúcuta'
+        ciudad.save(update_fields=['name'])
+        Cities.objects.filter(name_normalized='nunoa').update(name='Medellín')
+        self.assertEqual(
+            sorted(Cities.objects.values_list('name_normalized', flat=True)), ['cucuta', 'medellin']
+        )
+
+        ciudades = list(Cities.objects.order_by('id'))
+        for ciudad, nombre in zip(ciudades, ('Québec', 'Zürich')):
+            ciudad.name = nombre
+        Cities.objects.bulk_update(ciudades, ['name'])
+        self.assertEqual(
+            list(Cities.objects.order_by('id').values_list('name_normalized', flat=True)), ['quebec', 'zurich']
+        )
+
+
+class AliasPaisesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        alemania = _pais('Germany', 'DE')
+        alemania.iso3, alemania.native = 'DEU', 'Deutschland'
+        alemania.translations = {'es': 'Alemania', 'fr': 'Allemagne', 'pt-BR': 'Alemanha'}
+        peru = _pais('Peru', 'PE')
+        peru.native, peru.translations = 'Perú', {'es': 'Perú', 'de': 'Peru'}
+        Countries.objects.bulk_create([alemania, peru])
+
+    def setUp(self):
+        refrescar_gazetteer()
+
+    def test_alias_de_paises(self):
+        alemania, peru = Countries.objects.order_by('id')
+        with self.assertNumQueries(0):
+            for nombre in ('Alemania', 'allemagne', 'DEU', 'de', 'Deutschland', 'germany', 'Germ'):
+                self.assertEqual(buscar_pais(nombre).id, alemania.id, nombre)
+            for nombre in ('Perú', 'PER', 'pe'):
+                self.assertEqual(buscar_pais(nombre).id, peru.id, nombre)
+            self.assertIsNone(buscar_pais('Narnia'))
+            self.assertEqual(buscar_pais('Deutschland', exacto=True).id, alemania.id)
+            self.assertIsNone(buscar_pais('Germ', exacto=True))
+
+
+class GenerarViajeTests(TestCase):
+    # DeepSeek simulado: solo se prueba la validación y el guardado
+
+    @classmethod
+    def setUpTestData(cls):
+        Countries.objects.bulk_create([_pais('Peru', 'PE')])
+        peru = Countries.objects.get()
+        estado = States.objects.create(country=peru, name='Cusco', latitude=0, longitude=0)
+        Cities.objects.create(country=peru, state=estado, name='Cusco', latitude=-13.5, longitude=-72)
+        terrestre = Tipo_Transporte.objects.create(nombre='Terrestre')
+        Transporte.objects.create(tipo_transporte=terrestre, nombre='Bus')
+        Tipo_Lugar.objects.create(nombre='Museo')
+
+    def setUp(self):
+        refrescar_gazetteer()
+
+    def _generar(self, plan=None, **cambios):
+        datos = {
+            'ciudad': 'Cusco', 'pais': 'Peru', 'dia_salida': '2026-05-01', 'duracion_viaje': 2,
+            'presupuesto': '800', **cambios,
+        }
+        respuesta = json.dumps(plan) if plan is not None else None
+        with mock.patch('chatbot.generador_viajes.deepseek_cache') as cache:
+            cache.obtener_respuesta.return_value = respuesta
+            return self.client.post('/api/viajes/generar/', datos, content_type='application/json')
+
+    @staticmethod
+    def _dia(numero, costo=100):
+        return {
+            'dia': numero, 'ciudad': 'Cusco', 'lugar': 'Centro', 'costo': costo, 'transporte': 'Bus',
+            'actividades': [{'turno': 'mañana', 'lugares': [
+                {'nombre': 'Qorikancha', 'descripcion': '', 'ubicacion': 'Cusco', 'tipo': 'Museo'},
+            ]}],
+        }
+
+    def test_genera_y_guarda_el_viaje(self):
+        respuesta = self._generar({'dias': [self._dia(2), self._dia(1)]})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Viaje.objects.count(), 1)
+        self.assertEqual(list(Itinerario.objects.order_by('dia').values_list('dia', flat=True)), [1, 2])
+
+    def test_lugares_nuevos_sin_returning_ignoran_filas_ajenas(self):
+        # Otra petición crea el mismo lugar entre el MAX(id) y el INSERT (MySQL)
+        bulk_create = Lugar.objects.bulk_create
+        ajenas = []
+
+        def insertar_ajena_antes(objetos, **kwargs):
+            if not ajenas:
+                ajenas.append(Lugar.objects.create(
+                    nombre='Qorikancha', ubicacion='Cusco', descripcion='', tipo_lugar=Tipo_Lugar.objects.get(),
+                ))
+            return bulk_create(objetos, **kwargs)
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(Lugar.objects, 'bulk_create', insertar_ajena_antes):
+            respuesta = self._generar({'dias': [self._dia(1), self._dia(2)]})
+        self.assertEqual(respuesta.status_code, 201)
+        enlazados = set(Actividad_Lugar.objects.values_list('lugar_id', flat=True))
+        self.assertEqual(len(enlazados), 1)
+        self.assertNotIn(ajenas[0].id, enlazados)
+
+    def test_dias_sin_pronostico_no_muestran_clima(self):
+        self.assertEqual(self._generar({'dias': [self._dia(1), self._dia(2)]}).status_code, 201)
+        self.assertEqual(set(Clima.objects.values_list('estado_clima', flat=True)), {clima_cache.ESTADO_SIN_PRONOSTICO})
+        respuesta = self.client.get('/api/itinerario/', {'campos': 'dia,clima'})
+        self.assertEqual([(i['dia'], i['clima']) for i in respuesta.json()['data']], [(1, None), (2, None)])
+
+        # El upsert de clima_cache escribe el pronóstico sobre la fila del marcador
+        clima = Clima.objects.earliest('fecha')
+        Clima.objects.filter(pk=clima.pk).update(estado_clima='Clear', temperatura_maxima=20)
+        data = self.client.get('/api/itinerario/', {'campos': 'dia,clima'}).json()['data']
+        self.assertEqual(data[0]['clima']['estado_clima'], 'Clear')
+        self.assertIsNone(data[1]['clima'])
+
+    def test_solicitud_invalida(self):
+        for cambios in ({'ciudad': ''}, {'presupuesto': 'NaN'}, {'presupuesto': 'Infinity'},
+                        {'presupuesto': '1e20'}, {'presupuesto': '-1'}, {'duracion_viaje': 'abc'}):
+            respuesta = self._generar(**cambios)
+            self.assertEqual(respuesta.status_code, 400, cambios)
+            self.assertEqual(respuesta.json()['status'], 'error')
+        respuesta = self.client.post('/api/viajes/generar/', ['Cusco'], content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Viaje.objects.exists())
+
+    def test_plan_invalido(self):
+        for plan in ({'dias': [self._dia(1)]}, {'dias': [self._dia(1), self._dia(2, 'NaN')]},
+                     {'dias': [self._dia(1), self._dia(2, 1e20)]}, {'dias': 'hola'}, []):
+            respuesta = self._generar(plan)
+            self.assertEqual(respuesta.status_code, 502, plan)
+            self.assertEqual(respuesta.json()['status'], 'error')
+        self.assertFalse(Viaje.objects.exists())
+
+    def test_deepseek_sin_respuesta(self):
+        self.assertEqual(self._generar().status_code, 502)
+
+
+def _respuesta(estado, **cabeceras):
+    respuesta = requests.Response()
+    respuesta.status_code = estado
+    respuesta.headers.update(cabeceras)
+    respuesta.raw = io.BytesIO(b'')
+    return respuesta
+
+
+def _conexion_rechazada():
+    razon = NewConnectionError(None, 'Connection refused')
+    return requests.exceptions.ConnectionError(MaxRetryError(None, 'https://api.test', razon))
+
+
+@override_settings(UPSTREAM_REINTENTOS=2, UPSTREAM_CIRCUITO_UMBRAL=3, UPSTREAM_CIRCUITO_ESPERA=30,
+                   UPSTREAM_BACKOFF_BASE=0.25, UPSTREAM_BACKOFF_MAXIMO=8.0)
+class UpstreamTests(SimpleTestCase):
+    def _proveedor(self, *resultados):
+        proveedor = upstream.Proveedor('prueba')
+        proveedor._local.sesion = mock.Mock()
+        proveedor._local.sesion.request.side_effect = resultados
+        return proveedor
+
+    def _llamar(self, proveedor, metodo='GET'):
+        with mock.patch('chatbot.upstream.time.sleep') as dormir:
+            try:
+                return proveedor.request(metodo, 'https://api.test'), dormir
+            except requests.exceptions.RequestException as e:
+                return e, dormir
+
+    def test_get_reintenta_5xx_y_timeouts(self):
+        proveedor = self._proveedor(_respuesta(503), requests.exceptions.ReadTimeout(), _respuesta(200))
+        respuesta, dormir = self._llamar(proveedor)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(proveedor.sesion.request.call_count, 3)
+        self.assertEqual(dormir.call_count, 2)
+        self.assertEqual(proveedor.metricas.reintentos, 2)
+        self.assertEqual(proveedor.metricas.errores, 2)
+
+    def test_post_no_se_repite_si_llego_al_servidor(self):
+        for resultado in (requests.exceptions.ReadTimeout(), _respuesta(500)):
+            proveedor = self._proveedor(resultado, _respuesta(200))
+            respuesta, dormir = self._llamar(proveedor, 'POST')
+            self.assertEqual(proveedor.sesion.request.call_count, 1, resultado)
+            self.assertFalse(dormir.called)
+            self.assertEqual(proveedor.metricas.reintentos, 0)
+
+    def test_post_reintenta_sin_conexion_y_429(self):
+        for resultado in (_conexion_rechazada(), requests.exceptions.ConnectTimeout(), _respuesta(429)):
+            proveedor = self._proveedor(resultado, _respuesta(200))
+            respuesta, _ = self._llamar(proveedor, 'POST')
+            self.assertEqual(respuesta.status_code, 200, resultado)
+            self.assertEqual(proveedor.sesion.request.call_count, 2)
+
+    def test_backoff(self):
+        proveedor = self._proveedor(_respuesta(503), _respuesta(503), _respuesta(503))
+        with mock.patch('chatbot.upstream.random.uniform', side_effect=lambda a, b: b):
+            respuesta, dormir = self._llamar(proveedor)
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual([c.args[0] for c in dormir.call_args_list], [0.5, 1.0])
+        # Retry-After manda, con el máximo configurado
+        proveedor = self._proveedor(_respuesta(429, **{'Retry-After': '60'}), _respuesta(200))
+        _, dormir = self._llamar(proveedor)
+        dormir.assert_called_once_with(8.0)
+
+    def test_circuito_se_abre_y_se_cierra(self):
+        proveedor = self._proveedor(*[_respuesta(503)] * 3, _respuesta(200))
+        with override_settings(UPSTREAM_REINTENTOS=0):
+            for _ in range(3):
+                self._llamar(proveedor)
+            self.assertEqual(proveedor.circuito.estado, 'abierto')
+            error, _ = self._llamar(proveedor)
+            self.assertIsInstance(error, upstream.ProveedorNoDisponible)
+            self.assertEqual(proveedor.metricas.rechazadas, 1)
+            self.assertEqual(proveedor.sesion.request.call_count, 3)
+
+            # Pasada la espera deja pasar una petición de prueba; si responde bien, se cierra
+            proveedor.circuito.abierto_hasta = 0
+            self.assertEqual(proveedor.circuito.estado, 'semiabierto')
+            respuesta, _ = self._llamar(proveedor)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(proveedor.circuito.estado, 'cerrado')
+
+    def test_cliente_async_se_cierra_con_su_loop(self):
+        proveedor = upstream.Proveedor('prueba')
+
+        async def obtener():
+            cliente = await proveedor.cliente_async()
+            self.assertIs(await proveedor.cliente_async(), cliente)
+            self.assertFalse(cliente.is_closed)
+            return cliente
+
+        # Un loop por llamada, como async_to_sync bajo un servidor WSGI
+        clientes = [asyncio.run(obtener()), async_to_sync(obtener)()]
+        self.assertIsNot(clientes[0], clientes[1])
+        self.assertTrue(all(cliente.is_closed for cliente in clientes))
+
+    async def test_request_async(self):
+        llamadas = []
+
+        def responder(peticion):
+            llamadas.append(peticion.method)
+            if len(llamadas) == 1:
+                raise httpx.ConnectError('Connection refused', request=peticion)
+            return httpx.Response(503 if len(llamadas) == 2 else 200)
+
+        proveedor = upstream.Proveedor('prueba')
+        cliente = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+        proveedor._clientes_async[asyncio.get_running_loop()] = cliente
+        with mock.patch('chatbot.upstream.asyncio.sleep') as dormir:
+            # POST: reintenta el fallo de conexión pero no el 503
+            respuesta = await proveedor.request_async('POST', 'https://api.test')
+            self.assertEqual((respuesta.status_code, len(llamadas)), (503, 2))
+            llamadas.clear()
+            respuesta = await proveedor.request_async('GET', 'https://api.test')
+            self.assertEqual((respuesta.status_code, len(llamadas)), (200, 3))
+        self.assertEqual(dormir.call_count, 3)
+        self.assertEqual(proveedor.metricas.reintentos, 3)
+        await cliente.aclose()
+
+
+def _lineas_sse(*textos, fin=True):
+    lineas = [f"data: {json.dumps({'choices': [{'delta': {'content': t}}]}, ensure_ascii=False)}" for t in textos]
+    return '\n\n'.join(lineas + (['data: [DONE]'] if fin else [])).encode('utf-8')
+
+
+@mock.patch('chatbot.deepseek_sse.deepseek_cache')
+class DeepSeekSSETests(SimpleTestCase):
+    def _eventos(self, cuerpo, estado=200):
+        respuesta = requests.Response()
+        respuesta.status_code = estado
+        respuesta.headers['Content-Type'] = 'text/event-stream'
+        respuesta.raw = io.BytesIO(cuerpo)
+        with mock.patch('chatbot.deepseek.upstream.post', return_value=respuesta):
+            return [e.decode('utf-8') for e in deepseek_sse.eventos('hola')]
+
+    async def _eventos_async(self, cuerpo, estado=200):
+        with mock.patch('chatbot.deepseek.upstream.post_async', return_value=httpx.Response(estado, content=cuerpo)):
+            return [e.decode('utf-8') async for e in deepseek_sse.eventos_async('hola')]
+
+    def test_fragmentos_y_fin(self, cache):
+        cache.respuesta_guardada.return_value = None
+        eventos = self._eventos(b': keep-alive\n\n' + _lineas_sse('Hola', ', mañana'))
+        self.assertEqual(eventos, [
+            'data: {"contenido": "Hola"}\n\n',
+            'data: {"contenido": ", mañana"}\n\n',
+            'event: fin\ndata: {"status": "success"}\n\n',
+        ])
+        cache.guardar_respuesta.assert_called_once_with('hola', 'Hola, mañana')
+
+    def test_evento_invalido_emite_error(self, cache):
+        cache.respuesta_guardada.return_value = None
+        for invalido in (b'data: {no es json', b'data: "texto"', b'data: {"choices": ["x"]}'):
+            eventos = self._eventos(_lineas_sse('Hola', fin=False) + b'\n\n' + invalido)
+            self.assertEqual(eventos[0], 'data: {"contenido": "Hola"}\n\n')
+            self.assertTrue(eventos[-1].startswith('event: error\n'), invalido)
+        self.assertTrue(self._eventos(b'', estado=500)[-1].startswith('event: error\n'))
+        cache.guardar_respuesta.assert_not_called()
+
+    def test_stream_sin_done_emite_error(self, cache):
+        # La conexión se corta sin "[DONE]": no se da por completa ni se guarda
+        cache.respuesta_guardada.return_value = None
+        eventos = self._eventos(_lineas_sse('Hola', fin=False))
+        self.assertEqual(eventos[0], 'data: {"contenido": "Hola"}\n\n')
+        self.assertTrue(eventos[-1].startswith('event: error\n'))
+        self.assertFalse(any(e.startswith('event: fin\n') for e in eventos))
+        cache.guardar_respuesta.assert_not_called()
+
+    async def test_eventos_async(self, cache):
+        cache.respuesta_guardada.return_value = None
+        eventos = await self._eventos_async(_lineas_sse('Hola'))
+        self.assertEqual(eventos[0], 'data: {"contenido": "Hola"}\n\n')
+        self.assertTrue(eventos[-1].startswith('event: fin\n'))
+        eventos = await self._eventos_async(b'data: {no es json')
+        self.assertEqual(len(eventos), 1)
+        self.assertTrue(eventos[0].startswith('event: error\n'))
+        eventos = await self._eventos_async(_lineas_sse('Hola', fin=False))
+        self.assertEqual(eventos[0], 'data: {"contenido": "Hola"}\n\n')
+        self.assertTrue(eventos[-1].startswith('event: error\n'))
+        # Solo se guardó la primera respuesta, la completa
+        cache.guardar_respuesta.assert_called_once_with('hola', 'Hola')
+
+
+def _pronostico_api(estado='Clear', dias=3):
+    return [{
+        'fecha': (date.today() + timedelta(days=d)).isoformat(),
+        'temperatura': {'maxima': 25, 'minima': 15},
+        'estado': estado, 'humedad': 60, 'probabilidad_lluvia': 0.1,
+    } for d in range(dias)]
+
+
+def _esperar(condicion, limite=5):
+    inicio = time.monotonic()
+    while not condicion():
+        if time.monotonic() - inicio > limite:
+            raise AssertionError('La condición no se cumplió a tiempo')
+        time.sleep(0.01)
+
+
+@mock.patch('chatbot.clima_cache.openweather')
+class ClimaCacheTests(TestCase):
+    # OpenWeather simulado. Las actualizaciones en otro hilo no escriben en
+    # la base de pruebas (está dentro de la transacción del test): se
+    # simula _guardar en esos casos.
+
+    @classmethod
+    def setUpTestData(cls):
+        peru = _pais('Peru', 'PE')
+        peru.save()
+        estado = States.objects.create(country=peru, name='Lima', latitude=0, longitude=0)
+        Cities.objects.bulk_create([
+            Cities(country=peru, state=estado, name=nombre, latitude=latitud, longitude=-77)
+            for nombre, latitud in (('Lima', -12), ('Ica', -14), ('Tacna', -18))
+        ])
+
+    def setUp(self):
+        refrescar_gazetteer()
+        obtener_indice_espacial()
+        clima_cache._memoria.clear()
+        self.lima, self.ica, self.tacna = sorted(obtener_gazetteer().ciudades.values())
+
+    def _obsoleta(self, ciudad):
+        # En memoria, ya no fresca pero utilizable
+        entrada = {'datos': _pronostico_api('Viejo'), 'obtenido_en': time.time() - clima_cache._ttl_fresco() - 1}
+        clima_cache._memoria.set(ciudad.id, entrada)
+        return entrada
+
+    def test_guardar_actualiza_sin_duplicar(self, openweather):
+        # Upsert real contra la base: el segundo pronóstico de 5 días pisa al primero
+        clima_cache._guardar(self.lima, _pronostico_api('Clear', dias=5))
+        antes = dict(Clima.objects.filter(ciudad_id=self.lima.id).values_list('fecha', 'id'))
+        pronostico = _pronostico_api('Rain', dias=5)
+        for dia in pronostico:
+            dia['temperatura'] = {'maxima': 30, 'minima': 18}
+            dia['humedad'] = 90
+        clima_cache._guardar(self.lima, pronostico)
+
+        filas = Clima.objects.filter(ciudad_id=self.lima.id)
+        self.assertEqual(filas.count(), 5)
+        self.assertEqual(dict(filas.values_list('fecha', 'id')), antes)
+        self.assertEqual(
+            set(filas.values_list('estado_clima', 'temperatura_maxima', 'temperatura_minima', 'humedad')),
+            {('Rain', 30, 18, 90)},
+        )
+
+    def test_niveles_memoria_bd_api(self, openweather):
+        openweather.obtener_clima.return_value = _pronostico_api()
+        self.assertEqual(clima_cache.obtener_pronostico(self.lima, dias=2)[0]['estado'], 'Clear')
+        self.assertEqual(openweather.obtener_clima.call_count, 1)
+        self.assertEqual(Clima.objects.filter(ciudad_id=self.lima.id).count(), 3)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(clima_cache.obtener_pronostico(self.lima, dias=2)), 2)
+        clima_cache.invalidar(self.lima.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(clima_cache.obtener_pronostico(self.lima)), 3)
+        self.assertEqual(openweather.obtener_clima.call_count, 1)
+
+    @mock.patch('chatbot.clima_cache._guardar')
+    def test_obsoleto_se_sirve_y_se_actualiza(self, guardar, openweather):
+        openweather.obtener_clima.return_value = _pronostico_api()
+        self._obsoleta(self.lima)
+        self.assertEqual(clima_cache.obtener_pronostico(self.lima)[0]['estado'], 'Viejo')
+        _esperar(lambda: clima_cache._memoria.get(self.lima.id)['datos'][0]['estado'] == 'Clear')
+        guardar.assert_called_once()
+
+    @mock.patch('chatbot.clima_cache._guardar')
+    def test_fallo_al_actualizar_espera_antes_de_reintentar(self, guardar, openweather):
+        openweather.obtener_clima.return_value = None
+        entrada = self._obsoleta(self.lima)
+        clima_cache.obtener_pronostico(self.lima)
+        _esperar(lambda: 'fallo_en' in entrada)
+        for _ in range(5):
+            self.assertEqual(clima_cache.obtener_pronostico(self.lima)[0]['estado'], 'Viejo')
+        self.assertEqual(openweather.obtener_clima.call_count, 1)
+
+        with override_settings(CLIMA_ESPERA_TRAS_FALLO=0):
+            clima_cache.obtener_pronostico(self.lima)
+            _esperar(lambda: openweather.obtener_clima.call_count == 2)
+
+    @mock.patch('chatbot.clima_cache._guardar')
+    @mock.patch('chatbot.clima_cache._desde_bd', return_value=None)
+    def test_llamadas_concurrentes_comparten_una_sola(self, desde_bd, guardar, openweather):
+        liberar = threading.Event()
+
+        def obtener_clima(latitud, longitud):
+            liberar.wait(5)
+            return _pronostico_api()
+
+        openweather.obtener_clima.side_effect = obtener_clima
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(clima_cache.obtener_pronostico(self.lima)))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        _esperar(lambda: clima_cache._vuelos.en_curso(('api', self.lima.id)))
+        time.sleep(0.05)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertEqual(len(resultados), 5)
+        self.assertEqual(openweather.obtener_clima.call_count, 1)
+
+    @mock.patch('chatbot.clima_cache._guardar')
+    def test_por_lotes(self, guardar, openweather):
+        openweather.obtener_clima.return_value = _pronostico_api()
+        clima_cache._memoria.set(self.lima.id, {'datos': _pronostico_api('Memoria'), 'obtenido_en': time.time()})
+        Clima.objects.bulk_create([
+            Clima(fecha=date.today() + timedelta(days=d), ciudad_id=self.ica.id, pais_id=self.ica.country_id,
+                  temperatura_maxima=20, temperatura_minima=10, estado_clima='Tabla', humedad=50,
+                  probabilidad_lluvia=0)
+            for d in range(3)
+        ])
+        pronosticos = clima_cache.obtener_pronosticos([self.lima, self.ica, self.tacna], dias=2)
+        self.assertEqual(
+            {ident: dias[0]['estado'] for ident, dias in pronosticos.items()},
+            {self.lima.id: 'Memoria', self.ica.id: 'Tabla', self.tacna.id: 'Clear'},
+        )
+        openweather.obtener_clima.assert_called_once_with(self.tacna.latitude, self.tacna.longitude)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_segundo_plano_usa_el_pool_compartido(self):
+        vuelos = cache_local.SingleFlight()
+        liberar = threading.Event()
+        hilos = []
+
+        def tarea():
+            hilos.append(threading.current_thread().name)
+            liberar.wait(5)
+
+        # Con todos los hilos del pool ocupados la siguiente clave queda en
+        # cola, y mientras tanto no se encola otra vez
+        maximo = cache_local._ejecutor._max_workers
+        for clave in range(maximo + 1):
+            self.assertTrue(vuelos.en_segundo_plano(clave, tarea))
+        self.assertFalse(vuelos.en_segundo_plano(maximo, tarea))
+        _esperar(lambda: len(hilos) == maximo)
+        liberar.set()
+        _esperar(lambda: not any(vuelos.en_curso(clave) for clave in range(maximo + 1)))
+        self.assertEqual(len(hilos), maximo + 1)
+        self.assertTrue(all(nombre.startswith('segundo-plano') for nombre in hilos))
+        self.assertLessEqual(len(set(hilos)), maximo)
+
+
+@mock.patch('chatbot.deepseek_cache.deepseek')
+@override_settings(DEEPSEEK_MODELO='deepseek-chat', DEEPSEEK_TEMPERATURA=0.7, DEEPSEEK_CACHE_TTL=3600)
+class DeepSeekCacheTests(SimpleTestCase):
+    def setUp(self):
+        deepseek_cache._respuestas.clear()
+
+    def test_clave(self, deepseek):
+        clave = deepseek_cache.clave_prompt('Un viaje a  Cusco\n')
+        self.assertEqual(clave, deepseek_cache.clave_prompt(' Un viaje a Cusco'))
+        self.assertNotEqual(clave, deepseek_cache.clave_prompt('Un viaje a Cusco', formato_json=True))
+        self.assertNotEqual(clave, deepseek_cache.clave_prompt('Un viaje a Lima'))
+        with override_settings(DEEPSEEK_TEMPERATURA=0.2):
+            self.assertNotEqual(clave, deepseek_cache.clave_prompt('Un viaje a Cusco'))
+        with override_settings(DEEPSEEK_MODELO='deepseek-reasoner'):
+            self.assertNotEqual(clave, deepseek_cache.clave_prompt('Un viaje a Cusco'))
+
+    def test_acierto_y_fallo(self, deepseek):
+        deepseek.enviar_prompt.side_effect = [None, 'Respuesta', '{"dias": []}']
+        # Los errores no se guardan: el siguiente intento vuelve a llamar
+        self.assertIsNone(deepseek_cache.obtener_respuesta('hola'))
+        self.assertEqual(deepseek_cache.obtener_respuesta('hola'), 'Respuesta')
+        self.assertEqual(deepseek_cache.obtener_respuesta(' hola '), 'Respuesta')
+        self.assertEqual(deepseek_cache.respuesta_guardada('hola'), 'Respuesta')
+        self.assertEqual(deepseek.enviar_prompt.call_count, 2)
+
+        self.assertEqual(deepseek_cache.obtener_respuesta('hola', formato_json=True), '{"dias": []}')
+        deepseek.enviar_prompt.assert_called_with('hola', formato_json=True)
+        deepseek_cache.invalidar('hola', formato_json=True)
+        self.assertEqual(deepseek_cache.obtener_respuesta('hola'), 'Respuesta')
+        self.assertEqual(deepseek.enviar_prompt.call_count, 3)
+
+    def test_prompts_concurrentes_comparten_una_llamada(self, deepseek):
+        liberar = threading.Event()
+
+        def enviar_prompt(prompt, formato_json=False):
+            liberar.wait(5)
+            return 'Respuesta'
+
+        deepseek.enviar_prompt.side_effect = enviar_prompt
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(deepseek_cache.obtener_respuesta('hola')))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        _esperar(lambda: deepseek_cache._vuelos.en_curso(deepseek_cache.clave_prompt('hola')))
+        time.sleep(0.05)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertEqual(resultados, ['Respuesta'] * 5)
+        self.assertEqual(deepseek.enviar_prompt.call_count, 1)
+
+    async def test_prompts_concurrentes_async(self, deepseek):
+        async def enviar_prompt_async(prompt):
+            await asyncio.sleep(0.01)
+            return 'Respuesta'
+
+        deepseek.enviar_prompt_async.side_effect = enviar_prompt_async
+        resultados = await asyncio.gather(*[deepseek_cache.obtener_respuesta_async('hola') for _ in range(5)])
+        self.assertEqual(resultados, ['Respuesta'] * 5)
+        self.assertEqual(deepseek.enviar_prompt_async.call_count, 1)
+
+
+@mock.patch('chatbot.fotos_cache.images')
+@override_settings(FOTOS_CACHE_TTL_DIAS=7, FOTOS_CACHE_TTL_VACIO_HORAS=6, FOTOS_CACHE_DESALOJO_INTERVALO=300,
+                   FOTOS_CACHE_MAXIMO_LUGARES=2, FOTOS_CACHE_MAXIMO_CONSULTAS=10)
+class FotosCacheTests(TestCase):
+    # Google Places simulado: resolver_lugar devuelve el place_id "id-<nombre>"
+
+    def setUp(self):
+        fotos_cache._ultimo_desalojo = 0.0
+
+    def _simular(self, images, referencias=('r1', 'r2'), completo=True):
+        images.resolver_lugar.side_effect = lambda nombre, api_key, limite: (
+            'id-' + nombre.split(',')[0].strip().lower(), nombre
+        )
+        images.referencias_de_lugar.return_value = (list(referencias), completo)
+        images.urls_de_fotos.side_effect = lambda refs, api_key: [f'url/{r}' for r in refs]
+
+    def test_fallo_y_aciertos(self, images):
+        self._simular(images)
+        self.assertEqual(fotos_cache.obtener_fotos('Machu Picchu', 'clave'), ['url/r1', 'url/r2'])
+        # Misma consulta normalizada: sin llamar a Google
+        self.assertEqual(fotos_cache.obtener_fotos('  machu picchu ', 'clave', max_fotos=1), ['url/r1'])
+        self.assertEqual(images.resolver_lugar.call_count, 1)
+        # Otra consulta que Google resuelve al mismo lugar: sin pedir las fotos de nuevo
+        self.assertEqual(fotos_cache.obtener_fotos('Machu Picchu, Peru', 'clave'), ['url/r1', 'url/r2'])
+        self.assertEqual(images.referencias_de_lugar.call_count, 1)
+        self.assertEqual(Foto_Consulta.objects.count(), 2)
+        self.assertEqual(Foto_Lugar.objects.count(), 1)
+
+    def test_resultado_parcial_no_se_guarda(self, images):
+        self._simular(images, completo=False)
+        self.assertEqual(fotos_cache.obtener_fotos('Cusco', 'clave'), ['url/r1', 'url/r2'])
+        self.assertFalse(Foto_Lugar.objects.exists())
+
+    def test_sin_fotos_vence_antes(self, images):
+        self._simular(images, referencias=())
+        self.assertEqual(fotos_cache.obtener_fotos('Cusco', 'clave'), [])
+        self._simular(images)
+        fotos_cache.obtener_fotos('Lima', 'clave')
+        vacio, con_fotos = (Foto_Lugar.objects.get(place_id=p).expira_en for p in ('id-cusco', 'id-lima'))
+        self.assertLess(vacio, timezone.now() + timedelta(hours=6, minutes=1))
+        self.assertGreater(con_fotos, timezone.now() + timedelta(days=6))
+
+    def test_desalojo_periodico(self, images):
+        self._simular(images)
+        # El primer guardado desaloja; los siguientes, dentro del intervalo, no consultan el total
+        with CaptureQueriesContext(connection) as primero:
+            fotos_cache.obtener_fotos('Lugar 0', 'clave')
+        with CaptureQueriesContext(connection) as segundo:
+            fotos_cache.obtener_fotos('Lugar 1', 'clave')
+        self.assertLess(len(segundo), len(primero))
+        self.assertFalse(any('COUNT' in q['sql'] for q in segundo))
+        for i in range(2, 5):
+            fotos_cache.obtener_fotos(f'Lugar {i}', 'clave')
+        self.assertEqual(Foto_Lugar.objects.count(), 5)
+
+        with override_settings(FOTOS_CACHE_DESALOJO_INTERVALO=0):
+            fotos_cache.obtener_fotos('Lugar 5', 'clave')
+        self.assertEqual(Foto_Lugar.objects.count(), 2)
+        self.assertIn('id-lugar 5', Foto_Lugar.objects.values_list('place_id', flat=True))
+
+
+class VistasAsyncTests(TestCase):
+    # Mismo sobre {status, message, data} que las vistas DRF, con las APIs simuladas
+
+    @classmethod
+    def setUpTestData(cls):
+        peru = _pais('Peru', 'PE')
+        peru.save()
+        estado = States.objects.create(country=peru, name='Lima', latitude=0, longitude=0)
+        Cities.objects.create(country=peru, state=estado, name='Lima', latitude=-12, longitude=-77)
+
+    def setUp(self):
+        refrescar_gazetteer()
+
+    async def _post(self, ruta, cuerpo):
+        respuesta = await self.async_client.post(ruta, json.dumps(cuerpo), content_type='application/json')
+        return respuesta.status_code, respuesta.json()
+
+    async def test_deepseek(self):
+        with mock.patch('chatbot.views_async.obtener_respuesta_async', side_effect=['Hola', None]) as obtener:
+            self.assertEqual(await self._post('/api/async/deepseek/', {'prompt': 'hola'}), (200, {
+                'status': 'success', 'message': 'Respuesta generada con éxito.', 'data': 'Hola',
+            }))
+            codigo, cuerpo = await self._post('/api/async/deepseek/', {'prompt': 'hola'})
+            self.assertEqual((codigo, cuerpo['status'], cuerpo['data']), (500, 'error', None))
+            for invalido in ({}, ['hola'], 'hola'):
+                codigo, cuerpo = await self._post('/api/async/deepseek/', invalido)
+                self.assertEqual((codigo, cuerpo['status']), (400, 'error'))
+        self.assertEqual(obtener.call_count, 2)
+        respuesta = await self.async_client.get('/api/async/deepseek/')
+        self.assertEqual(respuesta.status_code, 405)
+
+    async def test_imagenes(self):
+        with mock.patch('chatbot.views_async.obtener_fotos_async', side_effect=[['url/1'], [], RuntimeError('x')]):
+            codigo, cuerpo = await self._post('/api/async/images/', {'nombre_lugar': 'Cusco'})
+            self.assertEqual((codigo, cuerpo['status'], cuerpo['data']), (200, 'success', ['url/1']))
+            codigo, cuerpo = await self._post('/api/async/images/', {'nombre_lugar': 'Cusco'})
+            self.assertEqual((codigo, cuerpo['status'], cuerpo['data']), (200, 'error', []))
+            codigo, cuerpo = await self._post('/api/async/images/', {'nombre_lugar': 'Cusco'})
+            self.assertEqual((codigo, cuerpo['status']), (500, 'error'))
+
+    async def test_clima(self):
+        dias = [{'fecha': '2026-01-01', 'estado': 'Clear'}]
+        with mock.patch('chatbot.views_async.obtener_pronostico_async', return_value=dias) as obtener:
+            respuesta = await self.async_client.get('/api/async/clima/', {'ciudad': 'lima', 'pais': 'peru'})
+            self.assertEqual(respuesta.json(), {
+                'status': 'success', 'message': 'Clima para Lima, Peru.', 'data': dias,
+            })
+            self.assertEqual(obtener.call_args.args[0].name, 'Lima')
+            respuesta = await self.async_client.get('/api/async/clima/', {'ciudad': 'lima', 'pais': 'Narnia'})
+            self.assertEqual(respuesta.status_code, 404)
+            respuesta = await self.async_client.get('/api/async/clima/', {'ciudad': 'lima'})
+            self.assertEqual(respuesta.status_code, 400)
+
+
+def _lugar_google(rating, resenas, *referencias):
+    return {'rating': rating, 'user_ratings_total': resenas,
+            'photos': [{'photo_reference': r, 'width': 800 - i} for i, r in enumerate(referencias)]}
+
+
+class FotosPlazoTests(SimpleTestCase):
+    # Google Places simulado; la búsqueda de relacionados tarda más que el plazo
+    DETALLES_MAL_VALORADO = {'result': _lugar_google(3.0, 10, 'propia')}
+    RELACIONADOS = {'results': [_lugar_google(4.8, 500, 'relacionada')]}
+
+    def setUp(self):
+        self.liberar = threading.Event()
+        self.addCleanup(self.liberar.set)
+
+    def _get_json(self, respuestas, lentas=()):
+        def get_json(url, params, limite):
+            if url in lentas:
+                self.liberar.wait(5)
+            return respuestas[url]
+        return get_json
+
+    def test_resultado_parcial_al_vencer_el_plazo(self):
+        respuestas = {images.URL_DETALLES: self.DETALLES_MAL_VALORADO, images.URL_TEXTSEARCH: self.RELACIONADOS}
+        with mock.patch('chatbot.images._get_json', self._get_json(respuestas, lentas={images.URL_TEXTSEARCH})):
+            inicio = time.monotonic()
+            resultado = images.referencias_de_lugar('id', 'Cusco', 'clave', 5, images.calcular_limite(0.2))
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(resultado, (['propia'], False))
+
+    def test_completo_dentro_del_plazo(self):
+        respuestas = {images.URL_DETALLES: self.DETALLES_MAL_VALORADO, images.URL_TEXTSEARCH: self.RELACIONADOS}
+        with mock.patch('chatbot.images._get_json', self._get_json(respuestas)):
+            resultado = images.referencias_de_lugar('id', 'Cusco', 'clave', 5, images.calcular_limite(2))
+        self.assertEqual(resultado, (['relacionada'], True))
+        # Un lugar bien valorado no espera a los relacionados
+        respuestas[images.URL_DETALLES] = {'result': _lugar_google(4.5, 100, 'a', 'b')}
+        with mock.patch('chatbot.images._get_json', self._get_json(respuestas, lentas={images.URL_TEXTSEARCH})):
+            resultado = images.referencias_de_lugar('id', 'Cusco', 'clave', 1, images.calcular_limite(2))
+        self.assertEqual(resultado, (['a'], True))
+
+    @override_settings(FOTOS_MAX_SUGERENCIAS=1)
+    def test_resolver_lugar_con_plazo(self):
+        respuestas = {images.URL_BUSQUEDA: {'candidates': [{'place_id': 'id'}]}}
+        with mock.patch('chatbot.images._get_json', self._get_json(respuestas, lentas={images.URL_BUSQUEDA})):
+            self.assertEqual(images.resolver_lugar('Cusco', 'clave', images.calcular_limite(0.2)), (None, None))
+        with mock.patch('chatbot.images._get_json', self._get_json(respuestas)):
+            self.assertEqual(images.resolver_lugar('Cusco', 'clave', images.calcular_limite(2)), ('id', 'Cusco'))
+
+    async def test_resultado_parcial_async(self):
+        respuestas = {images.URL_DETALLES: self.DETALLES_MAL_VALORADO, images.URL_TEXTSEARCH: self.RELACIONADOS}
+
+        async def get_json_async(url, params, limite):
+            if url == images.URL_TEXTSEARCH:
+                await asyncio.sleep(5)
+            return respuestas[url]
+
+        with mock.patch('chatbot.images._get_json_async', get_json_async):
+            inicio = time.monotonic()
+            resultado = await images.referencias_de_lugar_async('id', 'Cusco', 'clave', 5, images.calcular_limite(0.2))
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(resultado, (['propia'], False))
+
+
+class ArranquePerezosoTests(SimpleTestCase):
+    def test_urls_no_cargan_los_clientes_externos(self):
+        # Proceso nuevo: en este ya se importaron al correr otros tests
+        proceso = subprocess.run(
+            [sys.executable, '-c', SCRIPT_HIJO],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        self.assertEqual(proceso.returncode, 0, proceso.stderr[-2000:])
+        resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+        self.assertIsNone(resultado['error'])
+        self.assertIn(settings.ROOT_URLCONF, resultado['modulos'])
+        self.assertEqual([m for m in MODULOS_PEREZOSOS if m in resultado['modulos']], [])
+
+
+class MedirIndicesTests(TransactionTestCase):
+    # TransactionTestCase: el schema_editor de SQLite no puede usarse dentro
+    # de la transacción de TestCase
+
+    def _indices(self):
+        introspeccion = connection.introspection
+        with connection.cursor() as cursor:
+            return {
+                (modelo._meta.db_table, nombre)
+                for modelo in MODELOS_CON_INDICES
+                for nombre, restriccion in introspeccion.get_constraints(cursor, modelo._meta.db_table).items()
+                if restriccion['index']
+            }
+
+    def _medir_indices(self):
+        call_command(
+            'medir_indices', sembrar=True, comparar=True, paises=2, estados=3, ciudades=30, climas=70,
+            viajes=3, repeticiones=1, stdout=io.StringIO(),
+        )
+
+    def test_comparar_deja_el_esquema_intacto(self):
+        indices = self._indices()
+        self.assertTrue({(m._meta.db_table, i.name) for m in MODELOS_CON_INDICES for i in m._meta.indexes} <= indices)
+        self._medir_indices()
+        self.assertEqual(self._indices(), indices)
+
+        # Falla la medición, o falla quitar el segundo índice
+        editor = type(connection.schema_editor())
+        quitar = editor.remove_index
+        llamadas = []
+
+        def quitar_solo_uno(self, modelo, indice):
+            llamadas.append(indice.name)
+            if len(llamadas) > 1:
+                raise RuntimeError('fallo al quitar')
+            return quitar(self, modelo, indice)
+
+        for parche in (mock.patch('chatbot.management.commands.medir_indices._medir', side_effect=RuntimeError),
+                       mock.patch.object(editor, 'remove_index', quitar_solo_uno)):
+            with parche, self.assertRaises(RuntimeError):
+                self._medir_indices()
+            self.assertEqual(self._indices(), indices)
+        self.assertEqual(len(llamadas), 2)
+
+
+@override_settings(REFERENCIA_ESPEJO=True)
+class ReferenciaTests(TestCase):
+    # Espejo SQLite en un archivo temporal como segunda base ('referencia'),
+    # migrado antes de que TestCase abra sus transacciones. '__all__' y no
+    # {'default', ALIAS}: el runner no debe crear la base de pruebas del alias,
+    # que no existe hasta setUpClass.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls._anterior = settings.DATABASES.pop(ALIAS, None)
+        if cls._anterior is not None:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+        descriptor, cls.ruta = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        # connections.settings es el mismo diccionario que settings.DATABASES
+        settings.DATABASES[ALIAS] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.ruta}
+        connections.configure_settings(settings.DATABASES)
+        with override_settings(REFERENCIA_ESPEJO=True):
+            call_command('migrate', 'chatbot', database=ALIAS, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        del settings.DATABASES[ALIAS]
+        if cls._anterior is not None:
+            settings.DATABASES[ALIAS] = cls._anterior
+        os.remove(cls.ruta)
+
+    @classmethod
+    def setUpTestData(cls):
+        Countries.objects.bulk_create([_pais('Peru', 'PE'), _pais('Chile', 'CL')])
+
+    def test_enrutamiento(self):
+        self.assertEqual(router.db_for_read(Countries), ALIAS)
+        self.assertEqual(router.db_for_read(Tipo_Lugar), ALIAS)
+        self.assertEqual(router.db_for_write(Countries), 'default')
+        self.assertEqual(router.db_for_read(Viaje), 'default')
+        self.assertEqual(router.db_for_write(Viaje), 'default')
+
+        self.assertTrue(router.allow_migrate(ALIAS, 'chatbot', model_name='cities'))
+        self.assertFalse(router.allow_migrate(ALIAS, 'chatbot', model_name='viaje'))
+        self.assertFalse(router.allow_migrate(ALIAS, 'auth', model_name='user'))
+        self.assertTrue(router.allow_migrate('default', 'chatbot', model_name='viaje'))
+        with override_settings(REFERENCIA_ESPEJO=False):
+            # Una réplica recibe el esquema por replicación
+            self.assertFalse(router.allow_migrate(ALIAS, 'chatbot', model_name='cities'))
+        tablas = connections[ALIAS].introspection.table_names()
+        self.assertIn('countries', tablas)
+        self.assertNotIn('viaje', tablas)
+
+    def test_lecturas_del_espejo_y_escrituras_en_default(self):
+        # El espejo está vacío hasta sincronizar: lo que se lee viene de él
+        self.assertFalse(Countries.objects.exists())
+        self.assertEqual(Countries.objects.using('default').count(), 2)
+
+        pais = Countries.objects.using('default').get(iso2='PE')
+        self.assertEqual(pais._state.db, 'default')
+        pais.capital = 'Lima'
+        pais.save()
+        estado = States.objects.create(country=pais, name='Lima', latitude=0, longitude=0)
+        self.assertEqual(estado._state.db, 'default')
+        self.assertFalse(States.objects.exists())
+
+    def test_sincronizar_referencia(self):
+        peru = Countries.objects.using('default').get(iso2='PE')
+        States.objects.create(country=peru, name='Lima', latitude=0, longitude=0)
+        call_command('sincronizar_referencia', stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Countries.objects.values_list('id', 'name', 'updated_at')),
+            sorted(Countries.objects.using('default').values_list('id', 'name', 'updated_at')),
+        )
+        self.assertEqual(States.objects.get().name, 'Lima')
+        # updated_at se copia tal cual: la versión del gazetteer leída del
+        # espejo coincide con la de default
+        with mock.patch('chatbot.routers.configurada', return_value=False):
+            version_default = version_actual()
+        self.assertEqual(version_actual(), version_default)
+
+        salida = io.StringIO()
+        call_command('sincronizar_referencia', stdout=salida)
+        self.assertIn('ya está al día', salida.getvalue())
@@ -0,0 +1,320 @@
+# upstream.py
+# Cliente HTTP compartido para las APIs externas (DeepSeek, OpenWeather,
+# Foursquare y Google Places): sesiones con conexiones keep-alive por
+# proveedor, timeouts, reintentos con backoff y jitter ante 429/5xx,
+# circuit breaker por proveedor y métricas de latencia. Ofrece la misma
+# interfaz en versión asíncrona (httpx) para las vistas ASGI.
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Un POST que llegó al servidor (timeout de lectura, 5xx) pudo procesarse:
+# repetirlo duplicaría el trabajo (y el costo, en DeepSeek). Solo se
+# reintenta si la conexión no llegó a abrirse o si el servidor respondió 429.
+METODOS_IDEMPOTENTES = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class ProveedorNoDisponible(requests.exceptions.ConnectionError):
+    # El circuito del proveedor está abierto; se hereda de ConnectionError
+    # para que el manejo de errores existente de `requests` lo cubra.
+    pass
+
+
+# Errores a capturar en los clientes asíncronos
+ERRORES_ASYNC = (httpx.HTTPError, ProveedorNoDisponible)
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _sin_conexion(error):
+    # La petición no llegó a enviarse: falló la conexión (DNS, rechazo) o su timeout
+    if isinstance(error, (requests.exceptions.ConnectTimeout, httpx.ConnectError,
+                          httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+def _reintentable(metodo, respuesta=None, error=None):
+    if metodo.upper() in METODOS_IDEMPOTENTES:
+        return True
+    if error is not None:
+        return _sin_conexion(error)
+    return respuesta.status_code == 429
+
+
+class CircuitBreaker:
+    def __init__(self, umbral, espera):
+        self.umbral = umbral
+        self.espera = espera
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.fallos < self.umbral:
+            return 'cerrado'
+        return 'abierto' if time.monotonic() < self.abierto_hasta else 'semiabierto'
+
+    def permitir(self):
+        # En estado semiabierto deja pasar una sola petición de prueba
+        with self._lock:
+            if self.fallos < self.umbral:
+                return True
+            ahora = time.monotonic()
+            if ahora < self.abierto_hasta:
+                return False
+            self.abierto_hasta = ahora + self.espera
+            return True
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_hasta = 0.0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.umbral:
+                self.abierto_hasta = time.monotonic() + self.espera
+
+
+class Metricas:
+    def __init__(self):
+        self.peticiones = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.rechazadas = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def registrar(self, duracion_ms, error):
+        with self._lock:
+            self.peticiones += 1
+            self.errores += int(error)
+            self.total_ms += duracion_ms
+            self.max_ms = max(self.max_ms, duracion_ms)
+
+    def como_dict(self):
+        return {
+            'peticiones': self.peticiones,
+            'errores': self.errores,
+            'reintentos': self.reintentos,
+            'rechazadas': self.rechazadas,
+            'latencia_media_ms': round(self.total_ms / self.peticiones, 2) if self.peticiones else None,
+            'latencia_max_ms': round(self.max_ms, 2),
+        }
+
+
+async def _cerrar_con_el_loop(cliente):
+    # Queda suspendido mientras viva el event loop. Al apagarse,
+    # loop.shutdown_asyncgens() (asyncio.run, async_to_sync de asgiref,
+    # uvicorn) cierra los generadores pendientes y con ellos el cliente.
+    try:
+        yield
+    finally:
+        await cliente.aclose()
+
+
+class Proveedor:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.metricas = Metricas()
+        self.circuito = CircuitBreaker(
+            _config('UPSTREAM_CIRCUITO_UMBRAL', 5),
+            _config('UPSTREAM_CIRCUITO_ESPERA', 30),
+        )
+        self._local = threading.local()
+        # Un httpx.AsyncClient por event loop (no se pueden compartir entre
+        # loops) y el generador que lo cierra cuando termina su loop
+        self._clientes_async = weakref.WeakKeyDictionary()
+        self._cierres_async = weakref.WeakKeyDictionary()
+
+    @property
+    def sesion(self):
+        # requests.Session no es segura entre hilos: una por hilo y proveedor,
+        # cada una con su pool de conexiones keep-alive.
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            sesion = requests.Session()
+            adaptador = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=_config('UPSTREAM_POOL_MAXIMO', 10),
+            )
+            sesion.mount('https://', adaptador)
+            sesion.mount('http://', adaptador)
+            self._local.sesion = sesion
+        return sesion
+
+    async def cliente_async(self):
+        loop = asyncio.get_running_loop()
+        cliente = self._clientes_async.get(loop)
+        if cliente is None:
+            cliente = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    _config('UPSTREAM_TIMEOUT_LECTURA', 15),
+                    connect=_config('UPSTREAM_TIMEOUT_CONEXION', 3.05),
+                ),
+                limits=httpx.Limits(
+                    max_connections=_config('UPSTREAM_POOL_MAXIMO_ASYNC', 100),
+                    max_keepalive_connections=_config('UPSTREAM_POOL_MAXIMO', 10),
+                ),
+            )
+            self._clientes_async[loop] = cliente
+            cierre = _cerrar_con_el_loop(cliente)
+            await cierre.__anext__()
+            self._cierres_async[loop] = cierre
+        return cliente
+
+    def _espera_reintento(self, intento, respuesta):
+        retry_after = respuesta.headers.get('Retry-After') if respuesta is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), _config('UPSTREAM_BACKOFF_MAXIMO', 8.0))
+        base = _config('UPSTREAM_BACKOFF_BASE', 0.25)
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(base * 2 ** intento, _config('UPSTREAM_BACKOFF_MAXIMO', 8.0)))
+
+    def request(self, metodo, url, reintentos=None, **kwargs):
+        if not self.circuito.permitir():
+            self.metricas.contar('rechazadas')
+            raise ProveedorNoDisponible(f"Circuito abierto para el proveedor '{self.nombre}'")
+
+        kwargs.setdefault('timeout', (
+            _config('UPSTREAM_TIMEOUT_CONEXION', 3.05),
+            _config('UPSTREAM_TIMEOUT_LECTURA', 15),
+        ))
+        reintentos = _config('UPSTREAM_REINTENTOS', 2) if reintentos is None else reintentos
+
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            respuesta = None
+            try:
+                respuesta = self.sesion.request(metodo, url, **kwargs)
+                error = respuesta.status_code in ESTADOS_REINTENTABLES
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = True
+                if intento >= reintentos or not _reintentable(metodo, error=e):
+                    self.metricas.registrar((time.perf_counter() - inicio) * 1000, True)
+                    self.circuito.fallo()
+                    raise
+            self.metricas.registrar((time.perf_counter() - inicio) * 1000, error)
+
+            if not error:
+                self.circuito.exito()
+                return respuesta
+            if intento >= reintentos or (respuesta is not None and not _reintentable(metodo, respuesta)):
+                self.circuito.fallo()
+                return respuesta
+
+            intento += 1
+            self.metricas.contar('reintentos')
+            espera = self._espera_reintento(intento, respuesta)
+            if respuesta is not None:
+                # Libera la conexión (importa con stream=True)
+                respuesta.close()
+            time.sleep(espera)
+
+
+    async def request_async(self, metodo, url, reintentos=None, timeout=None, stream=False, **kwargs):
+        # Mismo comportamiento que request(), con httpx. `timeout` acepta la
+        # tupla (conexión, lectura) que se usa con requests. Con stream=True
+        # el cuerpo no se lee: el llamador itera la respuesta y la cierra
+        # con `await respuesta.aclose()`.
+        if not self.circuito.permitir():
+            self.metricas.contar('rechazadas')
+            raise ProveedorNoDisponible(f"Circuito abierto para el proveedor '{self.nombre}'")
+
+        if kwargs.get('headers'):
+            # requests omite las cabeceras con valor None; httpx las rechaza
+            kwargs['headers'] = {k: v for k, v in kwargs['headers'].items() if v is not None}
+        if isinstance(timeout, tuple):
+            kwargs['timeout'] = httpx.Timeout(timeout[1], connect=timeout[0])
+        elif timeout is not None:
+            kwargs['timeout'] = timeout
+        reintentos = _config('UPSTREAM_REINTENTOS', 2) if reintentos is None else reintentos
+
+        cliente = await self.cliente_async()
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            respuesta = None
+            try:
+                if stream:
+                    respuesta = await cliente.send(cliente.build_request(metodo, url, **kwargs), stream=True)
+                else:
+                    respuesta = await cliente.request(metodo, url, **kwargs)
+                error = respuesta.status_code in ESTADOS_REINTENTABLES
+            except httpx.TransportError as e:
+                error = True
+                if intento >= reintentos or not _reintentable(metodo, error=e):
+                    self.metricas.registrar((time.perf_counter() - inicio) * 1000, True)
+                    self.circuito.fallo()
+                    raise
+            self.metricas.registrar((time.perf_counter() - inicio) * 1000, error)
+
+            if not error:
+                self.circuito.exito()
+                return respuesta
+            if intento >= reintentos or (respuesta is not None and not _reintentable(metodo, respuesta)):
+                self.circuito.fallo()
+                return respuesta
+
+            intento += 1
+            self.metricas.contar('reintentos')
+            espera = self._espera_reintento(intento, respuesta)
+            if respuesta is not None:
+                await respuesta.aclose()
+            await asyncio.sleep(espera)
+
+
+_proveedores = {}
+_lock = threading.Lock()
+
+
+def proveedor(nombre):
+    with _lock:
+        if nombre not in _proveedores:
+            _proveedores[nombre] = Proveedor(nombre)
+        return _proveedores[nombre]
+
+
+def get(nombre, url, **kwargs):
+    return proveedor(nombre).request('GET', url, **kwargs)
+
+
+def post(nombre, url, **kwargs):
+    return proveedor(nombre).request('POST', url, **kwargs)
+
+
+async def get_async(nombre, url, **kwargs):
+    return await proveedor(nombre).request_async('GET', url, **kwargs)
+
+
+async def post_async(nombre, url, **kwargs):
+    return await proveedor(nombre).request_async('POST', url, **kwargs)
+
+
+def metricas():
+    return {
+        nombre: dict(p.metricas.como_dict(), circuito=p.circuito.estado)
+        for nombre, p in sorted(_proveedores.items())
+    }
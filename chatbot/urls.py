@@ -1,21 +1,43 @@
 from django.urls import path
 from .views import (
-    connection_test, deepseek_response, images_response, clima_actual,
-    listar_paises, listar_ciudades_por_pais, lugares_cercanos,
+    connection_test, deepseek_response, deepseek_response_stream,
+    images_response, clima_actual, listar_paises, listar_ciudades_por_pais,
+    lugares_cercanos,
     registrar_viaje, registrar_clima, registrar_lugar, registrar_itinerario,
-    registrar_actividad, registrar_actividad_lugar, obtener_ids_ciudad_pais,
-    obtener_itinerario_completo, registro_usuario, login_usuario,
-    logout_usuario, obtener_perfil_usuario, obtener_estado_por_ciudad
+    registrar_actividad, registrar_actividad_lugar, registrar_itinerarios,
+    registrar_actividades, registrar_actividades_lugar, generar_viaje, obtener_ids_ciudad_pais,
+    obtener_itinerario_completo, exportar_itinerarios, registro_usuario, login_usuario,
+    logout_usuario, obtener_perfil_usuario, obtener_estado_por_ciudad,
+    buscar_ciudades, ciudades_mas_cercanas, ciudades_en_radio, clima_batch,
+    metricas_upstream, metricas_fotos
+)
+from .views_async import (
+    deepseek_response_async, deepseek_response_stream_async,
+    images_response_async, clima_actual_async, lugares_cercanos_async
 )
 
 urlpatterns = [
     path('test/', connection_test, name='connection_test'),         
+    path('upstream/metricas/', metricas_upstream, name='metricas_upstream'),
+    path('fotos/metricas/', metricas_fotos, name='metricas_fotos'),
     path('deepseek/', deepseek_response, name='deepseek_response'), 
+    path('deepseek/stream/', deepseek_response_stream, name='deepseek_response_stream'),
     path('images/', images_response, name='images_response'), 
     path('clima/', clima_actual, name='clima_actual'),  # nueva ruta
+    path('clima/batch/', clima_batch, name='clima_batch'),
     path('paises/', listar_paises, name='listar_paises'),
     path('ciudades/', listar_ciudades_por_pais, name='listar_ciudades_por_pais'),
+    path('ciudades/buscar/', buscar_ciudades, name='buscar_ciudades'),
+    path('ciudades/cercanas/', ciudades_mas_cercanas, name='ciudades_mas_cercanas'),
+    path('ciudades/radio/', ciudades_en_radio, name='ciudades_en_radio'),
     path('lugares-cercanos/', lugares_cercanos, name='lugares_cercanos'),
+
+    # Versiones asíncronas (servir con ASGI, p. ej. uvicorn itinerario_backend.asgi:application)
+    path('async/deepseek/', deepseek_response_async, name='deepseek_response_async'),
+    path('async/deepseek/stream/', deepseek_response_stream_async, name='deepseek_response_stream_async'),
+    path('async/images/', images_response_async, name='images_response_async'),
+    path('async/clima/', clima_actual_async, name='clima_actual_async'),
+    path('async/lugares-cercanos/', lugares_cercanos_async, name='lugares_cercanos_async'),
     path('estado-por-ciudad/', obtener_estado_por_ciudad, name='obtener_estado_por_ciudad'),
     
     # Nuevas rutas para registro
@@ -25,12 +47,21 @@ urlpatterns = [
     path('registrar/itinerario/', registrar_itinerario, name='registrar_itinerario'),
     path('registrar/actividad/', registrar_actividad, name='registrar_actividad'),
     path('registrar/actividad-lugar/', registrar_actividad_lugar, name='registrar_actividad_lugar'),
+
+    # Registro en bloque: listas de filas validadas e insertadas en una transacción
+    path('registrar/itinerarios/', registrar_itinerarios, name='registrar_itinerarios'),
+    path('registrar/actividades/', registrar_actividades, name='registrar_actividades'),
+    path('registrar/actividades-lugar/', registrar_actividades_lugar, name='registrar_actividades_lugar'),
+
+    # Generar con DeepSeek y guardar un viaje completo en una sola petición
+    path('viajes/generar/', generar_viaje, name='generar_viaje'),
     
     # Nueva ruta para obtener IDs
     path('obtener-ids/', obtener_ids_ciudad_pais, name='obtener_ids_ciudad_pais'),
     
     # Nueva ruta para obtener itinerario completo
     path('itinerario/', obtener_itinerario_completo, name='obtener_itinerario_completo'),
+    path('itinerario/exportar/', exportar_itinerarios, name='exportar_itinerarios'),
     
     # Rutas de autenticación
     path('auth/registro/', registro_usuario, name='registro_usuario'),
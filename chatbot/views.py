@@ -2,9 +2,13 @@ from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from .deepseek import enviar_prompt  
-from .images import obtener_fotos_lugar_mejoradas
-from .openweather import obtener_clima
+from . import catalogos, deepseek_cache, deepseek_sse, fotos_cache, generador_viajes, itinerarios, registro_masivo
+from .clima_cache import obtener_pronostico, obtener_pronosticos
+from .gazetteer import buscar_pais, buscar_ciudad, obtener_gazetteer
+from .autocompletar import obtener_indice
+from .geo_espacial import obtener_indice_espacial
+from django.conf import settings
+from django.http import StreamingHttpResponse
 import os
 from .models import *
 from django.contrib.auth.models import User
@@ -13,9 +17,12 @@ from rest_framework.authtoken.models import Token
 from django.db import IntegrityError
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
-from datetime import datetime
 
-from .place_search import buscar_lugares_foursquare
+from .carga_perezosa import ModuloPerezoso
+
+# Clientes de APIs externas: se importan con la primera petición que los usa
+place_search = ModuloPerezoso('.place_search', __package__)
+upstream = ModuloPerezoso('.upstream', __package__)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -26,6 +33,24 @@ def connection_test(request):
         'data': None
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def metricas_upstream(request):
+    return Response({
+        'status': 'success',
+        'message': 'Métricas de las APIs externas.',
+        'data': upstream.metricas()
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def metricas_fotos(request):
+    return Response({
+        'status': 'success',
+        'message': 'Estadísticas de la caché de fotos.',
+        'data': fotos_cache.estadisticas()
+    })
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def deepseek_response(request):
@@ -38,7 +63,7 @@ def deepseek_response(request):
             'data': None
         }, status=400)
 
-    respuesta = enviar_prompt(prompt)
+    respuesta = deepseek_cache.obtener_respuesta(prompt)
 
     if respuesta:
         return Response({
@@ -53,6 +78,21 @@ def deepseek_response(request):
             'data': None
         }, status=500)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def deepseek_response_stream(request):
+    # Igual que deepseek_response, pero la respuesta llega como Server-Sent Events
+    prompt = request.data.get("prompt", "")
+
+    if not prompt:
+        return Response({
+            'status': 'error',
+            'message': 'El campo "prompt" es obligatorio.',
+            'data': None
+        }, status=400)
+
+    return deepseek_sse.respuesta_sse(deepseek_sse.eventos(prompt))
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def images_response(request):
@@ -67,7 +107,7 @@ def images_response(request):
         }, status=400)
 
     try:
-        imagenes = obtener_fotos_lugar_mejoradas(nombre_lugar, api_key)
+        imagenes = fotos_cache.obtener_fotos(nombre_lugar, api_key)
         if imagenes:
             return Response({
                 'status': 'success',
@@ -101,8 +141,8 @@ def clima_actual(request):
         }, status=400)
 
     try:
-        # Buscar país usando LIKE
-        pais_obj = Countries.objects.filter(name__icontains=pais).first()
+        # Buscar país y ciudad en el gazetteer en memoria
+        pais_obj = buscar_pais(pais)
         if not pais_obj:
             return Response({
                 "status": "error",
@@ -110,11 +150,7 @@ def clima_actual(request):
                 "data": None
             }, status=404)
 
-        # Buscar ciudad usando LIKE
-        ciudad_obj = Cities.objects.filter(
-            name__icontains=ciudad,
-            country=pais_obj
-        ).first()
+        ciudad_obj = buscar_ciudad(ciudad, pais_obj.id)
         
         if not ciudad_obj:
             return Response({
@@ -123,55 +159,14 @@ def clima_actual(request):
                 "data": None
             }, status=404)
 
-        # Buscar en la base de datos primero
-        climas_db = Clima.objects.filter(
-            ciudad=ciudad_obj,
-            pais=pais_obj,
-            fecha__gte=datetime.now().date()
-        ).order_by('fecha')[:3]  # Solo los primeros 3 días
-
-        if climas_db.exists():
-            # Si encontramos datos en la base de datos, los devolvemos
-            datos_clima = []
-            for clima in climas_db:
-                datos_clima.append({
-                    "fecha": clima.fecha.strftime('%Y-%m-%d'),
-                    "temperatura": {
-                        "maxima": clima.temperatura_maxima,
-                        "minima": clima.temperatura_minima
-                    },
-                    "estado": clima.estado_clima,
-                    "humedad": clima.humedad,
-                    "probabilidad_lluvia": clima.probabilidad_lluvia
-                })
-            
-            return Response({
-                "status": "success",
-                "message": f"Clima para {ciudad_obj.name}, {pais_obj.name}.",
-                "data": datos_clima
-            })
-
-        # Si no hay datos en la base de datos, consultamos la API
-        clima_api = obtener_clima(ciudad_obj.latitude, ciudad_obj.longitude)
-
-        if clima_api:
-            # Guardar solo los primeros 3 días en la base de datos
-            for dia_clima in clima_api[:3]:  # Solo los primeros 3 días
-                Clima.objects.create(
-                    fecha=datetime.strptime(dia_clima['fecha'], '%Y-%m-%d').date(),
-                    ciudad=ciudad_obj,
-                    pais=pais_obj,
-                    temperatura_maxima=dia_clima['temperatura']['maxima'],
-                    temperatura_minima=dia_clima['temperatura']['minima'],
-                    estado_clima=dia_clima['estado'],
-                    humedad=dia_clima['humedad'],
-                    probabilidad_lluvia=dia_clima['probabilidad_lluvia']
-                )
+        # Memoria -> tabla Clima -> OpenWeather (ver clima_cache)
+        datos_clima = obtener_pronostico(ciudad_obj)
 
+        if datos_clima:
             return Response({
                 "status": "success",
                 "message": f"Clima para {ciudad_obj.name}, {pais_obj.name}.",
-                "data": clima_api[:3]  # Devolver solo los primeros 3 días
+                "data": datos_clima
             })
         else:
             return Response({
@@ -188,16 +183,99 @@ def clima_actual(request):
         }, status=500)
     
 
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([AllowAny])
-def listar_paises(request):
-    paises = Countries.objects.all().order_by('name')
-    data = [{"id": p.id, "name": p.name} for p in paises]
+def clima_batch(request):
+    entradas = request.data.get('ciudades') if isinstance(request.data, dict) else None
+    if not isinstance(entradas, list) or not entradas:
+        return Response({
+            "status": "error",
+            "message": "El campo 'ciudades' debe ser una lista no vacía.",
+            "data": None
+        }, status=400)
+
+    maximo = settings.CLIMA_BATCH_MAXIMO
+    if len(entradas) > maximo:
+        return Response({
+            "status": "error",
+            "message": f"Se admiten como máximo {maximo} ciudades por petición.",
+            "data": None
+        }, status=400)
+
+    try:
+        dias = min(max(int(request.data.get('dias', 3)), 1), 5)
+    except (TypeError, ValueError):
+        return Response({
+            "status": "error",
+            "message": "El campo 'dias' debe ser un número entero.",
+            "data": None
+        }, status=400)
+
+    # Resolver todas las ciudades en el gazetteer (sin consultas a la BD)
+    gazetteer = obtener_gazetteer()
+    resueltas = []
+    for entrada in entradas:
+        ciudad = None
+        error = None
+        if not isinstance(entrada, dict):
+            error = "Cada elemento debe ser un objeto con 'ciudad_id' o 'ciudad' y 'pais'."
+        elif entrada.get('ciudad_id') is not None:
+            try:
+                ciudad = gazetteer.ciudades.get(int(entrada['ciudad_id']))
+            except (TypeError, ValueError):
+                pass
+            if not ciudad:
+                error = f"No se encontró la ciudad con id {entrada['ciudad_id']}."
+        elif entrada.get('ciudad') and entrada.get('pais'):
+            pais = gazetteer.buscar_pais(str(entrada['pais']))
+            ciudad = gazetteer.buscar_ciudad(str(entrada['ciudad']), pais.id) if pais else None
+            if not ciudad:
+                error = f"No se encontró la ciudad '{entrada['ciudad']}' en el país '{entrada['pais']}'."
+        else:
+            error = "Cada elemento debe incluir 'ciudad_id' o 'ciudad' y 'pais'."
+        resueltas.append((entrada, ciudad, error))
+
+    try:
+        pronosticos = obtener_pronosticos([c for _, c, _ in resueltas if c], dias=dias)
+    except Exception as e:
+        return Response({
+            "status": "error",
+            "message": f"Error al procesar la solicitud: {str(e)}",
+            "data": None
+        }, status=500)
+
+    # Resultados en el mismo orden de la entrada
+    data = []
+    for entrada, ciudad, error in resueltas:
+        if ciudad and not pronosticos.get(ciudad.id):
+            error = "No se pudo obtener el clima."
+        pais = gazetteer.paises.get(ciudad.country_id) if ciudad else None
+        data.append({
+            "entrada": entrada,
+            "status": "error" if error else "success",
+            "message": error or f"Clima para {ciudad.name}, {pais.name if pais else ''}.",
+            "ciudad": {
+                "id": ciudad.id,
+                "nombre": ciudad.name,
+                "pais_id": ciudad.country_id,
+                "pais_nombre": pais.name if pais else None
+            } if ciudad else None,
+            "data": None if error else pronosticos[ciudad.id]
+        })
+
+    exitosos = sum(1 for r in data if r['status'] == 'success')
     return Response({
         "status": "success",
+        "message": f"Clima obtenido para {exitosos} de {len(data)} ciudades.",
         "data": data
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def listar_paises(request):
+    # JSON ya armado y comprimido, con ETag/Last-Modified (ver catalogos.py)
+    return catalogos.respuesta(request, catalogos.paises())
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def listar_ciudades_por_pais(request):
@@ -210,24 +288,173 @@ def listar_ciudades_por_pais(request):
             "data": None
         }, status=400)
 
-    try:
-        pais = Countries.objects.get(name__iexact=pais_nombre)
-        ciudades = Cities.objects.filter(country=pais).order_by('name')
-        data = [{"id": c.id, "name": c.name, "latitude": c.latitude, "longitude": c.longitude} for c in ciudades]
+    # Solo nombre, código ISO o traducción exactos: '?pais=a' no debe
+    # devolver las ciudades de cualquier país que contenga una "a"
+    pais = buscar_pais(pais_nombre, exacto=True)
+    if not pais:
+        return Response({
+            "status": "error",
+            "message": f"El país '{pais_nombre}' no existe.",
+            "data": None
+        }, status=404)
 
+    return catalogos.respuesta(request, catalogos.ciudades(pais.id))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def buscar_ciudades(request):
+    consulta = request.GET.get('q', '').strip()
+    pais_nombre = request.GET.get('pais', '').strip()
+
+    if not consulta:
         return Response({
-            "status": "success",
-            "data": data
-        })
+            "status": "error",
+            "message": "El parámetro 'q' es obligatorio.",
+            "data": None
+        }, status=400)
 
-    except Countries.DoesNotExist:
+    try:
+        limite = min(max(int(request.GET.get('limite', 10)), 1), 50)
+    except ValueError:
         return Response({
             "status": "error",
-            "message": f"El país '{pais_nombre}' no existe.",
+            "message": "El parámetro 'limite' debe ser un número entero.",
             "data": None
-        }, status=404)
+        }, status=400)
+
+    gazetteer = obtener_gazetteer()
+    pais = gazetteer.buscar_pais(pais_nombre) if pais_nombre else None
+
+    resultados = obtener_indice().buscar(consulta, pais_id=pais.id if pais else None, limite=limite)
+    for resultado in resultados:
+        pais_resultado = gazetteer.paises.get(resultado.pop('pais_id'))
+        resultado['pais'] = {
+            "id": pais_resultado.id,
+            "nombre": pais_resultado.name
+        } if pais_resultado else None
+        if resultado['tipo'] == 'ciudad':
+            ciudad = gazetteer.ciudades[resultado['id']]
+            resultado['estado'] = ciudad.state_name
+            resultado['latitude'] = ciudad.latitude
+            resultado['longitude'] = ciudad.longitude
+
+    return Response({
+        "status": "success",
+        "message": f"Se encontraron {len(resultados)} coincidencias para '{consulta}'.",
+        "data": resultados
+    })
     
 
+def _ciudad_geo_a_dict(gazetteer, ciudad_id, distancia):
+    ciudad = gazetteer.ciudades[ciudad_id]
+    pais = gazetteer.paises.get(ciudad.country_id)
+    return {
+        "id": ciudad.id,
+        "nombre": ciudad.name,
+        "estado": ciudad.state_name,
+        "pais": {
+            "id": pais.id,
+            "nombre": pais.name
+        } if pais else None,
+        "latitude": ciudad.latitude,
+        "longitude": ciudad.longitude,
+        "distancia_km": round(distancia, 2)
+    }
+
+def _punto_de_referencia(request, gazetteer):
+    # Acepta ?ciudad_id= o ?lat=&lon=; devuelve (lat, lon, ciudad_id) o un error
+    ciudad_id = request.GET.get('ciudad_id', '').strip()
+    if ciudad_id:
+        ciudad = gazetteer.ciudades.get(int(ciudad_id)) if ciudad_id.isdigit() else None
+        if not ciudad:
+            return None, f"No se encontró la ciudad con id {ciudad_id}."
+        return (ciudad.latitude, ciudad.longitude, ciudad.id), None
+
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lon = float(request.GET.get('lon', ''))
+    except ValueError:
+        return None, "Debe proporcionar 'ciudad_id' o los parámetros numéricos 'lat' y 'lon'."
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return None, "Las coordenadas están fuera de rango."
+    return (lat, lon, None), None
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ciudades_mas_cercanas(request):
+    gazetteer = obtener_gazetteer()
+    punto, error = _punto_de_referencia(request, gazetteer)
+    if error:
+        return Response({
+            "status": "error",
+            "message": error,
+            "data": None
+        }, status=400)
+
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), 100)
+    except ValueError:
+        return Response({
+            "status": "error",
+            "message": "El parámetro 'k' debe ser un número entero.",
+            "data": None
+        }, status=400)
+
+    lat, lon, origen_id = punto
+    # Si el punto es una ciudad, se pide una más para poder excluirla
+    resultados = obtener_indice_espacial().mas_cercanas(lat, lon, k + 1 if origen_id else k)
+    data = [
+        _ciudad_geo_a_dict(gazetteer, ident, distancia)
+        for ident, distancia in resultados if ident != origen_id
+    ][:k]
+
+    return Response({
+        "status": "success",
+        "message": f"Se encontraron {len(data)} ciudades cercanas.",
+        "data": data
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def ciudades_en_radio(request):
+    gazetteer = obtener_gazetteer()
+    punto, error = _punto_de_referencia(request, gazetteer)
+    if error:
+        return Response({
+            "status": "error",
+            "message": error,
+            "data": None
+        }, status=400)
+
+    try:
+        km = float(request.GET.get('km', 50))
+        limite = min(max(int(request.GET.get('limite', 100)), 1), 500)
+    except ValueError:
+        return Response({
+            "status": "error",
+            "message": "Los parámetros 'km' y 'limite' deben ser numéricos.",
+            "data": None
+        }, status=400)
+    if not 0 < km <= 1000:
+        return Response({
+            "status": "error",
+            "message": "El parámetro 'km' debe estar entre 0 y 1000.",
+            "data": None
+        }, status=400)
+
+    lat, lon, origen_id = punto
+    resultados = obtener_indice_espacial().en_radio(lat, lon, km)
+    data = [
+        _ciudad_geo_a_dict(gazetteer, ident, distancia)
+        for ident, distancia in resultados if ident != origen_id
+    ][:limite]
+
+    return Response({
+        "status": "success",
+        "message": f"Se encontraron {len(data)} ciudades en un radio de {km:g} km.",
+        "data": data
+    })
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def lugares_cercanos(request):
@@ -240,7 +467,7 @@ def lugares_cercanos(request):
             "data": None
         }, status=400)
 
-    lugares = buscar_lugares_foursquare(lugar)
+    lugares = place_search.buscar_lugares_foursquare(lugar)
 
     if lugares is not None:
         return Response({
@@ -444,6 +671,118 @@ def registrar_actividad_lugar(request):
             'data': None
         }, status=400)
 
+def _registro_masivo(request, campo, registrar, nombre):
+    # Acepta una lista JSON o un objeto {campo: [...]}. Si alguna fila es
+    # inválida responde 400 con el resultado de cada una y no registra nada.
+    if isinstance(request.data, list):
+        entradas = request.data
+    elif isinstance(request.data, dict):
+        entradas = request.data.get(campo)
+    else:
+        entradas = None
+    if not isinstance(entradas, list) or not entradas:
+        return Response({
+            'status': 'error',
+            'message': f"Se espera una lista no vacía (o el campo '{campo}' con una lista).",
+            'data': None
+        }, status=400)
+
+    maximo = settings.REGISTRO_MASIVO_MAXIMO
+    if len(entradas) > maximo:
+        return Response({
+            'status': 'error',
+            'message': f"Se admiten como máximo {maximo} elementos por petición.",
+            'data': None
+        }, status=400)
+
+    try:
+        resultados, registrados = registrar(entradas)
+    except IntegrityError as e:
+        # Una referencia borrada entre la validación y la inserción
+        return Response({
+            'status': 'error',
+            'message': f'Error al registrar {nombre}: {str(e)}',
+            'data': None
+        }, status=409)
+    except Exception as e:
+        return Response({
+            'status': 'error',
+            'message': f'Error al registrar {nombre}: {str(e)}',
+            'data': None
+        }, status=500)
+
+    if not registrados:
+        invalidos = sum(1 for r in resultados if r['status'] == 'error')
+        return Response({
+            'status': 'error',
+            'message': f"{invalidos} de {len(resultados)} elementos tienen errores; no se registró ninguno.",
+            'data': resultados
+        }, status=400)
+    return Response({
+        'status': 'success',
+        'message': f"Se registraron {len(resultados)} {nombre}.",
+        'data': resultados
+    }, status=201)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def registrar_itinerarios(request):
+    return _registro_masivo(request, 'itinerarios', registro_masivo.registrar_itinerarios, 'itinerarios')
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def registrar_actividades(request):
+    return _registro_masivo(request, 'actividades', registro_masivo.registrar_actividades, 'actividades')
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def registrar_actividades_lugar(request):
+    return _registro_masivo(
+        request, 'relaciones', registro_masivo.registrar_actividades_lugar, 'relaciones actividad-lugar'
+    )
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def generar_viaje(request):
+    # Genera el itinerario con DeepSeek y guarda viaje, itinerarios,
+    # actividades y lugares en una sola transacción
+    try:
+        solicitud = generador_viajes.validar_solicitud(request.data)
+    except generador_viajes.DatosInvalidos as e:
+        return Response({
+            'status': 'error',
+            'message': 'Datos de la solicitud inválidos.',
+            'data': e.errores
+        }, status=400)
+
+    try:
+        plan = generador_viajes.generar_plan(solicitud)
+        if plan is None:
+            return Response({
+                'status': 'error',
+                'message': 'Error al generar respuesta desde DeepSeek.',
+                'data': None
+            }, status=502)
+        viaje = generador_viajes.guardar_viaje(solicitud, plan)
+    except generador_viajes.DatosInvalidos as e:
+        return Response({
+            'status': 'error',
+            'message': 'DeepSeek no devolvió un itinerario válido.',
+            'data': e.errores
+        }, status=502)
+    except Exception as e:
+        return Response({
+            'status': 'error',
+            'message': f'Error al generar el viaje: {str(e)}',
+            'data': None
+        }, status=500)
+
+    return Response({
+        'status': 'success',
+        'message': f"Viaje generado con {len(viaje['itinerarios'])} días de itinerario.",
+        'data': viaje
+    }, status=201)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def obtener_ids_ciudad_pais(request):
@@ -459,7 +798,7 @@ def obtener_ids_ciudad_pais(request):
 
     try:
         # Buscar el país
-        pais = Countries.objects.filter(name__icontains=pais_nombre).first()
+        pais = buscar_pais(pais_nombre)
         if not pais:
             return Response({
                 'status': 'error',
@@ -468,10 +807,7 @@ def obtener_ids_ciudad_pais(request):
             }, status=404)
 
         # Buscar la ciudad en ese país
-        ciudad = Cities.objects.filter(
-            name__icontains=ciudad_nombre,
-            country=pais
-        ).first()
+        ciudad = buscar_ciudad(ciudad_nombre, pais.id)
 
         if not ciudad:
             return Response({
@@ -501,82 +837,44 @@ def obtener_ids_ciudad_pais(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def obtener_itinerario_completo(request):
+    # Paginado por cursor sobre el id: ?limite=, ?cursor= (el 'siguiente' de
+    # la página anterior), filtros ?viaje_id=, ?ciudad= (id, o nombre con
+    # ?pais=), ?estado=, ?dia= y ?campos=id,lugar,... para omitir anidados
     try:
-        # Obtener todos los itinerarios con sus relaciones
-        itinerarios = Itinerario.objects.select_related(
-            'ciudad', 'pais', 'viaje', 'clima', 'transporte'
-        ).prefetch_related(
-            'actividad_set__lugares'
-        ).all()
-
-        itinerarios_data = []
-        for itinerario in itinerarios:
-            actividades = []
-            for actividad in itinerario.actividad_set.all():
-                lugares_actividad = []
-                for lugar in actividad.lugares.all():
-                    lugares_actividad.append({
-                        'id': lugar.id,
-                        'nombre': lugar.nombre,
-                        'descripcion': lugar.descripcion,
-                        'ubicacion': lugar.ubicacion,
-                        'tipo_lugar': lugar.tipo_lugar.nombre
-                    })
-                
-                actividades.append({
-                    'id': actividad.id,
-                    'turno': actividad.turno,
-                    'orden': actividad.orden,
-                    'estado': actividad.estado,
-                    'lugares': lugares_actividad
-                })
-
-            itinerario_data = {
-                'id': itinerario.id,
-                'lugar': itinerario.lugar,
-                'ciudad': {
-                    'id': itinerario.ciudad.id,
-                    'nombre': itinerario.ciudad.name
-                },
-                'pais': {
-                    'id': itinerario.pais.id,
-                    'nombre': itinerario.pais.name
-                },
-                'dia': itinerario.dia,
-                'costo': float(itinerario.costo),
-                'estado': itinerario.estado,
-                'viaje': {
-                    'id': itinerario.viaje.id,
-                    'presupuesto': float(itinerario.viaje.presupuesto),
-                    'dia_salida': itinerario.viaje.dia_salida,
-                    'duracion_viaje': itinerario.viaje.duracion_viaje,
-                    'estado': itinerario.viaje.estado
-                },
-                'clima': {
-                    'id': itinerario.clima.id,
-                    'fecha': itinerario.clima.fecha,
-                    'temperatura_actual': itinerario.clima.temperatura_actual,
-                    'temperatura_sensacion': itinerario.clima.temperatura_sensacion,
-                    'descripcion': itinerario.clima.descripcion,
-                    'estado_clima': itinerario.clima.estado_clima,
-                    'humedad': itinerario.clima.humedad,
-                    'velocidad_viento': itinerario.clima.velocidad_viento,
-                    'direccion_viento': itinerario.clima.direccion_viento,
-                    'probabilidad_lluvia': itinerario.clima.probabilidad_lluvia
-                },
-                'transporte': {
-                    'id': itinerario.transporte.id,
-                    'nombre': itinerario.transporte.nombre,
-                    'tipo_transporte': itinerario.transporte.tipo_transporte.nombre
-                },
-                'actividades': actividades
-            }
-            itinerarios_data.append(itinerario_data)
+        limite = int(request.GET.get('limite', settings.ITINERARIO_PAGINA))
+    except ValueError:
+        return Response({
+            'status': 'error',
+            'message': "El parámetro 'limite' debe ser un número entero.",
+            'data': None
+        }, status=400)
+    limite = min(max(limite, 1), settings.ITINERARIO_PAGINA_MAXIMA)
+
+    try:
+        campos = itinerarios.leer_campos(request.GET)
+        filtros = itinerarios.leer_filtros(request.GET)
+        cursor = request.GET.get('cursor', '').strip()
+        cursor = itinerarios.decodificar_cursor(cursor) if cursor else None
+    except itinerarios.ParametrosInvalidos as e:
+        return Response({
+            'status': 'error',
+            'message': str(e),
+            'data': None
+        }, status=400)
+
+    try:
+        filas, siguiente = itinerarios.pagina(filtros, campos, limite, cursor)
+        siguiente = itinerarios.codificar_cursor(siguiente) if siguiente is not None else None
+        itinerarios_data = [itinerarios.itinerario_a_dict(itinerario, campos) for itinerario in filas]
 
         return Response({
             'status': 'success',
             'message': 'Información de los itinerarios obtenida exitosamente',
-            'data': itinerarios_data
+            'data': itinerarios_data,
+            'paginacion': {
+                'limite': limite,
+                'siguiente': siguiente
+            }
         })
 
     except Exception as e:
@@ -586,6 +884,43 @@ def obtener_itinerario_completo(request):
             'data': None
         }, status=500)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def exportar_itinerarios(request):
+    # Todos los itinerarios que cumplan los filtros de obtener_itinerario_completo
+    # (también admite ?campos=), en streaming: NDJSON por defecto o un arreglo
+    # JSON con ?formato=json. La memoria usada no depende del total de filas.
+    formato = request.GET.get('formato', 'ndjson').strip().lower()
+    if formato not in ('ndjson', 'json'):
+        return Response({
+            'status': 'error',
+            'message': "El parámetro 'formato' debe ser 'ndjson' o 'json'.",
+            'data': None
+        }, status=400)
+
+    try:
+        campos = itinerarios.leer_campos(request.GET)
+        filtros = itinerarios.leer_filtros(request.GET)
+    except itinerarios.ParametrosInvalidos as e:
+        return Response({
+            'status': 'error',
+            'message': str(e),
+            'data': None
+        }, status=400)
+
+    lote = settings.ITINERARIO_EXPORTAR_LOTE
+    if formato == 'json':
+        respuesta = StreamingHttpResponse(
+            itinerarios.exportar_json(filtros, campos, lote), content_type='application/json'
+        )
+    else:
+        respuesta = StreamingHttpResponse(
+            itinerarios.exportar_ndjson(filtros, campos, lote), content_type='application/x-ndjson'
+        )
+    respuesta['Content-Disposition'] = f'attachment; filename="itinerarios.{formato}"'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def registro_usuario(request):
@@ -769,7 +1104,7 @@ def obtener_estado_por_ciudad(request):
 
     try:
         # Buscar el país
-        pais = Countries.objects.filter(name__icontains=pais_nombre).first()
+        pais = buscar_pais(pais_nombre)
         if not pais:
             return Response({
                 "status": "error",
@@ -778,10 +1113,7 @@ def obtener_estado_por_ciudad(request):
             }, status=404)
 
         # Buscar la ciudad y su estado asociado
-        ciudad = Cities.objects.select_related('state').filter(
-            name__icontains=ciudad_nombre,
-            country=pais
-        ).first()
+        ciudad = buscar_ciudad(ciudad_nombre, pais.id)
 
         if not ciudad:
             return Response({
@@ -790,7 +1122,7 @@ def obtener_estado_por_ciudad(request):
                 "data": None
             }, status=404)
 
-        if not ciudad.state:
+        if not ciudad.state_id:
             return Response({
                 "status": "error",
                 "message": f"No se encontró el estado para la ciudad: {ciudad_nombre}",
@@ -801,8 +1133,8 @@ def obtener_estado_por_ciudad(request):
             "status": "success",
             "message": "Estado encontrado exitosamente",
             "data": {
-                "id": ciudad.state.id,
-                "nombre": ciudad.state.name,
+                "id": ciudad.state_id,
+                "nombre": ciudad.state_name,
                 "pais": {
                     "id": pais.id,
                     "nombre": pais.name
@@ -0,0 +1,126 @@
+# views_async.py
+# Versiones asíncronas (ASGI) de las vistas que esperan a APIs externas.
+# Mientras esperan la red no ocupan un hilo, así que un solo worker ASGI
+# puede mantener cientos de llamadas en curso. Las respuestas tienen el
+# mismo formato que las vistas DRF equivalentes de views.py.
+import json
+import os
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .clima_cache import obtener_pronostico_async
+from .deepseek_cache import obtener_respuesta_async
+from .deepseek_sse import eventos_async, respuesta_sse
+from .gazetteer import buscar_ciudad, buscar_pais
+from .fotos_cache import obtener_fotos_async
+from .carga_perezosa import ModuloPerezoso
+
+place_search = ModuloPerezoso('.place_search', __package__)
+
+
+def _respuesta(status, message, data, codigo=200):
+    return JsonResponse({
+        'status': status,
+        'message': message,
+        'data': data
+    }, status=codigo, json_dumps_params={'ensure_ascii': False})
+
+
+def _cuerpo_json(request):
+    try:
+        cuerpo = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return cuerpo if isinstance(cuerpo, dict) else {}
+
+
+@csrf_exempt
+@require_POST
+async def deepseek_response_async(request):
+    prompt = _cuerpo_json(request).get("prompt", "")
+
+    if not prompt:
+        return _respuesta('error', 'El campo "prompt" es obligatorio.', None, 400)
+
+    respuesta = await obtener_respuesta_async(prompt)
+
+    if respuesta:
+        return _respuesta('success', 'Respuesta generada con éxito.', respuesta)
+    return _respuesta('error', 'Error al generar respuesta desde DeepSeek.', None, 500)
+
+
+@csrf_exempt
+@require_POST
+async def deepseek_response_stream_async(request):
+    prompt = _cuerpo_json(request).get("prompt", "")
+
+    if not prompt:
+        return _respuesta('error', 'El campo "prompt" es obligatorio.', None, 400)
+
+    return respuesta_sse(eventos_async(prompt))
+
+
+@csrf_exempt
+@require_POST
+async def images_response_async(request):
+    nombre_lugar = _cuerpo_json(request).get("nombre_lugar", "")
+    api_key = os.getenv('API_KEY_IMAGE_GENERATION')
+
+    if not nombre_lugar:
+        return _respuesta('error', 'El campo "nombre_lugar" es obligatorio.', None, 400)
+
+    try:
+        imagenes = await obtener_fotos_async(nombre_lugar, api_key)
+    except Exception as e:
+        return _respuesta('error', f'Error al obtener imágenes: {str(e)}', None, 500)
+
+    if imagenes:
+        return _respuesta('success', f'Se encontraron {len(imagenes)} imágenes.', imagenes)
+    return _respuesta('error', 'No se encontraron imágenes para ese lugar.', [])
+
+
+@require_GET
+async def clima_actual_async(request):
+    ciudad = request.GET.get("ciudad", "").strip()
+    pais = request.GET.get("pais", "").strip()
+
+    if not ciudad or not pais:
+        return _respuesta("error", "Los parámetros 'ciudad' y 'pais' son obligatorios.", None, 400)
+
+    try:
+        pais_obj = await sync_to_async(buscar_pais)(pais)
+        if not pais_obj:
+            return _respuesta("error", f"No se encontró ningún país que coincida con '{pais}'.", None, 404)
+
+        ciudad_obj = await sync_to_async(buscar_ciudad)(ciudad, pais_obj.id)
+        if not ciudad_obj:
+            return _respuesta(
+                "error",
+                f"No se encontró ninguna ciudad que coincida con '{ciudad}' en el país '{pais_obj.name}'.",
+                None, 404
+            )
+
+        datos_clima = await obtener_pronostico_async(ciudad_obj)
+    except Exception as e:
+        return _respuesta("error", f"Error al procesar la solicitud: {str(e)}", None, 500)
+
+    if datos_clima:
+        return _respuesta("success", f"Clima para {ciudad_obj.name}, {pais_obj.name}.", datos_clima)
+    return _respuesta("error", "No se pudo obtener el clima.", None, 500)
+
+
+@require_GET
+async def lugares_cercanos_async(request):
+    lugar = request.GET.get("lugar", "").strip()
+
+    if not lugar:
+        return _respuesta("error", "El parámetro 'lugar' es obligatorio.", None, 400)
+
+    lugares = await place_search.buscar_lugares_foursquare_async(lugar)
+
+    if lugares is not None:
+        return _respuesta("success", f"Lugares cercanos encontrados para '{lugar}'.", lugares)
+    return _respuesta("error", "No se pudo obtener la información de lugares.", None, 500)
@@ -89,7 +89,12 @@ DATABASES = {
         'PORT': '3306',  # Puerto por defecto de MySQL
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
         },
+        # Reutilizar la conexión entre peticiones (segundos; 0 = una por
+        # petición) y comprobar que sigue viva antes de reutilizarla
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '300')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
@@ -179,4 +184,125 @@ CORS_ALLOW_CREDENTIALS = True
 # DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 
 # Authentication settings
-AUTH_USER_MODEL = 'auth.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'auth.User'
+
+# Gazetteer geográfico en memoria: segundos entre verificaciones de cambios
+GEO_GAZETTEER_VERIFICACION = int(os.getenv('GEO_GAZETTEER_VERIFICACION', '300'))
+
+# Radio (km) dentro del cual dos ciudades comparten el pronóstico guardado
+CLIMA_RADIO_COMPARTIDO_KM = float(os.getenv('CLIMA_RADIO_COMPARTIDO_KM', '10'))
+
+# Caché de pronósticos: entradas en memoria, segundos en que un pronóstico es
+# fresco y segundos durante los que se sirve obsoleto mientras se actualiza
+CLIMA_CACHE_MAXIMO = int(os.getenv('CLIMA_CACHE_MAXIMO', '1000'))
+CLIMA_TTL_FRESCO = int(os.getenv('CLIMA_TTL_FRESCO', str(3 * 3600)))
+CLIMA_TTL_OBSOLETO = int(os.getenv('CLIMA_TTL_OBSOLETO', str(24 * 3600)))
+# Segundos sin reintentar la actualización en segundo plano tras un fallo
+CLIMA_ESPERA_TRAS_FALLO = int(os.getenv('CLIMA_ESPERA_TRAS_FALLO', '300'))
+# Hilos compartidos por las actualizaciones en segundo plano de las cachés
+CACHE_HILOS_SEGUNDO_PLANO = int(os.getenv('CACHE_HILOS_SEGUNDO_PLANO', '4'))
+
+# /api/clima/batch/: ciudades por petición y llamadas simultáneas a OpenWeather
+# (por proceso, compartidas entre peticiones)
+CLIMA_BATCH_MAXIMO = int(os.getenv('CLIMA_BATCH_MAXIMO', '50'))
+CLIMA_BATCH_CONCURRENCIA = int(os.getenv('CLIMA_BATCH_CONCURRENCIA', '8'))
+
+# Cliente HTTP compartido para APIs externas (chatbot/upstream.py)
+UPSTREAM_TIMEOUT_CONEXION = float(os.getenv('UPSTREAM_TIMEOUT_CONEXION', '3.05'))
+UPSTREAM_TIMEOUT_LECTURA = float(os.getenv('UPSTREAM_TIMEOUT_LECTURA', '15'))
+UPSTREAM_REINTENTOS = int(os.getenv('UPSTREAM_REINTENTOS', '2'))
+UPSTREAM_BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.25'))
+UPSTREAM_BACKOFF_MAXIMO = float(os.getenv('UPSTREAM_BACKOFF_MAXIMO', '8'))
+UPSTREAM_POOL_MAXIMO = int(os.getenv('UPSTREAM_POOL_MAXIMO', '10'))
+UPSTREAM_CIRCUITO_UMBRAL = int(os.getenv('UPSTREAM_CIRCUITO_UMBRAL', '5'))
+UPSTREAM_CIRCUITO_ESPERA = float(os.getenv('UPSTREAM_CIRCUITO_ESPERA', '30'))
+# Las respuestas de DeepSeek tardan bastante más que las demás APIs
+DEEPSEEK_TIMEOUT = float(os.getenv('DEEPSEEK_TIMEOUT', '120'))
+DEEPSEEK_MODELO = os.getenv('DEEPSEEK_MODELO', 'deepseek-chat')
+DEEPSEEK_TEMPERATURA = float(os.getenv('DEEPSEEK_TEMPERATURA', '0.7'))
+
+# Fotos de lugares (Google Places): plazo total en segundos, sugerencias de
+# autocompletado que se prueban como máximo e hilos para llamadas en paralelo
+FOTOS_PLAZO = float(os.getenv('FOTOS_PLAZO', '8'))
+FOTOS_MAX_SUGERENCIAS = int(os.getenv('FOTOS_MAX_SUGERENCIAS', '1'))
+FOTOS_HILOS = int(os.getenv('FOTOS_HILOS', '16'))
+# Caché persistente de fotos: días de vigencia (horas si el lugar no tiene
+# fotos), filas máximas por tabla antes de desalojar las menos usadas,
+# segundos entre desalojos y segundos entre escrituras de último acceso
+FOTOS_CACHE_TTL_DIAS = int(os.getenv('FOTOS_CACHE_TTL_DIAS', '7'))
+FOTOS_CACHE_TTL_VACIO_HORAS = int(os.getenv('FOTOS_CACHE_TTL_VACIO_HORAS', '6'))
+FOTOS_CACHE_MAXIMO_LUGARES = int(os.getenv('FOTOS_CACHE_MAXIMO_LUGARES', '5000'))
+FOTOS_CACHE_MAXIMO_CONSULTAS = int(os.getenv('FOTOS_CACHE_MAXIMO_CONSULTAS', '20000'))
+FOTOS_CACHE_DESALOJO_INTERVALO = int(os.getenv('FOTOS_CACHE_DESALOJO_INTERVALO', '300'))
+FOTOS_CACHE_GRANULARIDAD = int(os.getenv('FOTOS_CACHE_GRANULARIDAD', '3600'))
+
+# Caché de respuestas de DeepSeek: segundos de vigencia (0 la desactiva) y
+# respuestas guardadas como máximo por proceso
+DEEPSEEK_CACHE_TTL = int(os.getenv('DEEPSEEK_CACHE_TTL', str(6 * 3600)))
+DEEPSEEK_CACHE_MAXIMO = int(os.getenv('DEEPSEEK_CACHE_MAXIMO', '500'))
+
+# Generación de viajes con DeepSeek: duración máxima en días
+VIAJE_DURACION_MAXIMA = int(os.getenv('VIAJE_DURACION_MAXIMA', '30'))
+
+# Registro en bloque (/api/registrar/itinerarios/ y similares): filas por petición
+REGISTRO_MASIVO_MAXIMO = int(os.getenv('REGISTRO_MASIVO_MAXIMO', '500'))
+
+# /api/itinerario/: itinerarios por página por defecto y máximo con ?limite=
+ITINERARIO_PAGINA = int(os.getenv('ITINERARIO_PAGINA', '50'))
+ITINERARIO_PAGINA_MAXIMA = int(os.getenv('ITINERARIO_PAGINA_MAXIMA', '200'))
+# /api/itinerario/exportar/: itinerarios leídos por consulta
+ITINERARIO_EXPORTAR_LOTE = int(os.getenv('ITINERARIO_EXPORTAR_LOTE', '500'))
+
+# Catálogos de países y ciudades (/api/paises/, /api/ciudades/): catálogos en
+# memoria por proceso y segundos que el cliente puede reutilizarlos sin revalidar
+CATALOGO_CACHE_MAXIMO = int(os.getenv('CATALOGO_CACHE_MAXIMO', '300'))
+CATALOGO_MAX_AGE = int(os.getenv('CATALOGO_MAX_AGE', '300'))
+
+# Instantánea binaria de países/estados/ciudades (manage.py exportar_geo) que
+# cada worker mapea al arrancar en vez de leer las tablas; '' la desactiva
+GEO_INSTANTANEA = os.getenv('GEO_INSTANTANEA', str(BASE_DIR / 'geo_instantanea.bin'))
+
+# Pool de conexiones del driver (opcional, requiere django-db-connection-pool).
+# Con el pool, cerrar la conexión la devuelve al pool: CONN_MAX_AGE pasa a 0.
+if os.getenv('DB_POOL', 'False') == 'True':
+    from importlib.util import find_spec
+
+    from django.core.exceptions import ImproperlyConfigured
+
+    if not find_spec('dj_db_conn_pool'):
+        raise ImproperlyConfigured(
+            "DB_POOL=True requiere django-db-connection-pool (pip install django-db-connection-pool[mysql])."
+        )
+    DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL_OPTIONS'] = {
+        'POOL_SIZE': int(os.getenv('DB_POOL_TAMANO', '10')),
+        'MAX_OVERFLOW': int(os.getenv('DB_POOL_EXTRA', '10')),
+        'RECYCLE': int(os.getenv('DB_POOL_RECICLAR', '1800')),
+        'PRE_PING': True,
+    }
+
+# Datos de referencia (países, estados, ciudades y tipos): lecturas desde una
+# réplica (DB_REPLICA_HOST) o desde un espejo SQLite local que actualiza
+# manage.py sincronizar_referencia (DB_ESPEJO=True). Sin ninguno, todo va a
+# default. Ver chatbot/routers.py.
+REFERENCIA_ESPEJO = False
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['referencia'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.getenv('DB_ESPEJO', 'False') == 'True':
+    REFERENCIA_ESPEJO = True
+    DATABASES['referencia'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_ESPEJO_RUTA', str(BASE_DIR / 'referencia.sqlite3')),
+        # WAL: los workers siguen leyendo mientras se sincroniza
+        'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL;'},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['chatbot.routers.RouterReferencia']
\ No newline at end of file